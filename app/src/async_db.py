@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+import db
+import reporting
+
+T = TypeVar("T")
+
+DEFAULT_EXECUTOR_WORKERS = 4
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_workers = DEFAULT_EXECUTOR_WORKERS
+
+
+def configure_executor(max_workers: int) -> None:
+    global _executor, _executor_workers
+    if max_workers < 1:
+        raise ValueError("Executor size must be positive")
+    previous = _executor
+    _executor_workers = max_workers
+    _executor = None
+    if previous is not None:
+        previous.shutdown(wait=False)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=_executor_workers, thread_name_prefix="db")
+    return _executor
+
+
+def shutdown_executor(wait: bool = True) -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=wait)
+        _executor = None
+
+
+async def run_db(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), functools.partial(func, *args, **kwargs))
+
+
+def _offload(func: Callable[..., T]) -> Callable[..., Awaitable[T]]:
+    cache_peek = getattr(func, "cache_peek", None)
+
+    @functools.wraps(func)
+    async def wrapper(*args: Any, **kwargs: Any) -> T:
+        if cache_peek is not None:
+            cached = cache_peek(*args, **kwargs)
+            if cached is not db.REFERENCE_MISS:
+                return cached
+        return await run_db(func, *args, **kwargs)
+
+    return wrapper
+
+
+init_db = _offload(db.init_db)
+get_data_version = _offload(db.get_data_version)
+get_report_file_id = _offload(db.get_report_file_id)
+save_report_file_id = _offload(db.save_report_file_id)
+load_fsm_state = _offload(db.load_fsm_state)
+save_fsm_states = _offload(db.save_fsm_states)
+upsert_admin = _offload(db.upsert_admin)
+deactivate_admin = _offload(db.deactivate_admin)
+set_admin_active = _offload(db.set_admin_active)
+list_admins = _offload(db.list_admins)
+get_admin_by_tg_user_id = _offload(db.get_admin_by_tg_user_id)
+is_admin_active = _offload(db.is_admin_active)
+load_active_admin_ids = _offload(db.load_active_admin_ids)
+get_client_by_phone = _offload(db.get_client_by_phone)
+get_client_by_tg_username = _offload(db.get_client_by_tg_username)
+get_client_by_id = _offload(db.get_client_by_id)
+search_clients_by_name = _offload(db.search_clients_by_name)
+search_clients_fuzzy = _offload(db.search_clients_fuzzy)
+create_client = _offload(db.create_client)
+list_active_groups = _offload(db.list_active_groups)
+create_group = _offload(db.create_group)
+get_active_pass = _offload(db.get_active_pass)
+create_pass = _offload(db.create_pass)
+issue_pass = _offload(db.issue_pass)
+get_pass_by_id = _offload(db.get_pass_by_id)
+get_group_by_id = _offload(db.get_group_by_id)
+list_groups = _offload(db.list_groups)
+list_groups_by_trainer = _offload(db.list_groups_by_trainer)
+rename_group = _offload(db.rename_group)
+set_group_active = _offload(db.set_group_active)
+set_group_trainer = _offload(db.set_group_trainer)
+clear_group_trainer = _offload(db.clear_group_trainer)
+list_schedule_for_group = _offload(db.list_schedule_for_group)
+get_schedule_by_id = _offload(db.get_schedule_by_id)
+add_schedule_slot = _offload(db.add_schedule_slot)
+update_schedule_slot = _offload(db.update_schedule_slot)
+delete_schedule_slot = _offload(db.delete_schedule_slot)
+toggle_schedule_slot = _offload(db.toggle_schedule_slot)
+create_trainer = _offload(db.create_trainer)
+list_active_trainers = _offload(db.list_active_trainers)
+list_trainers = _offload(db.list_trainers)
+get_trainer_by_id = _offload(db.get_trainer_by_id)
+update_trainer_name = _offload(db.update_trainer_name)
+set_trainer_active = _offload(db.set_trainer_active)
+upsert_client_group_active = _offload(db.upsert_client_group_active)
+visit_exists = _offload(db.visit_exists)
+create_single_visit_booked = _offload(db.create_single_visit_booked)
+list_clients_for_attendance = _offload(db.list_clients_for_attendance)
+get_visit_by_date_group_client = _offload(db.get_visit_by_date_group_client)
+upsert_visit_status = _offload(db.upsert_visit_status)
+upsert_visit_statuses = _offload(db.upsert_visit_statuses)
+get_or_create_single_visit = _offload(db.get_or_create_single_visit)
+list_active_passes = _offload(db.list_active_passes)
+create_payment_single = _offload(db.create_payment_single)
+create_payment_pass = _offload(db.create_payment_pass)
+list_deferred_payments_by_client = _offload(db.list_deferred_payments_by_client)
+get_payment_by_id = _offload(db.get_payment_by_id)
+close_deferred_payment = _offload(db.close_deferred_payment)
+get_defer_summary = _offload(db.get_defer_summary)
+list_expense_categories = _offload(db.list_expense_categories)
+create_expense_category = _offload(db.create_expense_category)
+rename_expense_category = _offload(db.rename_expense_category)
+set_expense_category_active = _offload(db.set_expense_category_active)
+create_expense = _offload(db.create_expense)
+get_last_expense = _offload(db.get_last_expense)
+list_expenses = _offload(db.list_expenses)
+get_expense_by_id = _offload(db.get_expense_by_id)
+update_expense = _offload(db.update_expense)
+delete_expense = _offload(db.delete_expense)
+
+get_revenue_summary = _offload(reporting.get_revenue_summary)
+list_paid_payments = _offload(reporting.list_paid_payments)
+get_expense_summary = _offload(reporting.get_expense_summary)
+list_expenses_for_period = _offload(reporting.list_expenses_for_period)
+get_attendance_summary = _offload(reporting.get_attendance_summary)
+list_attended_today_by_group = _offload(reporting.list_attended_today_by_group)
+list_active_passes_today = _offload(reporting.list_active_passes_today)
+list_passes_expiring = _offload(reporting.list_passes_expiring)
+list_clients_without_active_pass = _offload(reporting.list_clients_without_active_pass)
+get_report_snapshot = _offload(reporting.get_report_snapshot)
+build_excel_report = _offload(reporting.build_excel_report)
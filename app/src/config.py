@@ -1,10 +1,17 @@
 from __future__ import annotations
 
 import os
+import re
 from dataclasses import dataclass
+from typing import Optional
 
 from dotenv import find_dotenv, load_dotenv
 
+BOT_MODE_POLLING = "polling"
+BOT_MODE_WEBHOOK = "webhook"
+# Telegram accepts 1-256 characters from this set for secret_token.
+_WEBHOOK_SECRET_RE = re.compile(r"^[A-Za-z0-9_-]{1,256}$")
+
 
 @dataclass(frozen=True)
 class Config:
@@ -12,6 +19,18 @@ class Config:
     owner_tg_user_id: int
     db_path: str
     tz: str
+    db_pool_size: int = 4
+    fsm_ttl_hours: int = 24
+    metrics_host: str = "127.0.0.1"
+    metrics_port: Optional[int] = None
+    slow_query_ms: int = 200
+    slow_query_log_path: Optional[str] = None
+    bot_mode: str = BOT_MODE_POLLING
+    webhook_url: Optional[str] = None
+    webhook_path: str = "/webhook"
+    webhook_secret: Optional[str] = None
+    webhook_host: str = "0.0.0.0"
+    webhook_port: int = 8080
 
 
 def _require_env(name: str) -> str:
@@ -38,9 +57,76 @@ def load_env() -> Config:
     except ValueError as exc:
         raise RuntimeError("OWNER_TG_USER_ID must be an integer") from exc
 
+    db_pool_size_raw = os.getenv("DB_POOL_SIZE", "4")
+    try:
+        db_pool_size = int(db_pool_size_raw)
+    except ValueError as exc:
+        raise RuntimeError("DB_POOL_SIZE must be an integer") from exc
+    if db_pool_size < 1:
+        raise RuntimeError("DB_POOL_SIZE must be positive")
+
+    fsm_ttl_hours_raw = os.getenv("FSM_TTL_HOURS", "24")
+    try:
+        fsm_ttl_hours = int(fsm_ttl_hours_raw)
+    except ValueError as exc:
+        raise RuntimeError("FSM_TTL_HOURS must be an integer") from exc
+    if fsm_ttl_hours < 1:
+        raise RuntimeError("FSM_TTL_HOURS must be positive")
+
+    metrics_host = os.getenv("METRICS_HOST", "127.0.0.1")
+    metrics_port_raw = os.getenv("METRICS_PORT", "").strip()
+    metrics_port = None
+    if metrics_port_raw:
+        try:
+            metrics_port = int(metrics_port_raw)
+        except ValueError as exc:
+            raise RuntimeError("METRICS_PORT must be an integer") from exc
+
+    slow_query_ms_raw = os.getenv("SLOW_QUERY_MS", "200")
+    try:
+        slow_query_ms = int(slow_query_ms_raw)
+    except ValueError as exc:
+        raise RuntimeError("SLOW_QUERY_MS must be an integer") from exc
+    if slow_query_ms < 0:
+        raise RuntimeError("SLOW_QUERY_MS must not be negative")
+    slow_query_log_path = os.getenv("SLOW_QUERY_LOG") or os.path.join(
+        os.path.dirname(os.path.abspath(db_path)), "slow_queries.log"
+    )
+
+    bot_mode = os.getenv("BOT_MODE", BOT_MODE_POLLING).strip().lower()
+    if bot_mode not in (BOT_MODE_POLLING, BOT_MODE_WEBHOOK):
+        raise RuntimeError("BOT_MODE must be polling or webhook")
+    webhook_url = os.getenv("WEBHOOK_URL", "").strip() or None
+    webhook_path = os.getenv("WEBHOOK_PATH", "/webhook").strip()
+    if not webhook_path.startswith("/"):
+        raise RuntimeError("WEBHOOK_PATH must start with /")
+    webhook_secret = os.getenv("WEBHOOK_SECRET", "").strip() or None
+    if bot_mode == BOT_MODE_WEBHOOK and webhook_secret is None:
+        raise RuntimeError("Missing required env var: WEBHOOK_SECRET")
+    if webhook_secret is not None and not _WEBHOOK_SECRET_RE.match(webhook_secret):
+        raise RuntimeError("WEBHOOK_SECRET must be 1-256 characters: A-Z, a-z, 0-9, _ or -")
+    webhook_host = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+    webhook_port_raw = os.getenv("WEBHOOK_PORT", "8080")
+    try:
+        webhook_port = int(webhook_port_raw)
+    except ValueError as exc:
+        raise RuntimeError("WEBHOOK_PORT must be an integer") from exc
+
     return Config(
         bot_token=bot_token,
         owner_tg_user_id=owner_tg_user_id,
         db_path=db_path,
         tz=tz,
+        db_pool_size=db_pool_size,
+        fsm_ttl_hours=fsm_ttl_hours,
+        metrics_host=metrics_host,
+        metrics_port=metrics_port,
+        slow_query_ms=slow_query_ms,
+        slow_query_log_path=slow_query_log_path,
+        bot_mode=bot_mode,
+        webhook_url=webhook_url,
+        webhook_path=webhook_path,
+        webhook_secret=webhook_secret,
+        webhook_host=webhook_host,
+        webhook_port=webhook_port,
     )
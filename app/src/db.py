@@ -1,12 +1,28 @@
 from __future__ import annotations
 
+import functools
+import heapq
 import os
 import sqlite3
+from collections import Counter
+from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import Iterable, List, Optional, Tuple
+from itertools import chain
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple
+
+from db_pool import connection
+from migrations import migrate
+from search_index import fuzzy_key, index_client_search, phone_trigrams, word_trigrams
 
 _UNSET = object()
 
+REFERENCE_MISS = object()
+
+_active_admin_ids: Dict[str, FrozenSet[int]] = {}
+_admin_generations: Dict[str, int] = {}
+_reference_versions: Dict[Tuple[str, str], int] = {}
+_reference_rows: Dict[Tuple, Tuple[int, list]] = {}
+
 
 @dataclass(frozen=True)
 class AdminRecord:
@@ -21,236 +37,111 @@ def _ensure_db_dir(db_path: str) -> None:
         os.makedirs(directory, exist_ok=True)
 
 
+@contextmanager
+def transaction(db_path: str) -> Iterator[sqlite3.Connection]:
+    with connection(db_path) as conn:
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN IMMEDIATE;")
+        yield conn
+
+
 def init_db(db_path: str) -> None:
     _ensure_db_dir(db_path)
-    with sqlite3.connect(db_path) as conn:
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS groups (
-              group_id     INTEGER PRIMARY KEY AUTOINCREMENT,
-              name         TEXT NOT NULL,
-              trainer_name TEXT,
-              trainer_id   INTEGER,
-              capacity     INTEGER NOT NULL DEFAULT 0 CHECK (capacity >= 0),
-              room_name    TEXT,
-              is_active    INTEGER NOT NULL DEFAULT 1 CHECK (is_active IN (0,1))
-            );
-            """
-        )
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS trainers (
-              trainer_id   INTEGER PRIMARY KEY AUTOINCREMENT,
-              full_name    TEXT NOT NULL,
-              phone        TEXT,
-              tg_user_id   INTEGER,
-              tg_username  TEXT,
-              is_active    INTEGER NOT NULL DEFAULT 1 CHECK (is_active IN (0,1)),
-              created_at   TEXT NOT NULL DEFAULT (datetime('now'))
-            );
-            """
-        )
-        conn.execute("CREATE INDEX IF NOT EXISTS ix_trainers_active ON trainers(is_active);")
-        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_trainers_tg_user_id ON trainers(tg_user_id);")
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS schedule (
-              schedule_id  INTEGER PRIMARY KEY AUTOINCREMENT,
-              group_id     INTEGER NOT NULL REFERENCES groups(group_id) ON DELETE CASCADE,
-              day_of_week  INTEGER NOT NULL CHECK (day_of_week BETWEEN 1 AND 7),
-              time_hhmm    TEXT NOT NULL,
-              duration_min INTEGER NOT NULL CHECK (duration_min > 0),
-              room_name    TEXT,
-              valid_from   TEXT,
-              valid_to     TEXT,
-              is_active    INTEGER NOT NULL DEFAULT 1 CHECK (is_active IN (0,1)),
-              created_at   TEXT NOT NULL DEFAULT (datetime('now'))
-            );
-            """
-        )
-        conn.execute(
-            """
-            CREATE INDEX IF NOT EXISTS ix_schedule_group_weekday
-              ON schedule(group_id, day_of_week);
-            """
-        )
-        conn.execute(
-            """
-            CREATE UNIQUE INDEX IF NOT EXISTS ux_schedule_unique_slot
-              ON schedule(group_id, day_of_week, time_hhmm);
-            """
-        )
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS admins (
-              tg_user_id INTEGER UNIQUE,
-              name TEXT NOT NULL,
-              is_active INTEGER NOT NULL DEFAULT 1 CHECK (is_active IN (0,1)),
-              created_at TEXT NOT NULL DEFAULT (datetime('now'))
-            );
-            """
-        )
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS clients (
-              client_id    INTEGER PRIMARY KEY AUTOINCREMENT,
-              full_name    TEXT NOT NULL,
-              phone        TEXT NOT NULL,
-              tg_user_id   INTEGER,
-              tg_username  TEXT,
-              birth_date   TEXT,
-              comment      TEXT,
-              created_at   TEXT NOT NULL DEFAULT (datetime('now')),
-              status       TEXT NOT NULL DEFAULT 'active' CHECK (status IN ('active','inactive'))
-            );
-            """
-        )
-        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_clients_phone ON clients(phone);")
-        conn.execute("CREATE INDEX IF NOT EXISTS ix_clients_tg_user_id ON clients(tg_user_id);")
-        conn.execute("CREATE INDEX IF NOT EXISTS ix_clients_tg_username ON clients(tg_username);")
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS client_groups (
-              client_id   INTEGER NOT NULL REFERENCES clients(client_id) ON DELETE CASCADE,
-              group_id    INTEGER NOT NULL REFERENCES groups(group_id) ON DELETE CASCADE,
-              status      TEXT NOT NULL DEFAULT 'active' CHECK (status IN ('active','inactive')),
-              since_date  TEXT NOT NULL DEFAULT (date('now')),
-              until_date  TEXT,
-              PRIMARY KEY (client_id, group_id)
-            );
-            """
-        )
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS visits (
-              visit_id     INTEGER PRIMARY KEY AUTOINCREMENT,
-              visit_date   TEXT NOT NULL,
-              group_id     INTEGER NOT NULL REFERENCES groups(group_id),
-              schedule_id  INTEGER REFERENCES schedule(schedule_id),
-              client_id    INTEGER NOT NULL REFERENCES clients(client_id),
-              status       TEXT NOT NULL CHECK (status IN ('booked','attended','noshow','cancelled')),
-              created_by   INTEGER,
-              created_at   TEXT NOT NULL DEFAULT (datetime('now')),
-              comment      TEXT
-            );
-            """
-        )
-        conn.execute(
-            """
-            CREATE UNIQUE INDEX IF NOT EXISTS ux_visits_unique
-              ON visits(visit_date, group_id, schedule_id, client_id);
-            """
-        )
-        conn.execute("CREATE INDEX IF NOT EXISTS ix_visits_date_group ON visits(visit_date, group_id);")
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS passes (
-              pass_id     INTEGER PRIMARY KEY AUTOINCREMENT,
-              client_id   INTEGER NOT NULL REFERENCES clients(client_id) ON DELETE CASCADE,
-              group_id    INTEGER NOT NULL REFERENCES groups(group_id) ON DELETE CASCADE,
-              pass_type   TEXT NOT NULL DEFAULT 'monthly',
-              start_date  TEXT NOT NULL,
-              end_date    TEXT NOT NULL,
-              is_active   INTEGER NOT NULL DEFAULT 1 CHECK (is_active IN (0,1)),
-              price       INTEGER,
-              comment     TEXT,
-              created_at  TEXT NOT NULL DEFAULT (datetime('now'))
-            );
-            """
-        )
-        conn.execute(
-            """
-            CREATE INDEX IF NOT EXISTS ix_passes_client_group
-              ON passes(client_id, group_id, is_active);
-            """
-        )
-        conn.execute(
-            """
-            CREATE UNIQUE INDEX IF NOT EXISTS ux_passes_one_active_per_group
-              ON passes(client_id, group_id)
-              WHERE is_active = 1;
-            """
-        )
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS payments (
-              pay_id       INTEGER PRIMARY KEY AUTOINCREMENT,
-              pay_date     TEXT NOT NULL DEFAULT (date('now')),
-              client_id    INTEGER REFERENCES clients(client_id),
-              group_id     INTEGER REFERENCES groups(group_id),
-              pass_id      INTEGER REFERENCES passes(pass_id),
-              visit_id     INTEGER REFERENCES visits(visit_id),
-              amount       INTEGER NOT NULL CHECK (amount > 0),
-              method       TEXT NOT NULL CHECK (method IN ('cash','transfer','qr','defer')),
-              status       TEXT NOT NULL DEFAULT 'paid' CHECK (status IN ('paid','deferred','cancelled')),
-              purpose      TEXT NOT NULL CHECK (purpose IN ('pass','single','other')),
-              due_date     TEXT,
-              accepted_by  INTEGER,
-              comment      TEXT,
-              created_at   TEXT NOT NULL DEFAULT (datetime('now'))
-            );
+    with connection(db_path) as conn:
+        migrate(conn)
+
+
+def get_data_version(db_path: str) -> int:
+    with connection(db_path) as conn:
+        cur = conn.execute("SELECT version FROM data_version WHERE id = 1")
+        return int(cur.fetchone()[0])
+
+
+def get_report_file_id(
+    db_path: str, date_from: str, date_to: str, today: str, overdue_days: int, data_version: int
+) -> Optional[str]:
+    with connection(db_path) as conn:
+        cur = conn.execute(
             """
+            SELECT file_id
+            FROM report_files
+            WHERE date_from = ? AND date_to = ? AND report_today = ?
+              AND overdue_days = ? AND data_version = ?
+            LIMIT 1
+            """,
+            (date_from, date_to, today, overdue_days, data_version),
         )
-        conn.execute("CREATE INDEX IF NOT EXISTS ix_payments_date ON payments(pay_date);")
-        conn.execute("CREATE INDEX IF NOT EXISTS ix_payments_client ON payments(client_id);")
-        conn.execute("CREATE INDEX IF NOT EXISTS ix_payments_group ON payments(group_id);")
-        conn.execute("CREATE INDEX IF NOT EXISTS ix_payments_visit ON payments(visit_id);")
-        conn.execute("CREATE INDEX IF NOT EXISTS ix_payments_status_due ON payments(status, due_date);")
+        row = cur.fetchone()
+    return row[0] if row else None
+
+
+def save_report_file_id(
+    db_path: str,
+    date_from: str,
+    date_to: str,
+    today: str,
+    overdue_days: int,
+    data_version: int,
+    file_id: str,
+) -> None:
+    with connection(db_path) as conn:
+        conn.execute("DELETE FROM report_files WHERE data_version < ?", (data_version,))
         conn.execute(
             """
-            CREATE TABLE IF NOT EXISTS expense_categories (
-              category_id INTEGER PRIMARY KEY AUTOINCREMENT,
-              code        TEXT NOT NULL UNIQUE,
-              name        TEXT NOT NULL,
-              is_active   INTEGER NOT NULL DEFAULT 1 CHECK (is_active IN (0,1))
-            );
-            """
+            INSERT INTO report_files(date_from, date_to, report_today, overdue_days, data_version, file_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(date_from, date_to, report_today, overdue_days, data_version) DO UPDATE SET
+              file_id = excluded.file_id
+            """,
+            (date_from, date_to, today, overdue_days, data_version, file_id),
         )
-        conn.execute("CREATE INDEX IF NOT EXISTS ix_expense_categories_active ON expense_categories(is_active);")
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS expenses (
-              expense_id   INTEGER PRIMARY KEY AUTOINCREMENT,
-              exp_date     TEXT NOT NULL DEFAULT (date('now')),
-              category_id  INTEGER NOT NULL REFERENCES expense_categories(category_id),
-              amount       INTEGER NOT NULL CHECK (amount > 0),
-              method       TEXT NOT NULL CHECK (method IN ('cash','transfer','qr')),
-              comment      TEXT,
-              created_by   INTEGER,
-              created_at   TEXT NOT NULL DEFAULT (datetime('now'))
-            );
-            """
+
+
+def load_fsm_state(
+    db_path: str, storage_key: str, expires_before: float
+) -> Optional[Tuple[Optional[str], bytes, float]]:
+    with connection(db_path) as conn:
+        cur = conn.execute(
+            "SELECT state, data, updated_at FROM fsm_states WHERE storage_key = ? AND updated_at >= ?",
+            (storage_key, expires_before),
         )
-        conn.execute("CREATE INDEX IF NOT EXISTS ix_expenses_date ON expenses(exp_date);")
-        _ensure_groups_trainer_column(conn)
-        _ensure_schedule_columns(conn)
-        conn.commit()
-
-
-def _ensure_groups_trainer_column(conn: sqlite3.Connection) -> None:
-    cur = conn.execute("PRAGMA table_info(groups);")
-    columns = {row[1] for row in cur.fetchall()}
-    if "trainer_id" not in columns:
-        conn.execute("ALTER TABLE groups ADD COLUMN trainer_id INTEGER;")
-
-
-def _ensure_schedule_columns(conn: sqlite3.Connection) -> None:
-    cur = conn.execute("PRAGMA table_info(schedule);")
-    columns = {row[1] for row in cur.fetchall()}
-    if "room_name" not in columns:
-        conn.execute("ALTER TABLE schedule ADD COLUMN room_name TEXT;")
-    if "valid_from" not in columns:
-        conn.execute("ALTER TABLE schedule ADD COLUMN valid_from TEXT;")
-    if "valid_to" not in columns:
-        conn.execute("ALTER TABLE schedule ADD COLUMN valid_to TEXT;")
-    if "created_at" not in columns:
-        conn.execute(
-            "ALTER TABLE schedule ADD COLUMN created_at TEXT NOT NULL DEFAULT (datetime('now'));"
+        return cur.fetchone()
+
+
+def save_fsm_states(
+    db_path: str,
+    records: Iterable[Tuple[str, Optional[str], Optional[bytes], float]],
+    expires_before: float,
+) -> None:
+    # Records without state and data are deleted; everything untouched since
+    # expires_before is swept in the same write.
+    upserts = []
+    deletes = []
+    for storage_key, state, data, updated_at in records:
+        if state is None and data is None:
+            deletes.append((storage_key,))
+        else:
+            upserts.append((storage_key, state, data, updated_at))
+    with transaction(db_path) as conn:
+        conn.executemany(
+            """
+            INSERT INTO fsm_states(storage_key, state, data, updated_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(storage_key) DO UPDATE SET
+              state = excluded.state,
+              data = excluded.data,
+              updated_at = excluded.updated_at
+            """,
+            upserts,
         )
+        conn.executemany("DELETE FROM fsm_states WHERE storage_key = ?", deletes)
+        conn.execute("DELETE FROM fsm_states WHERE updated_at < ?", (expires_before,))
 
 
 def upsert_admin(db_path: str, tg_user_id: int, name: str) -> None:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         conn.execute(
             """
             INSERT INTO admins(tg_user_id, name, is_active)
@@ -261,31 +152,31 @@ def upsert_admin(db_path: str, tg_user_id: int, name: str) -> None:
             """,
             (tg_user_id, name),
         )
-        conn.commit()
+    invalidate_admin_cache(db_path)
 
 
 def deactivate_admin(db_path: str, tg_user_id: int) -> bool:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         cur = conn.execute(
             "UPDATE admins SET is_active = 0 WHERE tg_user_id = ?",
             (tg_user_id,),
         )
-        conn.commit()
-        return cur.rowcount > 0
+    invalidate_admin_cache(db_path)
+    return cur.rowcount > 0
 
 
 def set_admin_active(db_path: str, tg_user_id: int, is_active: bool) -> bool:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         cur = conn.execute(
             "UPDATE admins SET is_active = ? WHERE tg_user_id = ?",
             (1 if is_active else 0, tg_user_id),
         )
-        conn.commit()
-        return cur.rowcount > 0
+    invalidate_admin_cache(db_path)
+    return cur.rowcount > 0
 
 
 def list_admins(db_path: str) -> Tuple[List[AdminRecord], List[AdminRecord]]:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         cur = conn.execute(
             "SELECT tg_user_id, name, is_active FROM admins ORDER BY name COLLATE NOCASE"
         )
@@ -303,7 +194,7 @@ def list_admins(db_path: str) -> Tuple[List[AdminRecord], List[AdminRecord]]:
 
 
 def get_admin_by_tg_user_id(db_path: str, tg_user_id: int) -> Optional[AdminRecord]:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         cur = conn.execute(
             "SELECT tg_user_id, name, is_active FROM admins WHERE tg_user_id = ? LIMIT 1",
             (tg_user_id,),
@@ -314,17 +205,79 @@ def get_admin_by_tg_user_id(db_path: str, tg_user_id: int) -> Optional[AdminReco
     return AdminRecord(tg_user_id=row[0], name=row[1], is_active=row[2])
 
 
+def _cache_key(db_path: str) -> str:
+    return os.path.abspath(db_path)
+
+
+def reference_version(db_path: str, table: str) -> int:
+    return _reference_versions.get((_cache_key(db_path), table), 0)
+
+
+def _invalidate_reference(db_path: str, *tables: str) -> None:
+    key = _cache_key(db_path)
+    for table in tables:
+        _reference_versions[(key, table)] = _reference_versions.get((key, table), 0) + 1
+
+
+def _reference_cached(table: str) -> Callable[[Callable[..., list]], Callable[..., list]]:
+    def decorator(func: Callable[..., list]) -> Callable[..., list]:
+        def entry_key(db_path: str, args: tuple, kwargs: Dict[str, Any]) -> Tuple:
+            return (_cache_key(db_path), func.__name__, args, tuple(sorted(kwargs.items())))
+
+        def cache_peek(db_path: str, *args: Any, **kwargs: Any) -> Any:
+            entry = _reference_rows.get(entry_key(db_path, args, kwargs))
+            if entry is None or entry[0] != reference_version(db_path, table):
+                return REFERENCE_MISS
+            return list(entry[1])
+
+        @functools.wraps(func)
+        def wrapper(db_path: str, *args: Any, **kwargs: Any) -> list:
+            cached = cache_peek(db_path, *args, **kwargs)
+            if cached is not REFERENCE_MISS:
+                return cached
+            version = reference_version(db_path, table)
+            rows = func(db_path, *args, **kwargs)
+            _reference_rows[entry_key(db_path, args, kwargs)] = (version, rows)
+            return list(rows)
+
+        wrapper.cache_peek = cache_peek
+        return wrapper
+
+    return decorator
+
+
+def invalidate_admin_cache(db_path: str) -> None:
+    key = _cache_key(db_path)
+    _admin_generations[key] = _admin_generations.get(key, 0) + 1
+    _active_admin_ids.pop(key, None)
+
+
+def cached_active_admin_ids(db_path: str) -> Optional[FrozenSet[int]]:
+    return _active_admin_ids.get(_cache_key(db_path))
+
+
+def load_active_admin_ids(db_path: str) -> FrozenSet[int]:
+    key = _cache_key(db_path)
+    generation = _admin_generations.get(key, 0)
+    with connection(db_path) as conn:
+        cur = conn.execute("SELECT tg_user_id FROM admins WHERE is_active = 1")
+        admin_ids = frozenset(int(row[0]) for row in cur.fetchall())
+    # An admin write that invalidated the cache while this ran may not be in
+    # the rows above; storing them would keep stale access until the next write.
+    if _admin_generations.get(key, 0) == generation:
+        _active_admin_ids[key] = admin_ids
+    return admin_ids
+
+
 def is_admin_active(db_path: str, tg_user_id: int) -> bool:
-    with sqlite3.connect(db_path) as conn:
-        cur = conn.execute(
-            "SELECT 1 FROM admins WHERE tg_user_id = ? AND is_active = 1 LIMIT 1",
-            (tg_user_id,),
-        )
-        return cur.fetchone() is not None
+    admin_ids = cached_active_admin_ids(db_path)
+    if admin_ids is None:
+        admin_ids = load_active_admin_ids(db_path)
+    return tg_user_id in admin_ids
 
 
 def get_client_by_phone(db_path: str, phone: str) -> Optional[Tuple[int, str, str, Optional[str], Optional[str], Optional[str]]]:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         cur = conn.execute(
             """
             SELECT client_id, full_name, phone, tg_username, birth_date, comment
@@ -340,7 +293,7 @@ def get_client_by_phone(db_path: str, phone: str) -> Optional[Tuple[int, str, st
 def get_client_by_tg_username(
     db_path: str, tg_username: str
 ) -> Optional[Tuple[int, str, str, Optional[str], Optional[str], Optional[str]]]:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         cur = conn.execute(
             """
             SELECT client_id, full_name, phone, tg_username, birth_date, comment
@@ -356,7 +309,7 @@ def get_client_by_tg_username(
 def get_client_by_id(
     db_path: str, client_id: int
 ) -> Optional[Tuple[int, str, str, Optional[str], Optional[str], Optional[str]]]:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         cur = conn.execute(
             """
             SELECT client_id, full_name, phone, tg_username, birth_date, comment
@@ -376,17 +329,200 @@ def search_clients_by_name(
     if not query:
         return []
     normalized = query.casefold()
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
+        if len(normalized) >= 3:
+            cur = conn.execute(
+                """
+                SELECT c.client_id, c.full_name, c.phone
+                FROM clients_search s
+                JOIN clients c ON c.client_id = s.rowid
+                WHERE s.name_folded MATCH ?
+                ORDER BY s.name_folded, s.rowid
+                LIMIT ?
+                """,
+                ('"' + normalized.replace('"', '""') + '"', limit),
+            )
+        else:
+            cur = conn.execute(
+                """
+                SELECT c.client_id, c.full_name, c.phone
+                FROM clients_search s
+                JOIN clients c ON c.client_id = s.rowid
+                WHERE instr(s.name_folded, ?) > 0
+                ORDER BY s.name_folded, s.rowid
+                LIMIT ?
+                """,
+                (normalized, limit),
+            )
+        return cur.fetchall()
+
+
+def search_clients_fuzzy(
+    db_path: str, query: str, limit: int = 10, min_similarity: float = 0.3
+) -> List[Tuple[int, str, str]]:
+    key = fuzzy_key(query)
+    if not key:
+        return []
+    digits = key.replace(" ", "")
+    with connection(db_path) as conn:
+        if digits.isdigit():
+            return _search_clients_by_phone_digits(conn, digits, limit)
+
         cur = conn.execute(
             """
-            SELECT client_id, full_name, phone
-            FROM clients
+            SELECT c.client_id, c.full_name, c.phone
+            FROM client_search_keys k
+            JOIN clients c ON c.client_id = k.client_id
+            WHERE k.name_key >= ? AND k.name_key < ?
+            ORDER BY k.name_key, k.client_id
+            LIMIT ?
+            """,
+            (key, key + "\U0010ffff", limit),
+        )
+        results = cur.fetchall()
+        if len(results) >= limit:
+            return results
+
+        words = key.split()
+        seen = {row[0] for row in results}
+        if len(words) == 1:
+            results.extend(_fuzzy_single_word(conn, words[0], min_similarity, seen, limit - len(results)))
+            return results
+
+        best_scores: List[dict] = []
+        for word in words:
+            scores: dict = {}
+            for word_id, score in reversed(_similar_words(conn, word, min_similarity)):
+                cur = conn.execute("SELECT client_id FROM client_words WHERE word_id = ?", (word_id,))
+                scores.update(dict.fromkeys([row[0] for row in cur.fetchall()], score))
+            best_scores.append(scores)
+
+        ranked = _rank_fuzzy_candidates(best_scores, seen, limit - len(results))
+        if ranked:
+            placeholders = ", ".join("?" for _ in ranked)
+            cur = conn.execute(
+                f"SELECT client_id, full_name, phone FROM clients WHERE client_id IN ({placeholders})",
+                tuple(ranked),
+            )
+            rows = {row[0]: row for row in cur.fetchall()}
+            results.extend(rows[client_id] for client_id in ranked if client_id in rows)
+    return results
+
+
+def _fuzzy_single_word(
+    conn: sqlite3.Connection, word: str, min_similarity: float, exclude: set, limit: int
+) -> List[Tuple[int, str, str]]:
+    results: List[Tuple[int, str, str]] = []
+    for word_id, _score in _similar_words(conn, word, min_similarity):
+        cur = conn.execute(
+            """
+            SELECT c.client_id, c.full_name, c.phone
+            FROM client_words cw
+            JOIN clients c ON c.client_id = cw.client_id
+            WHERE cw.word_id = ?
+            ORDER BY cw.client_id
+            LIMIT ?
+            """,
+            (word_id, limit + len(exclude)),
+        )
+        for row in cur:
+            if row[0] in exclude:
+                continue
+            exclude.add(row[0])
+            results.append(row)
+            if len(results) >= limit:
+                return results
+    return results
+
+
+def _rank_fuzzy_candidates(best_scores: List[dict], exclude: set, limit: int) -> List[int]:
+    # Clients matching more query words always win, so candidates are taken
+    # from the widest overlap first and only scored within that tier.
+    totals: Counter = Counter()
+    for scores in best_scores:
+        totals.update(scores)
+    counts = Counter(chain.from_iterable(best_scores))
+    ranked: List[int] = []
+    taken = set(exclude)
+    for required in range(len(best_scores), 0, -1):
+        if len(ranked) >= limit:
+            break
+        tier = sorted(
+            client_id
+            for client_id, count in counts.items()
+            if count == required and client_id not in taken
+        )
+        best = heapq.nlargest(limit - len(ranked), tier, key=totals.__getitem__)
+        ranked.extend(best)
+        taken.update(best)
+    return ranked
+
+
+def _similar_words(
+    conn: sqlite3.Connection, word: str, min_similarity: float, limit: int = 10
+) -> List[Tuple[int, float]]:
+    grams = sorted(word_trigrams(word))
+    placeholders = ", ".join("?" for _ in grams)
+    # Prefix hits score 1.0 so that a partially typed word ranks like an exact one.
+    cur = conn.execute(
+        f"""
+        WITH hits AS (
+          SELECT word_id, COUNT(*) AS shared
+          FROM search_word_ngrams
+          WHERE gram IN ({placeholders})
+          GROUP BY word_id
+        )
+        SELECT w.word_id,
+               CASE
+                 WHEN substr(w.word, 1, ?) = ? THEN 1.0
+                 ELSE CAST(h.shared AS REAL) / (? + w.gram_count - h.shared)
+               END AS score
+        FROM hits h
+        JOIN search_words w ON w.word_id = h.word_id
+        WHERE score >= ?
+        ORDER BY score DESC, w.word
+        LIMIT ?
+        """,
+        (*grams, len(word), word, len(grams), min_similarity, limit),
+    )
+    return cur.fetchall()
+
+
+def _search_clients_by_phone_digits(
+    conn: sqlite3.Connection, digits: str, limit: int
+) -> List[Tuple[int, str, str]]:
+    if len(digits) < 3:
+        cur = conn.execute(
+            """
+            SELECT c.client_id, c.full_name, c.phone
+            FROM client_search_keys k
+            JOIN clients c ON c.client_id = k.client_id
+            WHERE k.phone_key >= ? AND k.phone_key < ?
+            ORDER BY k.phone_key
+            LIMIT ?
             """,
+            (digits, digits + ":", limit),
         )
-        rows = cur.fetchall()
-    matched = [row for row in rows if normalized in row[1].casefold()]
-    matched.sort(key=lambda row: row[1].casefold())
-    return matched[:limit]
+        return cur.fetchall()
+    grams = sorted(phone_trigrams(digits))
+    exists_clause = "".join(
+        " AND EXISTS (SELECT 1 FROM client_phone_ngrams o WHERE o.gram = ? AND o.client_id = n.client_id)"
+        for _ in grams[1:]
+    )
+    cur = conn.execute(
+        f"""
+        SELECT c.client_id, c.full_name, c.phone
+        FROM client_phone_ngrams n
+        JOIN client_search_keys k ON k.client_id = n.client_id
+        JOIN clients c ON c.client_id = n.client_id
+        WHERE n.gram = ?{exists_clause}
+          AND instr(k.phone_key, ?) > 0
+        ORDER BY instr(k.phone_key, ?) = 1 DESC, k.phone_key
+        LIMIT ?
+        """,
+        (*grams, digits, digits, limit),
+    )
+    return cur.fetchall()
 
 
 def create_client(
@@ -398,7 +534,7 @@ def create_client(
     birth_date: Optional[str],
     comment: Optional[str],
 ) -> int:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         cur = conn.execute(
             """
             INSERT INTO clients(full_name, phone, tg_user_id, tg_username, birth_date, comment)
@@ -406,12 +542,14 @@ def create_client(
             """,
             (full_name, phone, tg_user_id, tg_username, birth_date, comment),
         )
-        conn.commit()
-        return int(cur.lastrowid)
+        client_id = int(cur.lastrowid)
+        index_client_search(conn, client_id, full_name, phone)
+        return client_id
 
 
+@_reference_cached("groups")
 def list_active_groups(db_path: str) -> List[Tuple[int, str, Optional[str], int, Optional[str], Optional[int]]]:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         cur = conn.execute(
             """
             SELECT group_id, name, trainer_name, capacity, room_name, trainer_id
@@ -432,7 +570,7 @@ def create_group(
     is_active: int = 1,
     trainer_id: Optional[int] = None,
 ) -> int:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         resolved_trainer_name = trainer_name
         resolved_trainer_id = trainer_id
         if resolved_trainer_id is not None:
@@ -452,14 +590,14 @@ def create_group(
             """,
             (name, resolved_trainer_name, resolved_trainer_id, capacity, room_name, is_active),
         )
-        conn.commit()
-        return int(cur.lastrowid)
+    _invalidate_reference(db_path, "groups")
+    return int(cur.lastrowid)
 
 
 def get_active_pass(
     db_path: str, client_id: int, group_id: int, on_date: Optional[str] = None
 ) -> Optional[Tuple[int, str, str, int, Optional[int], Optional[str]]]:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         if on_date:
             cur = conn.execute(
                 """
@@ -494,7 +632,7 @@ def create_pass(
     price: Optional[int] = None,
     comment: Optional[str] = None,
 ) -> int:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         cur = conn.execute(
             """
             INSERT INTO passes(client_id, group_id, start_date, end_date, is_active, price, comment)
@@ -502,12 +640,43 @@ def create_pass(
             """,
             (client_id, group_id, start_date, end_date, is_active, price, comment),
         )
-        conn.commit()
         return int(cur.lastrowid)
 
 
+def issue_pass(
+    db_path: str,
+    client_id: int,
+    group_id: int,
+    start_date: str,
+    end_date: str,
+    is_active: int,
+    price: Optional[int] = None,
+    comment: Optional[str] = None,
+    payment_amount: Optional[int] = None,
+    payment_method: Optional[str] = None,
+    payment_status: Optional[str] = None,
+    accepted_by: Optional[int] = None,
+) -> int:
+    with transaction(db_path):
+        pass_id = create_pass(db_path, client_id, group_id, start_date, end_date, is_active, price, comment)
+        upsert_client_group_active(db_path, client_id, group_id)
+        if payment_amount is not None:
+            create_payment_pass(
+                db_path,
+                client_id,
+                group_id,
+                pass_id,
+                payment_amount,
+                payment_method,
+                payment_status,
+                None,
+                accepted_by,
+            )
+        return pass_id
+
+
 def get_pass_by_id(db_path: str, pass_id: int) -> Optional[Tuple]:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         cur = conn.execute(
             "SELECT * FROM passes WHERE pass_id = ? LIMIT 1",
             (pass_id,),
@@ -516,7 +685,7 @@ def get_pass_by_id(db_path: str, pass_id: int) -> Optional[Tuple]:
 
 
 def get_group_by_id(db_path: str, group_id: int) -> Optional[Tuple]:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         cur = conn.execute(
             """
             SELECT group_id, name, trainer_id, trainer_name, capacity, room_name, is_active
@@ -529,8 +698,9 @@ def get_group_by_id(db_path: str, group_id: int) -> Optional[Tuple]:
         return cur.fetchone()
 
 
+@_reference_cached("groups")
 def list_groups(db_path: str, include_inactive: bool = False) -> List[Tuple]:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         if include_inactive:
             cur = conn.execute(
                 """
@@ -552,7 +722,7 @@ def list_groups(db_path: str, include_inactive: bool = False) -> List[Tuple]:
 
 
 def list_groups_by_trainer(db_path: str, trainer_id: int) -> List[Tuple[int, str, int, Optional[str]]]:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         cur = conn.execute(
             """
             SELECT group_id, name, capacity, room_name
@@ -566,22 +736,22 @@ def list_groups_by_trainer(db_path: str, trainer_id: int) -> List[Tuple[int, str
 
 
 def rename_group(db_path: str, group_id: int, new_name: str) -> None:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         conn.execute("UPDATE groups SET name = ? WHERE group_id = ?", (new_name, group_id))
-        conn.commit()
+    _invalidate_reference(db_path, "groups")
 
 
 def set_group_active(db_path: str, group_id: int, is_active: bool) -> None:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         conn.execute(
             "UPDATE groups SET is_active = ? WHERE group_id = ?",
             (1 if is_active else 0, group_id),
         )
-        conn.commit()
+    _invalidate_reference(db_path, "groups")
 
 
 def set_group_trainer(db_path: str, group_id: int, trainer_id: int) -> bool:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         cur = conn.execute(
             "SELECT full_name, is_active FROM trainers WHERE trainer_id = ?",
             (trainer_id,),
@@ -594,23 +764,23 @@ def set_group_trainer(db_path: str, group_id: int, trainer_id: int) -> bool:
             "UPDATE groups SET trainer_id = ?, trainer_name = ? WHERE group_id = ?",
             (trainer_id, trainer_name, group_id),
         )
-        conn.commit()
-        return True
+    _invalidate_reference(db_path, "groups")
+    return True
 
 
 def clear_group_trainer(db_path: str, group_id: int) -> None:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         conn.execute(
             "UPDATE groups SET trainer_id = NULL, trainer_name = NULL WHERE group_id = ?",
             (group_id,),
         )
-        conn.commit()
+    _invalidate_reference(db_path, "groups")
 
 
 def list_schedule_for_group(
     db_path: str, group_id: int, include_inactive: bool = False
 ) -> List[Tuple[int, int, str, int, Optional[str], int]]:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         if include_inactive:
             cur = conn.execute(
                 """
@@ -635,7 +805,7 @@ def list_schedule_for_group(
 
 
 def get_schedule_by_id(db_path: str, schedule_id: int) -> Optional[Tuple]:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         cur = conn.execute(
             """
             SELECT schedule_id, group_id, day_of_week, time_hhmm, duration_min, room_name, is_active
@@ -658,7 +828,7 @@ def add_schedule_slot(
     valid_from: Optional[str] = None,
     valid_to: Optional[str] = None,
 ) -> int:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         cur = conn.execute(
             """
             INSERT INTO schedule(
@@ -668,7 +838,6 @@ def add_schedule_slot(
             """,
             (group_id, weekday, start_time, duration_min, room_name, valid_from, valid_to),
         )
-        conn.commit()
         return int(cur.lastrowid)
 
 
@@ -705,27 +874,24 @@ def update_schedule_slot(
     if not fields:
         return
     values.append(schedule_id)
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         conn.execute(
             f"UPDATE schedule SET {', '.join(fields)} WHERE schedule_id = ?",
             tuple(values),
         )
-        conn.commit()
 
 
 def delete_schedule_slot(db_path: str, schedule_id: int) -> None:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         conn.execute("DELETE FROM schedule WHERE schedule_id = ?", (schedule_id,))
-        conn.commit()
 
 
 def toggle_schedule_slot(db_path: str, schedule_id: int, is_active: bool) -> None:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         conn.execute(
             "UPDATE schedule SET is_active = ? WHERE schedule_id = ?",
             (1 if is_active else 0, schedule_id),
         )
-        conn.commit()
 
 
 def create_trainer(
@@ -735,7 +901,7 @@ def create_trainer(
     tg_user_id: Optional[int] = None,
     tg_username: Optional[str] = None,
 ) -> int:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         cur = conn.execute(
             """
             INSERT INTO trainers(full_name, phone, tg_user_id, tg_username, is_active)
@@ -743,12 +909,13 @@ def create_trainer(
             """,
             (full_name, phone, tg_user_id, tg_username),
         )
-        conn.commit()
-        return int(cur.lastrowid)
+    _invalidate_reference(db_path, "trainers")
+    return int(cur.lastrowid)
 
 
+@_reference_cached("trainers")
 def list_active_trainers(db_path: str) -> List[Tuple]:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         cur = conn.execute(
             """
             SELECT trainer_id, full_name, phone, tg_user_id, tg_username, is_active
@@ -760,8 +927,9 @@ def list_active_trainers(db_path: str) -> List[Tuple]:
         return cur.fetchall()
 
 
+@_reference_cached("trainers")
 def list_trainers(db_path: str, include_inactive: bool = False) -> List[Tuple]:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         if include_inactive:
             cur = conn.execute(
                 """
@@ -783,7 +951,7 @@ def list_trainers(db_path: str, include_inactive: bool = False) -> List[Tuple]:
 
 
 def get_trainer_by_id(db_path: str, trainer_id: int) -> Optional[Tuple]:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         cur = conn.execute(
             """
             SELECT trainer_id, full_name, phone, tg_user_id, tg_username, is_active
@@ -797,7 +965,7 @@ def get_trainer_by_id(db_path: str, trainer_id: int) -> Optional[Tuple]:
 
 
 def update_trainer_name(db_path: str, trainer_id: int, new_name: str) -> None:
-    with sqlite3.connect(db_path) as conn:
+    with transaction(db_path) as conn:
         conn.execute(
             "UPDATE trainers SET full_name = ? WHERE trainer_id = ?",
             (new_name, trainer_id),
@@ -806,20 +974,20 @@ def update_trainer_name(db_path: str, trainer_id: int, new_name: str) -> None:
             "UPDATE groups SET trainer_name = ? WHERE trainer_id = ?",
             (new_name, trainer_id),
         )
-        conn.commit()
+    _invalidate_reference(db_path, "trainers", "groups")
 
 
 def set_trainer_active(db_path: str, trainer_id: int, is_active: bool) -> None:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         conn.execute(
             "UPDATE trainers SET is_active = ? WHERE trainer_id = ?",
             (1 if is_active else 0, trainer_id),
         )
-        conn.commit()
+    _invalidate_reference(db_path, "trainers")
 
 
 def upsert_client_group_active(db_path: str, client_id: int, group_id: int) -> None:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         conn.execute(
             """
             INSERT INTO client_groups(client_id, group_id, status)
@@ -830,11 +998,10 @@ def upsert_client_group_active(db_path: str, client_id: int, group_id: int) -> N
             """,
             (client_id, group_id),
         )
-        conn.commit()
 
 
 def visit_exists(db_path: str, date: str, group_id: int, client_id: int) -> bool:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         cur = conn.execute(
             """
             SELECT 1
@@ -850,24 +1017,22 @@ def visit_exists(db_path: str, date: str, group_id: int, client_id: int) -> bool
 def create_single_visit_booked(
     db_path: str, date: str, group_id: int, client_id: int, created_by: Optional[int]
 ) -> bool:
-    if visit_exists(db_path, date, group_id, client_id):
-        return False
-    with sqlite3.connect(db_path) as conn:
-        conn.execute(
+    with connection(db_path) as conn:
+        cur = conn.execute(
             """
             INSERT INTO visits(visit_date, group_id, schedule_id, client_id, status, created_by)
             VALUES (?, ?, NULL, ?, 'booked', ?)
+            ON CONFLICT(visit_date, group_id, client_id) WHERE schedule_id IS NULL DO NOTHING
             """,
             (date, group_id, client_id, created_by),
         )
-        conn.commit()
-    return True
+        return cur.rowcount > 0
 
 
 def list_clients_for_attendance(
     db_path: str, group_id: int, visit_date: str
 ) -> List[Tuple[int, str, str]]:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         cur = conn.execute(
             """
             SELECT client_id, full_name, phone FROM (
@@ -891,7 +1056,7 @@ def list_clients_for_attendance(
 def get_visit_by_date_group_client(
     db_path: str, visit_date: str, group_id: int, client_id: int
 ) -> Optional[Tuple[int, str]]:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         cur = conn.execute(
             """
             SELECT visit_id, status
@@ -912,50 +1077,77 @@ def upsert_visit_status(
     status: str,
     created_by: Optional[int],
 ) -> None:
-    existing = get_visit_by_date_group_client(db_path, visit_date, group_id, client_id)
-    with sqlite3.connect(db_path) as conn:
-        if existing:
-            conn.execute(
-                """
-                UPDATE visits
-                SET status = ?, created_by = ?
-                WHERE visit_id = ?
-                """,
-                (status, created_by, existing[0]),
-            )
-        else:
-            conn.execute(
-                """
-                INSERT INTO visits(visit_date, group_id, schedule_id, client_id, status, created_by)
-                VALUES (?, ?, NULL, ?, ?, ?)
-                """,
-                (visit_date, group_id, client_id, status, created_by),
-            )
-        conn.commit()
+    with connection(db_path) as conn:
+        conn.execute(
+            """
+            INSERT INTO visits(visit_date, group_id, schedule_id, client_id, status, created_by)
+            VALUES (?, ?, NULL, ?, ?, ?)
+            ON CONFLICT(visit_date, group_id, client_id) WHERE schedule_id IS NULL DO UPDATE SET
+              status = excluded.status,
+              created_by = excluded.created_by
+            """,
+            (visit_date, group_id, client_id, status, created_by),
+        )
+
+
+def upsert_visit_statuses(
+    db_path: str,
+    visit_date: str,
+    group_id: int,
+    statuses: Iterable[Tuple[int, str]],
+    created_by: Optional[int],
+) -> int:
+    rows = [(visit_date, group_id, client_id, status, created_by) for client_id, status in statuses]
+    if not rows:
+        return 0
+    with connection(db_path) as conn:
+        # Only new rows and plain bookings are written; statuses set earlier are kept.
+        cursor = conn.executemany(
+            """
+            INSERT INTO visits(visit_date, group_id, schedule_id, client_id, status, created_by)
+            VALUES (?, ?, NULL, ?, ?, ?)
+            ON CONFLICT(visit_date, group_id, client_id) WHERE schedule_id IS NULL DO UPDATE SET
+              status = excluded.status,
+              created_by = excluded.created_by
+            WHERE visits.status = 'booked'
+            """,
+            rows,
+        )
+        return cursor.rowcount
 
 
 def get_or_create_single_visit(
     db_path: str, client_id: int, group_id: int, visit_date: str, created_by: Optional[int]
 ) -> int:
-    existing = get_visit_by_date_group_client(db_path, visit_date, group_id, client_id)
-    if existing:
-        return int(existing[0])
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         cur = conn.execute(
             """
             INSERT INTO visits(visit_date, group_id, schedule_id, client_id, status, created_by)
             VALUES (?, ?, NULL, ?, 'booked', ?)
+            ON CONFLICT(visit_date, group_id, client_id) WHERE schedule_id IS NULL DO NOTHING
+            RETURNING visit_id
             """,
             (visit_date, group_id, client_id, created_by),
         )
-        conn.commit()
-        return int(cur.lastrowid)
+        row = cur.fetchone()
+        if row is None:
+            # Existing visit: a no-op UPDATE would still fire the rollup and
+            # data_version triggers and invalidate cached reports.
+            row = conn.execute(
+                """
+                SELECT visit_id
+                FROM visits
+                WHERE visit_date = ? AND group_id = ? AND client_id = ? AND schedule_id IS NULL
+                """,
+                (visit_date, group_id, client_id),
+            ).fetchone()
+        return int(row[0])
 
 
 def list_active_passes(
     db_path: str, client_id: int, group_id: int, on_date: Optional[str] = None
 ) -> List[Tuple[int, str, str, Optional[int], Optional[str]]]:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         if on_date:
             cur = conn.execute(
                 """
@@ -992,7 +1184,7 @@ def create_payment_single(
     accepted_by: Optional[int],
     comment: Optional[str] = None,
 ) -> int:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         cur = conn.execute(
             """
             INSERT INTO payments(
@@ -1003,7 +1195,6 @@ def create_payment_single(
             """,
             (client_id, group_id, visit_id, amount, method, status, due_date, accepted_by, comment),
         )
-        conn.commit()
         return int(cur.lastrowid)
 
 
@@ -1019,7 +1210,7 @@ def create_payment_pass(
     accepted_by: Optional[int],
     comment: Optional[str] = None,
 ) -> int:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         cur = conn.execute(
             """
             INSERT INTO payments(
@@ -1030,14 +1221,13 @@ def create_payment_pass(
             """,
             (client_id, group_id, pass_id, amount, method, status, due_date, accepted_by, comment),
         )
-        conn.commit()
         return int(cur.lastrowid)
 
 
 def list_deferred_payments_by_client(
     db_path: str, client_id: int
 ) -> List[Tuple[int, int, str, Optional[int], Optional[str], Optional[str], str]]:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         cur = conn.execute(
             """
             SELECT p.pay_id, p.amount, p.purpose, p.group_id, g.name, p.due_date, p.created_at
@@ -1052,7 +1242,7 @@ def list_deferred_payments_by_client(
 
 
 def get_payment_by_id(db_path: str, pay_id: int) -> Optional[Tuple]:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         cur = conn.execute(
             "SELECT * FROM payments WHERE pay_id = ? LIMIT 1",
             (pay_id,),
@@ -1063,7 +1253,7 @@ def get_payment_by_id(db_path: str, pay_id: int) -> Optional[Tuple]:
 def close_deferred_payment(
     db_path: str, pay_id: int, new_method: str, pay_date: str, accepted_by: Optional[int]
 ) -> None:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         conn.execute(
             """
             UPDATE payments
@@ -1072,13 +1262,12 @@ def close_deferred_payment(
             """,
             (new_method, pay_date, accepted_by, pay_id),
         )
-        conn.commit()
 
 
 def get_defer_summary(
     db_path: str, client_id: int, today: str
 ) -> Tuple[int, int, Optional[str], int]:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         cur = conn.execute(
             """
             SELECT
@@ -1097,8 +1286,9 @@ def get_defer_summary(
     return int(row[0] or 0), int(row[1] or 0), row[2], int(row[3] or 0)
 
 
+@_reference_cached("expense_categories")
 def list_expense_categories(db_path: str, include_inactive: bool) -> List[Tuple[int, str, int]]:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         if include_inactive:
             cur = conn.execute(
                 """
@@ -1128,7 +1318,7 @@ def _normalize_category_code(name: str) -> str:
 
 
 def _ensure_unique_category_code(db_path: str, base: str) -> str:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         cur = conn.execute("SELECT code FROM expense_categories WHERE code LIKE ?", (f"{base}%",))
         existing = {row[0] for row in cur.fetchall()}
     if base not in existing:
@@ -1141,31 +1331,31 @@ def _ensure_unique_category_code(db_path: str, base: str) -> str:
 
 def create_expense_category(db_path: str, name: str) -> int:
     code = _ensure_unique_category_code(db_path, _normalize_category_code(name))
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         cur = conn.execute(
             "INSERT INTO expense_categories(code, name, is_active) VALUES (?, ?, 1)",
             (code, name),
         )
-        conn.commit()
-        return int(cur.lastrowid)
+    _invalidate_reference(db_path, "expense_categories")
+    return int(cur.lastrowid)
 
 
 def rename_expense_category(db_path: str, category_id: int, new_name: str) -> None:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         conn.execute(
             "UPDATE expense_categories SET name = ? WHERE category_id = ?",
             (new_name, category_id),
         )
-        conn.commit()
+    _invalidate_reference(db_path, "expense_categories")
 
 
 def set_expense_category_active(db_path: str, category_id: int, is_active: bool) -> None:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         conn.execute(
             "UPDATE expense_categories SET is_active = ? WHERE category_id = ?",
             (1 if is_active else 0, category_id),
         )
-        conn.commit()
+    _invalidate_reference(db_path, "expense_categories")
 
 
 def create_expense(
@@ -1177,7 +1367,7 @@ def create_expense(
     comment: Optional[str],
     created_by: Optional[int],
 ) -> int:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         cur = conn.execute(
             """
             INSERT INTO expenses(exp_date, category_id, amount, method, comment, created_by)
@@ -1185,12 +1375,11 @@ def create_expense(
             """,
             (exp_date, category_id, amount, method, comment, created_by),
         )
-        conn.commit()
         return int(cur.lastrowid)
 
 
 def get_last_expense(db_path: str, created_by: int) -> Optional[Tuple[int, str, int, int, str, Optional[str]]]:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         cur = conn.execute(
             """
             SELECT expense_id, exp_date, category_id, amount, method, comment
@@ -1207,7 +1396,7 @@ def get_last_expense(db_path: str, created_by: int) -> Optional[Tuple[int, str,
 def list_expenses(
     db_path: str, date_from: str, date_to: str, category_id: Optional[int] = None, limit: int = 100
 ) -> List[Tuple[int, str, int, str, int, str, Optional[str]]]:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         if category_id is None:
             cur = conn.execute(
                 """
@@ -1238,7 +1427,7 @@ def list_expenses(
 def get_expense_by_id(
     db_path: str, expense_id: int
 ) -> Optional[Tuple[int, str, int, str, int, str, Optional[str]]]:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         cur = conn.execute(
             """
             SELECT e.expense_id, e.exp_date, e.category_id, c.name, e.amount, e.method, e.comment
@@ -1260,7 +1449,7 @@ def update_expense(
     amount: Optional[int] = None,
     method: Optional[str] = None,
     comment: Optional[str] = None,
-) -> None:
+) -> Optional[Tuple[int, str, int, str, int, str, Optional[str]]]:
     fields = []
     values: list = []
     if exp_date is not None:
@@ -1279,17 +1468,16 @@ def update_expense(
         fields.append("comment = ?")
         values.append(comment)
     if not fields:
-        return
+        return get_expense_by_id(db_path, expense_id)
     values.append(expense_id)
-    with sqlite3.connect(db_path) as conn:
+    with transaction(db_path) as conn:
         conn.execute(
             f"UPDATE expenses SET {', '.join(fields)} WHERE expense_id = ?",
             tuple(values),
         )
-        conn.commit()
+        return get_expense_by_id(db_path, expense_id)
 
 
 def delete_expense(db_path: str, expense_id: int) -> None:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         conn.execute("DELETE FROM expenses WHERE expense_id = ?", (expense_id,))
-        conn.commit()
@@ -0,0 +1,339 @@
+from __future__ import annotations
+
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+DEFAULT_POOL_SIZE = 4
+DEFAULT_ACQUIRE_TIMEOUT = 30.0
+DEFAULT_HEALTH_CHECK_INTERVAL = 60.0
+
+
+@dataclass
+class QueryStats:
+    connection: sqlite3.Connection
+    caller: str
+    sql: str
+    # None for executemany batches
+    parameters: Any
+    seconds: float = 0.0
+    rows: int = 0
+
+
+# Only connections opened after the first observer is added are
+# instrumented, so plain runs pay nothing.
+QueryObserver = Callable[[QueryStats], None]
+
+_query_observers: List[QueryObserver] = []
+
+
+class PoolTimeoutError(RuntimeError):
+    pass
+
+
+def add_query_observer(observer: QueryObserver) -> None:
+    _query_observers.append(observer)
+
+
+def remove_query_observer(observer: QueryObserver) -> None:
+    if observer in _query_observers:
+        _query_observers.remove(observer)
+
+
+def _query_caller() -> str:
+    frame = sys._getframe(2)
+    while frame is not None and frame.f_globals.get("__name__") == __name__:
+        frame = frame.f_back
+    if frame is None:
+        return "unknown"
+    return f"{frame.f_globals.get('__name__')}.{frame.f_code.co_name}"
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    # SQLite steps rows lazily, so a statement is timed from execute until its
+    # rows are drained, the cursor is reused or closed, or it is collected.
+    _pending: Optional[QueryStats] = None
+
+    def _finish(self) -> None:
+        pending = self._pending
+        if pending is None:
+            return
+        self._pending = None
+        for observer in _query_observers:
+            observer(pending)
+
+    def execute(self, sql: str, parameters: Any = ()) -> "InstrumentedCursor":
+        if not _query_observers:
+            return super().execute(sql, parameters)
+        self._finish()
+        caller = _query_caller()
+        started = time.perf_counter()
+        super().execute(sql, parameters)
+        self._pending = QueryStats(self.connection, caller, sql, parameters, time.perf_counter() - started)
+        if self.description is None:
+            self._pending.rows = max(self.rowcount, 0)
+            self._finish()
+        return self
+
+    def executemany(self, sql: str, seq_of_parameters: Any) -> "InstrumentedCursor":
+        if not _query_observers:
+            return super().executemany(sql, seq_of_parameters)
+        self._finish()
+        caller = _query_caller()
+        started = time.perf_counter()
+        super().executemany(sql, seq_of_parameters)
+        self._pending = QueryStats(
+            self.connection, caller, sql, None, time.perf_counter() - started, max(self.rowcount, 0)
+        )
+        self._finish()
+        return self
+
+    def fetchone(self) -> Any:
+        pending = self._pending
+        if pending is None:
+            return super().fetchone()
+        started = time.perf_counter()
+        row = super().fetchone()
+        pending.seconds += time.perf_counter() - started
+        if row is None:
+            self._finish()
+        else:
+            pending.rows += 1
+        return row
+
+    def fetchmany(self, size: Optional[int] = None) -> list:
+        pending = self._pending
+        if pending is None:
+            return super().fetchmany(self.arraysize if size is None else size)
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        pending.seconds += time.perf_counter() - started
+        pending.rows += len(rows)
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self) -> list:
+        pending = self._pending
+        if pending is None:
+            return super().fetchall()
+        started = time.perf_counter()
+        rows = super().fetchall()
+        pending.seconds += time.perf_counter() - started
+        pending.rows += len(rows)
+        self._finish()
+        return rows
+
+    def __next__(self) -> Any:
+        pending = self._pending
+        if pending is None:
+            return super().__next__()
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            pending.seconds += time.perf_counter() - started
+            self._finish()
+            raise
+        pending.seconds += time.perf_counter() - started
+        pending.rows += 1
+        return row
+
+    def close(self) -> None:
+        self._finish()
+        super().close()
+
+    def __del__(self) -> None:
+        self._finish()
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    # Connection.execute builds a plain cursor in C, so it is rerouted
+    # through cursor() to make every statement observable.
+    def cursor(self, factory: Any = None) -> sqlite3.Cursor:
+        return super().cursor(factory or InstrumentedCursor)
+
+    def execute(self, sql: str, parameters: Any = ()) -> sqlite3.Cursor:
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql: str, seq_of_parameters: Any) -> sqlite3.Cursor:
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+class _PooledConnection:
+    __slots__ = ("conn", "last_used")
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+        self.last_used = time.monotonic()
+
+
+class ConnectionPool:
+    def __init__(
+        self,
+        db_path: str,
+        size: int = DEFAULT_POOL_SIZE,
+        acquire_timeout: float = DEFAULT_ACQUIRE_TIMEOUT,
+        health_check_interval: float = DEFAULT_HEALTH_CHECK_INTERVAL,
+    ) -> None:
+        if size < 1:
+            raise ValueError("Pool size must be positive")
+        self.db_path = db_path
+        self.size = size
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+        self._idle: "queue.LifoQueue[_PooledConnection]" = queue.LifoQueue()
+        self._all: List[_PooledConnection] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._closed = False
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,
+            timeout=self.acquire_timeout,
+            factory=InstrumentedConnection if _query_observers else sqlite3.Connection,
+        )
+        conn.execute("PRAGMA journal_mode=WAL;")
+        return conn
+
+    def _checkout(self) -> _PooledConnection:
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+        try:
+            item = self._idle.get_nowait()
+        except queue.Empty:
+            item = None
+        if item is None:
+            with self._lock:
+                if len(self._all) < self.size:
+                    item = _PooledConnection(self._open())
+                    self._all.append(item)
+        if item is None:
+            try:
+                item = self._idle.get(timeout=self.acquire_timeout)
+            except queue.Empty as exc:
+                raise PoolTimeoutError(
+                    f"No free connection for {self.db_path} after {self.acquire_timeout}s"
+                ) from exc
+        if time.monotonic() - item.last_used > self.health_check_interval:
+            self._ensure_healthy(item)
+        return item
+
+    def _ensure_healthy(self, item: _PooledConnection) -> None:
+        try:
+            item.conn.execute("SELECT 1").fetchone()
+        except sqlite3.Error:
+            try:
+                item.conn.close()
+            except sqlite3.Error:
+                pass
+            item.conn = self._open()
+
+    def _checkin(self, item: _PooledConnection) -> None:
+        item.last_used = time.monotonic()
+        if item.conn.in_transaction:
+            item.conn.rollback()
+        if self._closed:
+            item.conn.close()
+            return
+        self._idle.put(item)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        held: Optional[_PooledConnection] = getattr(self._local, "item", None)
+        if held is not None:
+            self._local.depth += 1
+            try:
+                yield held.conn
+            finally:
+                self._local.depth -= 1
+            return
+
+        item = self._checkout()
+        self._local.item = item
+        self._local.depth = 1
+        try:
+            yield item.conn
+            if item.conn.in_transaction:
+                item.conn.commit()
+        except BaseException:
+            if item.conn.in_transaction:
+                item.conn.rollback()
+            raise
+        finally:
+            self._local.item = None
+            self._local.depth = 0
+            self._checkin(item)
+
+    def close(self) -> None:
+        self._closed = True
+        while True:
+            try:
+                item = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            item.conn.close()
+        with self._lock:
+            self._all.clear()
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+_pool_size = DEFAULT_POOL_SIZE
+
+
+def _pool_key(db_path: str) -> str:
+    return os.path.abspath(db_path)
+
+
+def configure_pool(db_path: str, size: int) -> ConnectionPool:
+    global _pool_size
+    key = _pool_key(db_path)
+    with _pools_lock:
+        _pool_size = size
+        existing = _pools.pop(key, None)
+        pool = ConnectionPool(db_path, size=size)
+        _pools[key] = pool
+    if existing is not None:
+        existing.close()
+    return pool
+
+
+def get_pool(db_path: str) -> ConnectionPool:
+    key = _pool_key(db_path)
+    pool = _pools.get(key)
+    if pool is not None:
+        return pool
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(db_path, size=_pool_size)
+            _pools[key] = pool
+        return pool
+
+
+def connection(db_path: str):
+    return get_pool(db_path).connection()
+
+
+def close_pool(db_path: str) -> None:
+    with _pools_lock:
+        pool = _pools.pop(_pool_key(db_path), None)
+    if pool is not None:
+        pool.close()
+
+
+def close_all_pools() -> None:
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Mapping, Optional, Set
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+
+from async_db import load_fsm_state, save_fsm_states
+
+DEFAULT_FSM_TTL = 24 * 60 * 60
+DEFAULT_FLUSH_DELAY = 0.5
+# How often an access sweeps expired keys out of memory.
+PRUNE_INTERVAL = 60.0
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Record:
+    state: Optional[str]
+    # JSON-encoded dict; None stands for empty data
+    data: Optional[bytes]
+    updated_at: float
+
+
+class SQLiteStorage(BaseStorage):
+    # Keeps every touched key in memory and writes changes back in batches:
+    # the several set_state/update_data calls a handler makes end up in one
+    # transaction flush_delay seconds later (or on close).
+    def __init__(
+        self,
+        db_path: str,
+        ttl: float = DEFAULT_FSM_TTL,
+        flush_delay: float = DEFAULT_FLUSH_DELAY,
+    ) -> None:
+        self._db_path = db_path
+        self._ttl = ttl
+        self._flush_delay = flush_delay
+        self._key_builder = DefaultKeyBuilder(
+            with_bot_id=True, with_business_connection_id=True, with_destiny=True
+        )
+        self._records: Dict[str, _Record] = {}
+        self._dirty: Set[str] = set()
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_lock = asyncio.Lock()
+        self._pruned_at = time.time()
+
+    def _prune(self, expires_before: float) -> None:
+        for storage_key, record in list(self._records.items()):
+            if record.updated_at < expires_before and storage_key not in self._dirty:
+                del self._records[storage_key]
+
+    async def _record(self, storage_key: str) -> _Record:
+        now = time.time()
+        expires_before = now - self._ttl
+        if now - self._pruned_at >= PRUNE_INTERVAL:
+            self._pruned_at = now
+            self._prune(expires_before)
+        record = self._records.get(storage_key)
+        if record is None:
+            row = await load_fsm_state(self._db_path, storage_key, expires_before)
+            loaded = _Record(*row) if row else _Record(None, None, time.time())
+            record = self._records.setdefault(storage_key, loaded)
+        elif record.updated_at < expires_before:
+            record.state = None
+            record.data = None
+        return record
+
+    def _touch(self, storage_key: str, record: _Record) -> None:
+        record.updated_at = time.time()
+        self._dirty.add(storage_key)
+        if self._flush_handle is None:
+            loop = asyncio.get_running_loop()
+            self._flush_handle = loop.call_later(self._flush_delay, self._flush_later)
+
+    def _flush_later(self) -> None:
+        self._flush_handle = None
+        task = asyncio.ensure_future(self.flush())
+        task.add_done_callback(_log_flush_error)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        storage_key = self._key_builder.build(key)
+        record = await self._record(storage_key)
+        record.state = state.state if isinstance(state, State) else state
+        self._touch(storage_key, record)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._record(self._key_builder.build(key))).state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(f"Data must be a dict or dict-like object, got {type(data).__name__}")
+        storage_key = self._key_builder.build(key)
+        record = await self._record(storage_key)
+        record.data = json.dumps(dict(data), ensure_ascii=False).encode() if data else None
+        self._touch(storage_key, record)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        storage_key = self._key_builder.build(key)
+        record = await self._record(storage_key)
+        if record.data is None:
+            return {}
+        try:
+            return json.loads(record.data)
+        except ValueError:
+            # Unreadable data (e.g. written by an older format) would fail every
+            # handler of this user until it expires, so drop it instead.
+            logger.warning("Resetting undecodable FSM data for %s", storage_key)
+            record.data = None
+            self._touch(storage_key, record)
+            return {}
+
+    async def flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        async with self._flush_lock:
+            expires_before = time.time() - self._ttl
+            dirty, self._dirty = self._dirty, set()
+            batch = []
+            for storage_key in dirty:
+                record = self._records[storage_key]
+                batch.append((storage_key, record.state, record.data, record.updated_at))
+            self._prune(expires_before)
+            self._pruned_at = time.time()
+            if not batch:
+                return
+            try:
+                await save_fsm_states(self._db_path, batch, expires_before)
+            except BaseException:
+                self._dirty |= dirty
+                raise
+
+    async def close(self) -> None:
+        await self.flush()
+
+
+def _log_flush_error(task: "asyncio.Future[None]") -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("FSM state flush failed", exc_info=task.exception())
@@ -6,20 +6,20 @@ import sqlite3
 from typing import Optional
 
 from aiogram import F, Router
-from aiogram.filters import CommandStart, StateFilter
+from aiogram.filters import Command, CommandStart, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.types import BufferedInputFile, Message
+from aiogram.types import Message
 
 from config import Config
-from db import (
+from async_db import (
     create_client,
     create_group,
     create_payment_pass,
     create_payment_single,
     create_single_visit_booked,
     create_trainer,
-    create_pass,
+    issue_pass,
     create_expense,
     create_expense_category,
     deactivate_admin,
@@ -35,7 +35,6 @@ from db import (
     get_group_by_id,
     get_schedule_by_id,
     get_trainer_by_id,
-    is_admin_active,
     list_groups,
     list_groups_by_trainer,
     list_clients_for_attendance,
@@ -50,6 +49,7 @@ from db import (
     rename_group,
     list_schedule_for_group,
     search_clients_by_name,
+    search_clients_fuzzy,
     add_schedule_slot,
     update_schedule_slot,
     delete_schedule_slot,
@@ -65,27 +65,21 @@ from db import (
     set_expense_category_active,
     update_expense,
     delete_expense,
-    upsert_client_group_active,
     upsert_visit_status,
+    upsert_visit_statuses,
     upsert_admin,
-)
-from reporting import (
-    build_excel_report,
-    count_single_visits,
-    count_single_visits_without_payment,
-    get_attendance_summary,
-    get_deferred_summary,
-    get_expense_summary,
-    get_revenue_summary,
+    get_report_snapshot,
     list_active_passes_today,
     list_attended_today_by_group,
     list_clients_without_active_pass,
     list_passes_expiring,
-    list_single_visits_without_payment,
 )
 from keyboards import (
     ADMIN_MENU_BUTTONS,
     ADD_GROUP_BUTTONS,
+    ATTENDANCE_BULK_BUTTON,
+    ATTENDANCE_BULK_BUTTONS,
+    ATTENDANCE_BULK_MARKS,
     ATTENDANCE_DATE_BUTTONS,
     ATTENDANCE_STATUS_BUTTONS,
     BOOKING_CLIENT_SEARCH_BUTTONS,
@@ -141,7 +135,9 @@ from keyboards import (
     SKIP_BUTTONS,
     add_group_keyboard,
     admin_menu_keyboard,
+    attendance_clients_keyboard,
     attendance_date_keyboard,
+    attendance_roster_keyboard,
     attendance_status_keyboard,
     booking_client_search_keyboard,
     booking_date_keyboard,
@@ -203,11 +199,23 @@ from keyboards import (
     search_results_keyboard,
     skip_keyboard,
 )
+from report_export import send_excel_report
+from slow_queries import get_slow_query_log
 
 router = Router()
 
 DEFER_OVERDUE_DAYS = 7
 REPORT_UNPAID_SINGLE_LIMIT = 20
+REPORT_DEFERRED_LIMIT = 10
+# Snapshot parts each chat report reads; the rest of the snapshot is skipped.
+REPORT_SNAPSHOT_PARTS = {
+    "revenue": ("revenue",),
+    "expenses": ("expenses",),
+    "profit": ("revenue", "expenses"),
+    "attendance": ("attendance",),
+    "singles": ("singles",),
+    "defers": ("defers",),
+}
 
 
 class AdminStates(StatesGroup):
@@ -255,6 +263,7 @@ class AttendanceStates(StatesGroup):
     select_date = State()
     select_client = State()
     select_status = State()
+    bulk_roster = State()
 
 
 class PaymentStates(StatesGroup):
@@ -393,12 +402,8 @@ def _is_owner(message: Message, config: Config) -> bool:
     return message.from_user is not None and message.from_user.id == config.owner_tg_user_id
 
 
-def _has_access(message: Message, config: Config) -> bool:
-    if message.from_user is None:
-        return False
-    if message.from_user.id == config.owner_tg_user_id:
-        return True
-    return is_admin_active(config.db_path, message.from_user.id)
+def _has_access(role: Optional[str]) -> bool:
+    return role is not None
 
 
 def _main_menu_reply_markup(message: Message, config: Config):
@@ -448,10 +453,36 @@ def _parse_iso_date(value: str) -> Optional[str]:
     return parsed.strftime("%Y-%m-%d")
 
 
+async def _search_clients(config: Config, query: str) -> tuple[list, bool]:
+    results = await search_clients_by_name(config.db_path, query, limit=11)
+    if results:
+        return results, False
+    return await search_clients_fuzzy(config.db_path, query, limit=10), True
+
+
 def _format_group_label(group_id: int, name: str) -> str:
     return f"{name} (id:{group_id})"
 
 
+def _parse_group_label(text: str) -> Optional[tuple[int, str]]:
+    name, sep, suffix = text.rpartition(" (id:")
+    if not sep or not suffix.endswith(")") or not suffix[:-1].isdigit():
+        return None
+    return int(suffix[:-1]), name
+
+
+async def _resolve_group_choice(
+    config: Config, text: Optional[str], group_ids: list[int]
+) -> Optional[tuple[int, str]]:
+    # Only the id is taken from the button text; the name comes from the
+    # cached active group list the buttons were built from.
+    choice = _parse_group_label(text or "")
+    if choice is None or choice[0] not in group_ids:
+        return None
+    groups = await list_active_groups(config.db_path)
+    return next(((group[0], group[1]) for group in groups if group[0] == choice[0]), None)
+
+
 def _format_choice_label(item_id: int, name: str) -> str:
     return f"{item_id}) {name}"
 
@@ -571,7 +602,7 @@ def _expense_categories_page(
 async def _show_expense_category_selection(
     message: Message, config: Config, state: FSMContext
 ) -> None:
-    categories = list_expense_categories(config.db_path, include_inactive=False)
+    categories = await list_expense_categories(config.db_path, include_inactive=False)
     categories_data = [[row[0], row[1]] for row in categories]
     page_size = 12
     page = (await state.get_data()).get("category_page", 0)
@@ -843,21 +874,20 @@ def _format_deferred_report(
 async def _prepare_payment_group_selection(
     message: Message, config: Config, state: FSMContext
 ) -> bool:
-    groups = list_active_groups(config.db_path)
+    groups = await list_active_groups(config.db_path)
     if not groups:
         await state.clear()
         await message.answer("Групп пока нет", reply_markup=_main_menu_reply_markup(message, config))
         return False
     labels = [_format_group_label(group[0], group[1]) for group in groups]
-    mapping = {label: group[0] for label, group in zip(labels, groups)}
-    await state.update_data(group_map=mapping, group_names={group[0]: group[1] for group in groups})
+    await state.update_data(group_ids=[group[0] for group in groups])
     await state.set_state(PaymentStates.create_group)
     await message.answer("Выберите группу", reply_markup=groups_keyboard(labels))
     return True
 
 
-def _format_attendance_client_label(full_name: str, phone: str) -> str:
-    return f"{full_name} ({phone})"
+def _format_attendance_client_label(client_id: int, full_name: str, phone: str) -> str:
+    return _format_choice_label(client_id, f"{full_name} ({phone})")
 
 
 def _format_trainer_card(trainer: tuple, groups: list[tuple]) -> str:
@@ -981,7 +1011,7 @@ async def _show_client_card(message: Message, config: Config, client, state: Opt
         await state.set_state(SearchStates.card)
         await state.update_data(client_id=client[0], client_name=client[1], client_phone=client[2])
     today = date.today().strftime("%Y-%m-%d")
-    defer_summary = get_defer_summary(config.db_path, client[0], today)
+    defer_summary = await get_defer_summary(config.db_path, client[0], today)
     card = _format_client_card(
         client_id=client[0],
         full_name=client[1],
@@ -1002,9 +1032,35 @@ async def handle_start(message: Message, config: Config) -> None:
     )
 
 
+@router.message(Command("slow"))
+async def handle_slow_queries(message: Message, config: Config) -> None:
+    if not _is_owner(message, config):
+        await message.answer("Доступ запрещен")
+        return
+    slow_log = get_slow_query_log()
+    if slow_log is None:
+        await message.answer("Журнал медленных запросов выключен")
+        return
+    offenders = slow_log.top()
+    threshold_ms = int(slow_log.threshold * 1000)
+    if not offenders:
+        await message.answer(f"Медленных запросов нет (порог {threshold_ms} мс)")
+        return
+    lines = [f"Медленные запросы (порог {threshold_ms} мс):"]
+    for offender in offenders:
+        sql = offender.sql if len(offender.sql) <= 200 else offender.sql[:200] + "…"
+        lines.append(
+            f"\n{offender.caller}: {offender.count} раз, всего {offender.total_seconds * 1000:.0f} мс, "
+            f"макс {offender.max_seconds * 1000:.0f} мс\n{sql}"
+        )
+        if offender.plan:
+            lines.append("План: " + "; ".join(offender.plan))
+    await message.answer("\n".join(lines))
+
+
 @router.message(F.text == MAIN_MENU_BUTTONS[0])
-async def handle_new_client_start(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_new_client_start(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     await state.clear()
@@ -1013,8 +1069,8 @@ async def handle_new_client_start(message: Message, config: Config, state: FSMCo
 
 
 @router.message(NewClientStates.phone)
-async def handle_new_client_phone(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_new_client_phone(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == NEW_CLIENT_PHONE_BUTTONS[2]:
@@ -1040,7 +1096,7 @@ async def handle_new_client_phone(message: Message, config: Config, state: FSMCo
         await message.answer("Не удалось распознать телефон, попробуйте еще раз")
         return
 
-    existing = get_client_by_phone(config.db_path, normalized)
+    existing = await get_client_by_phone(config.db_path, normalized)
     if existing:
         await state.clear()
         await message.answer(
@@ -1055,8 +1111,8 @@ async def handle_new_client_phone(message: Message, config: Config, state: FSMCo
 
 
 @router.message(NewClientStates.full_name)
-async def handle_new_client_full_name(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_new_client_full_name(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if not message.text or message.text.strip() == "":
@@ -1068,8 +1124,8 @@ async def handle_new_client_full_name(message: Message, config: Config, state: F
 
 
 @router.message(NewClientStates.tg_username)
-async def handle_new_client_tg_username(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_new_client_tg_username(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == SKIP_BUTTONS[1]:
@@ -1087,8 +1143,8 @@ async def handle_new_client_tg_username(message: Message, config: Config, state:
 
 
 @router.message(NewClientStates.birth_date)
-async def handle_new_client_birth_date(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_new_client_birth_date(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == SKIP_BUTTONS[1]:
@@ -1110,8 +1166,8 @@ async def handle_new_client_birth_date(message: Message, config: Config, state:
 
 
 @router.message(NewClientStates.comment)
-async def handle_new_client_comment(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_new_client_comment(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == SKIP_BUTTONS[1]:
@@ -1138,8 +1194,8 @@ async def handle_new_client_comment(message: Message, config: Config, state: FSM
 
 
 @router.message(NewClientStates.confirm)
-async def handle_new_client_confirm(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_new_client_confirm(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if not message.text or message.text not in CONFIRM_BUTTONS:
@@ -1157,7 +1213,7 @@ async def handle_new_client_confirm(message: Message, config: Config, state: FSM
     birth_date = data.get("birth_date")
     comment = data.get("comment")
 
-    existing = get_client_by_phone(config.db_path, phone)
+    existing = await get_client_by_phone(config.db_path, phone)
     if existing:
         await state.clear()
         await message.answer(
@@ -1167,7 +1223,7 @@ async def handle_new_client_confirm(message: Message, config: Config, state: FSM
         return
 
     try:
-        client_id = create_client(
+        client_id = await create_client(
             config.db_path,
             full_name=full_name,
             phone=phone,
@@ -1183,7 +1239,7 @@ async def handle_new_client_confirm(message: Message, config: Config, state: FSM
             reply_markup=_main_menu_reply_markup(message, config),
         )
         return
-    client = get_client_by_id(config.db_path, int(client_id))
+    client = await get_client_by_id(config.db_path, int(client_id))
     if not client:
         await state.clear()
         await message.answer("Клиент добавлен ✅", reply_markup=_main_menu_reply_markup(message, config))
@@ -1192,8 +1248,8 @@ async def handle_new_client_confirm(message: Message, config: Config, state: FSM
 
 
 @router.message(F.text == MAIN_MENU_BUTTONS[2])
-async def handle_booking_start(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_booking_start(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     await state.clear()
@@ -1202,8 +1258,8 @@ async def handle_booking_start(message: Message, config: Config, state: FSMConte
 
 
 @router.message(BookingStates.select_client)
-async def handle_booking_select_client_method(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_booking_select_client_method(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == BOOKING_CLIENT_SEARCH_BUTTONS[3]:
@@ -1226,8 +1282,8 @@ async def handle_booking_select_client_method(message: Message, config: Config,
 
 
 @router.message(BookingStates.client_phone)
-async def handle_booking_client_phone(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_booking_client_phone(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == NEW_CLIENT_PHONE_BUTTONS[2]:
@@ -1253,7 +1309,7 @@ async def handle_booking_client_phone(message: Message, config: Config, state: F
         await message.answer("Не удалось распознать телефон, попробуйте еще раз")
         return
 
-    client = get_client_by_phone(config.db_path, normalized)
+    client = await get_client_by_phone(config.db_path, normalized)
     if not client:
         await state.clear()
         await message.answer("Не найдено", reply_markup=not_found_keyboard())
@@ -1265,8 +1321,8 @@ async def handle_booking_client_phone(message: Message, config: Config, state: F
 
 
 @router.message(BookingStates.client_name)
-async def handle_booking_client_name(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_booking_client_name(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == "❌ Отмена":
@@ -1277,12 +1333,12 @@ async def handle_booking_client_name(message: Message, config: Config, state: FS
         await message.answer("Введите имя или часть имени")
         return
 
-    results = search_clients_by_name(config.db_path, message.text.strip(), limit=11)
+    results, is_fuzzy = await _search_clients(config, message.text.strip())
     if len(results) == 0:
         await state.clear()
         await message.answer("Не найдено", reply_markup=not_found_keyboard())
         return
-    if len(results) == 1:
+    if len(results) == 1 and not is_fuzzy:
         await state.update_data(client_id=results[0][0], client_name=results[0][1])
         await state.set_state(BookingStates.select_type)
         await message.answer("Выберите тип записи", reply_markup=booking_type_keyboard())
@@ -1295,12 +1351,15 @@ async def handle_booking_client_name(message: Message, config: Config, state: FS
     mapping = {label: row[0] for label, row in zip(labels, results)}
     await state.update_data(search_results=mapping)
     await state.set_state(BookingStates.client_select)
-    await message.answer("Выберите клиента", reply_markup=search_results_keyboard(labels))
+    await message.answer(
+        "Точного совпадения нет, возможно, вы искали:" if is_fuzzy else "Выберите клиента",
+        reply_markup=search_results_keyboard(labels),
+    )
 
 
 @router.message(BookingStates.client_tg)
-async def handle_booking_client_tg(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_booking_client_tg(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == "❌ Отмена":
@@ -1316,7 +1375,7 @@ async def handle_booking_client_tg(message: Message, config: Config, state: FSMC
         await message.answer("Введите username")
         return
 
-    client = get_client_by_tg_username(config.db_path, normalized)
+    client = await get_client_by_tg_username(config.db_path, normalized)
     if not client:
         await state.clear()
         await message.answer("Не найдено", reply_markup=not_found_keyboard())
@@ -1328,8 +1387,8 @@ async def handle_booking_client_tg(message: Message, config: Config, state: FSMC
 
 
 @router.message(BookingStates.client_select)
-async def handle_booking_client_select(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_booking_client_select(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == "❌ Отмена":
@@ -1342,7 +1401,7 @@ async def handle_booking_client_select(message: Message, config: Config, state:
         await message.answer("Выберите клиента из списка")
         return
     client_id = int(mapping[message.text])
-    client = get_client_by_id(config.db_path, client_id)
+    client = await get_client_by_id(config.db_path, client_id)
     if not client:
         await state.clear()
         await message.answer("Клиент не найден", reply_markup=_main_menu_reply_markup(message, config))
@@ -1353,8 +1412,8 @@ async def handle_booking_client_select(message: Message, config: Config, state:
 
 
 @router.message(BookingStates.select_type)
-async def handle_booking_select_type(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_booking_select_type(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == BOOKING_TYPE_BUTTONS[2]:
@@ -1369,22 +1428,21 @@ async def handle_booking_select_type(message: Message, config: Config, state: FS
         await message.answer("Выберите тип записи", reply_markup=booking_type_keyboard())
         return
 
-    groups = list_active_groups(config.db_path)
+    groups = await list_active_groups(config.db_path)
     if not groups:
         await state.set_state(BookingStates.add_group)
         await message.answer("Групп пока нет", reply_markup=add_group_keyboard())
         return
 
     labels = [_format_group_label(group[0], group[1]) for group in groups]
-    mapping = {label: group[0] for label, group in zip(labels, groups)}
-    await state.update_data(group_map=mapping, group_names={group[0]: group[1] for group in groups})
+    await state.update_data(group_ids=[group[0] for group in groups])
     await state.set_state(BookingStates.select_group)
     await message.answer("Выберите группу", reply_markup=groups_keyboard(labels))
 
 
 @router.message(BookingStates.add_group)
-async def handle_booking_add_group(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_booking_add_group(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == ADD_GROUP_BUTTONS[1]:
@@ -1397,18 +1455,17 @@ async def handle_booking_add_group(message: Message, config: Config, state: FSMC
     if not message.text or message.text.strip() == "":
         await message.answer("Введите название группы")
         return
-    group_id = create_group(config.db_path, name=message.text.strip())
-    groups = list_active_groups(config.db_path)
+    group_id = await create_group(config.db_path, name=message.text.strip())
+    groups = await list_active_groups(config.db_path)
     labels = [_format_group_label(group[0], group[1]) for group in groups]
-    mapping = {label: group[0] for label, group in zip(labels, groups)}
-    await state.update_data(group_map=mapping, group_names={group[0]: group[1] for group in groups})
+    await state.update_data(group_ids=[group[0] for group in groups])
     await state.set_state(BookingStates.select_group)
     await message.answer("Выберите группу", reply_markup=groups_keyboard(labels))
 
 
 @router.message(BookingStates.select_group)
-async def handle_booking_select_group(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_booking_select_group(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == "❌ Отмена":
@@ -1416,13 +1473,11 @@ async def handle_booking_select_group(message: Message, config: Config, state: F
         await message.answer("Отмена", reply_markup=_main_menu_reply_markup(message, config))
         return
     data = await state.get_data()
-    mapping = data.get("group_map", {})
-    group_names = data.get("group_names", {})
-    if message.text not in mapping:
+    choice = await _resolve_group_choice(config, message.text, data.get("group_ids", []))
+    if choice is None:
         await message.answer("Выберите группу из списка")
         return
-    group_id = int(mapping[message.text])
-    group_name = group_names.get(group_id, message.text)
+    group_id, group_name = choice
     await state.update_data(group_id=group_id, group_name=group_name)
 
     booking_type = data.get("booking_type")
@@ -1442,8 +1497,8 @@ async def handle_booking_select_group(message: Message, config: Config, state: F
 
 
 @router.message(BookingStates.select_date)
-async def handle_booking_select_date(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_booking_select_date(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == BOOKING_DATE_BUTTONS[3]:
@@ -1477,8 +1532,8 @@ async def handle_booking_select_date(message: Message, config: Config, state: FS
 
 
 @router.message(BookingStates.confirm)
-async def handle_booking_confirm(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_booking_confirm(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if not message.text or message.text not in CONFIRM_BUTTONS:
@@ -1497,7 +1552,7 @@ async def handle_booking_confirm(message: Message, config: Config, state: FSMCon
     if booking_type == "single":
         booking_date = data.get("booking_date")
         created_by = message.from_user.id if message.from_user else None
-        created = create_single_visit_booked(
+        created = await create_single_visit_booked(
             config.db_path,
             date=booking_date,
             group_id=group_id,
@@ -1513,59 +1568,52 @@ async def handle_booking_confirm(message: Message, config: Config, state: FSMCon
 
     today_str = date.today().strftime("%Y-%m-%d")
     end_date = _last_day_of_month(date.today()).strftime("%Y-%m-%d")
-    try:
-        pass_id = create_pass(
-            config.db_path,
-            client_id=client_id,
-            group_id=group_id,
-            start_date=today_str,
-            end_date=end_date,
-            is_active=1,
-        )
-    except sqlite3.IntegrityError:
+    if await get_active_pass(config.db_path, client_id, group_id):
         await state.clear()
         await message.answer(
             "У клиента уже есть активный абонемент",
             reply_markup=_main_menu_reply_markup(message, config),
         )
         return
-    upsert_client_group_active(config.db_path, client_id=client_id, group_id=group_id)
+    # The pass is written together with its payment once the amount is entered.
     await state.set_state(PassPayStates.choose_method)
     await state.update_data(
         client_id=client_id,
         client_name=data.get("client_name"),
         group_id=group_id,
         group_name=data.get("group_name"),
-        pass_id=pass_id,
+        pass_action="issue",
+        pass_start=today_str,
+        pass_end=end_date,
+        pass_active=1,
         method=None,
     )
     await message.answer(
-        f"✅ Абонемент выдан ({today_str} – {end_date}). Выберите способ оплаты:",
+        f"Абонемент {today_str} – {end_date}. Выберите способ оплаты:",
         reply_markup=pass_pay_method_keyboard(),
     )
 
 
 @router.message(F.text == MAIN_MENU_BUTTONS[3])
-async def handle_attendance_start(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_attendance_start(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
-    groups = list_active_groups(config.db_path)
+    groups = await list_active_groups(config.db_path)
     if not groups:
         await state.clear()
         await message.answer("Групп пока нет", reply_markup=_main_menu_reply_markup(message, config))
         return
     labels = [_format_group_label(group[0], group[1]) for group in groups]
-    mapping = {label: group[0] for label, group in zip(labels, groups)}
     await state.clear()
     await state.set_state(AttendanceStates.select_group)
-    await state.update_data(group_map=mapping, group_names={group[0]: group[1] for group in groups})
+    await state.update_data(group_ids=[group[0] for group in groups])
     await message.answer("Выберите группу", reply_markup=groups_keyboard(labels))
 
 
 @router.message(AttendanceStates.select_group)
-async def handle_attendance_select_group(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_attendance_select_group(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == "❌ Отмена":
@@ -1573,21 +1621,19 @@ async def handle_attendance_select_group(message: Message, config: Config, state
         await message.answer("Отмена", reply_markup=_main_menu_reply_markup(message, config))
         return
     data = await state.get_data()
-    mapping = data.get("group_map", {})
-    group_names = data.get("group_names", {})
-    if message.text not in mapping:
+    choice = await _resolve_group_choice(config, message.text, data.get("group_ids", []))
+    if choice is None:
         await message.answer("Выберите группу из списка")
         return
-    group_id = int(mapping[message.text])
-    group_name = group_names.get(group_id, message.text)
+    group_id, group_name = choice
     await state.update_data(group_id=group_id, group_name=group_name)
     await state.set_state(AttendanceStates.select_date)
     await message.answer("Выберите дату", reply_markup=attendance_date_keyboard())
 
 
 @router.message(AttendanceStates.select_date)
-async def handle_attendance_select_date(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_attendance_select_date(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == ATTENDANCE_DATE_BUTTONS[3]:
@@ -1610,34 +1656,36 @@ async def handle_attendance_select_date(message: Message, config: Config, state:
 
     data = await state.get_data()
     group_id = int(data.get("group_id"))
-    clients = list_clients_for_attendance(config.db_path, group_id, selected_date)
+    clients = await list_clients_for_attendance(config.db_path, group_id, selected_date)
     if not clients:
         await state.clear()
         await message.answer("Нет клиентов для отметки", reply_markup=_main_menu_reply_markup(message, config))
         return
-    labels = [_format_attendance_client_label(row[1], row[2]) for row in clients]
-    mapping = {label: row[0] for label, row in zip(labels, clients)}
+    labels = [_format_attendance_client_label(*row) for row in clients]
+    client_ids = [row[0] for row in clients]
     prefill_id = data.get("prefill_client_id")
     if prefill_id:
         matched = next((row for row in clients if row[0] == int(prefill_id)), None)
         if matched:
             await state.update_data(
                 attendance_date=selected_date,
-                client_map=mapping,
+                client_ids=client_ids,
+                client_labels=labels,
                 client_id=int(prefill_id),
                 client_name=matched[1],
             )
             await state.set_state(AttendanceStates.select_status)
             await message.answer("Отметить посещение", reply_markup=attendance_status_keyboard())
             return
-    await state.update_data(attendance_date=selected_date, client_map=mapping)
+    # Labels are kept in state so roster toggles do not re-query the roster.
+    await state.update_data(attendance_date=selected_date, client_ids=client_ids, client_labels=labels)
     await state.set_state(AttendanceStates.select_client)
-    await message.answer("Выберите клиента", reply_markup=search_results_keyboard(labels))
+    await message.answer("Выберите клиента", reply_markup=attendance_clients_keyboard(labels))
 
 
 @router.message(AttendanceStates.select_client)
-async def handle_attendance_select_client(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_attendance_select_client(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == "❌ Отмена":
@@ -1645,12 +1693,20 @@ async def handle_attendance_select_client(message: Message, config: Config, stat
         await message.answer("Отмена", reply_markup=_main_menu_reply_markup(message, config))
         return
     data = await state.get_data()
-    mapping = data.get("client_map", {})
-    if message.text not in mapping:
+    if message.text == ATTENDANCE_BULK_BUTTON:
+        labels = data.get("client_labels", [])
+        await state.update_data(attendance_unchecked=[])
+        await state.set_state(AttendanceStates.bulk_roster)
+        await message.answer(
+            "Все отмечены как «был». Снимите отметку с тех, кто не пришёл, и нажмите «Сохранить»",
+            reply_markup=attendance_roster_keyboard(labels, set()),
+        )
+        return
+    client_id = _parse_choice_id(message.text or "")
+    if client_id is None or client_id not in data.get("client_ids", []):
         await message.answer("Выберите клиента из списка")
         return
-    client_id = int(mapping[message.text])
-    client = get_client_by_id(config.db_path, client_id)
+    client = await get_client_by_id(config.db_path, client_id)
     if not client:
         await state.clear()
         await message.answer("Клиент не найден", reply_markup=_main_menu_reply_markup(message, config))
@@ -1661,8 +1717,8 @@ async def handle_attendance_select_client(message: Message, config: Config, stat
 
 
 @router.message(AttendanceStates.select_status)
-async def handle_attendance_select_status(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_attendance_select_status(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == ATTENDANCE_STATUS_BUTTONS[4]:
@@ -1671,10 +1727,9 @@ async def handle_attendance_select_status(message: Message, config: Config, stat
         return
     if message.text == ATTENDANCE_STATUS_BUTTONS[3]:
         data = await state.get_data()
-        mapping = data.get("client_map", {})
-        labels = list(mapping.keys())
+        labels = data.get("client_labels", [])
         await state.set_state(AttendanceStates.select_client)
-        await message.answer("Выберите клиента", reply_markup=search_results_keyboard(labels))
+        await message.answer("Выберите клиента", reply_markup=attendance_clients_keyboard(labels))
         return
 
     status_map = {
@@ -1691,7 +1746,7 @@ async def handle_attendance_select_status(message: Message, config: Config, stat
     group_id = int(data.get("group_id"))
     client_id = int(data.get("client_id"))
     created_by = message.from_user.id if message.from_user else None
-    upsert_visit_status(
+    await upsert_visit_status(
         config.db_path,
         visit_date=visit_date,
         group_id=group_id,
@@ -1703,9 +1758,60 @@ async def handle_attendance_select_status(message: Message, config: Config, stat
     await message.answer("Готово ✅", reply_markup=_main_menu_reply_markup(message, config))
 
 
+@router.message(AttendanceStates.bulk_roster)
+async def handle_attendance_bulk_roster(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
+        await _deny_and_menu(message, config, state)
+        return
+    if message.text == ATTENDANCE_BULK_BUTTONS[1]:
+        await state.clear()
+        await message.answer("Отмена", reply_markup=_main_menu_reply_markup(message, config))
+        return
+    data = await state.get_data()
+    client_ids = data.get("client_ids", [])
+    unchecked = set(data.get("attendance_unchecked", []))
+
+    if message.text == ATTENDANCE_BULK_BUTTONS[0]:
+        statuses = [
+            (client_id, "noshow" if client_id in unchecked else "attended")
+            for client_id in client_ids
+        ]
+        created_by = message.from_user.id if message.from_user else None
+        written = await upsert_visit_statuses(
+            config.db_path,
+            visit_date=data.get("attendance_date"),
+            group_id=int(data.get("group_id")),
+            statuses=statuses,
+            created_by=created_by,
+        )
+        await state.clear()
+        attended = len(statuses) - len(unchecked)
+        text = f"Готово ✅ Был: {attended}, не пришёл: {len(unchecked)}"
+        if written < len(statuses):
+            text += f"\nУже отмечены ранее (без изменений): {len(statuses) - written}"
+        await message.answer(text, reply_markup=_main_menu_reply_markup(message, config))
+        return
+
+    text = message.text or ""
+    mark, _, label = text.partition(" ")
+    client_id = _parse_choice_id(label)
+    if mark in ATTENDANCE_BULK_MARKS and client_id in client_ids:
+        if client_id in unchecked:
+            unchecked.discard(client_id)
+        else:
+            unchecked.add(client_id)
+        await state.update_data(attendance_unchecked=sorted(unchecked))
+        reply = f"{label}: {'не пришёл' if client_id in unchecked else 'был'}"
+    else:
+        reply = "Выберите клиента из списка"
+    labels = data.get("client_labels", [])
+    unchecked_labels = {label for label in labels if _parse_choice_id(label) in unchecked}
+    await message.answer(reply, reply_markup=attendance_roster_keyboard(labels, unchecked_labels))
+
+
 @router.message(F.text == MAIN_MENU_BUTTONS[4], StateFilter(None))
-async def handle_payment_menu(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_payment_menu(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     await state.clear()
@@ -1714,8 +1820,8 @@ async def handle_payment_menu(message: Message, config: Config, state: FSMContex
 
 
 @router.message(PaymentStates.menu)
-async def handle_payment_menu_choice(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_payment_menu_choice(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == PAYMENT_MENU_BUTTONS[2]:
@@ -1734,8 +1840,8 @@ async def handle_payment_menu_choice(message: Message, config: Config, state: FS
 
 
 @router.message(PaymentStates.create_type)
-async def handle_payment_create_type(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_payment_create_type(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == PAYMENT_TYPE_BUTTONS[2]:
@@ -1760,8 +1866,8 @@ async def handle_payment_create_type(message: Message, config: Config, state: FS
 
 
 @router.message(PaymentStates.create_client_method)
-async def handle_payment_create_client_method(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_payment_create_client_method(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == BOOKING_CLIENT_SEARCH_BUTTONS[3]:
@@ -1784,8 +1890,8 @@ async def handle_payment_create_client_method(message: Message, config: Config,
 
 
 @router.message(PaymentStates.create_client_phone)
-async def handle_payment_create_client_phone(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_payment_create_client_phone(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == NEW_CLIENT_PHONE_BUTTONS[2]:
@@ -1811,7 +1917,7 @@ async def handle_payment_create_client_phone(message: Message, config: Config, s
         await message.answer("Не удалось распознать телефон, попробуйте еще раз")
         return
 
-    client = get_client_by_phone(config.db_path, normalized)
+    client = await get_client_by_phone(config.db_path, normalized)
     if not client:
         await state.clear()
         await message.answer("Не найдено", reply_markup=not_found_keyboard())
@@ -1822,8 +1928,8 @@ async def handle_payment_create_client_phone(message: Message, config: Config, s
 
 
 @router.message(PaymentStates.create_client_name)
-async def handle_payment_create_client_name(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_payment_create_client_name(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == "❌ Отмена":
@@ -1834,12 +1940,12 @@ async def handle_payment_create_client_name(message: Message, config: Config, st
         await message.answer("Введите имя или часть имени")
         return
 
-    results = search_clients_by_name(config.db_path, message.text.strip(), limit=11)
+    results, is_fuzzy = await _search_clients(config, message.text.strip())
     if len(results) == 0:
         await state.clear()
         await message.answer("Не найдено", reply_markup=not_found_keyboard())
         return
-    if len(results) == 1:
+    if len(results) == 1 and not is_fuzzy:
         await state.update_data(client_id=results[0][0], client_name=results[0][1])
         await _prepare_payment_group_selection(message, config, state)
         return
@@ -1851,12 +1957,15 @@ async def handle_payment_create_client_name(message: Message, config: Config, st
     mapping = {label: row[0] for label, row in zip(labels, results)}
     await state.update_data(search_results=mapping)
     await state.set_state(PaymentStates.create_client_select)
-    await message.answer("Выберите клиента", reply_markup=search_results_keyboard(labels))
+    await message.answer(
+        "Точного совпадения нет, возможно, вы искали:" if is_fuzzy else "Выберите клиента",
+        reply_markup=search_results_keyboard(labels),
+    )
 
 
 @router.message(PaymentStates.create_client_tg)
-async def handle_payment_create_client_tg(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_payment_create_client_tg(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == "❌ Отмена":
@@ -1872,7 +1981,7 @@ async def handle_payment_create_client_tg(message: Message, config: Config, stat
         await message.answer("Введите username")
         return
 
-    client = get_client_by_tg_username(config.db_path, normalized)
+    client = await get_client_by_tg_username(config.db_path, normalized)
     if not client:
         await state.clear()
         await message.answer("Не найдено", reply_markup=not_found_keyboard())
@@ -1883,8 +1992,8 @@ async def handle_payment_create_client_tg(message: Message, config: Config, stat
 
 
 @router.message(PaymentStates.create_client_select)
-async def handle_payment_create_client_select(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_payment_create_client_select(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == "❌ Отмена":
@@ -1897,7 +2006,7 @@ async def handle_payment_create_client_select(message: Message, config: Config,
         await message.answer("Выберите клиента из списка")
         return
     client_id = int(mapping[message.text])
-    client = get_client_by_id(config.db_path, client_id)
+    client = await get_client_by_id(config.db_path, client_id)
     if not client:
         await state.clear()
         await message.answer("Клиент не найден", reply_markup=_main_menu_reply_markup(message, config))
@@ -1907,8 +2016,8 @@ async def handle_payment_create_client_select(message: Message, config: Config,
 
 
 @router.message(PaymentStates.create_group)
-async def handle_payment_create_group(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_payment_create_group(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == "❌ Отмена":
@@ -1916,22 +2025,19 @@ async def handle_payment_create_group(message: Message, config: Config, state: F
         await message.answer("Отмена", reply_markup=_main_menu_reply_markup(message, config))
         return
     data = await state.get_data()
-    mapping = data.get("group_map")
-    group_names = data.get("group_names")
-    if not mapping or not group_names:
-        groups = list_active_groups(config.db_path)
+    group_ids = data.get("group_ids")
+    if not group_ids:
+        groups = await list_active_groups(config.db_path)
         if not groups:
             await state.clear()
             await message.answer("Групп пока нет", reply_markup=_main_menu_reply_markup(message, config))
             return
-        labels = [_format_group_label(group[0], group[1]) for group in groups]
-        mapping = {label: group[0] for label, group in zip(labels, groups)}
-        group_names = {group[0]: group[1] for group in groups}
-    if message.text not in mapping:
+        group_ids = [group[0] for group in groups]
+    choice = await _resolve_group_choice(config, message.text, group_ids)
+    if choice is None:
         await message.answer("Выберите группу из списка")
         return
-    group_id = int(mapping[message.text])
-    group_name = group_names.get(group_id, message.text)
+    group_id, group_name = choice
     await state.update_data(group_id=group_id, group_name=group_name)
 
     data = await state.get_data()
@@ -1940,7 +2046,7 @@ async def handle_payment_create_group(message: Message, config: Config, state: F
         await message.answer("Выберите дату", reply_markup=payment_date_keyboard())
         return
 
-    passes = list_active_passes(config.db_path, client_id=int(data.get("client_id")), group_id=group_id)
+    passes = await list_active_passes(config.db_path, client_id=int(data.get("client_id")), group_id=group_id)
     if not passes:
         await state.clear()
         await message.answer("Нет активного абонемента — сначала 🎫 Абонемент", reply_markup=_main_menu_reply_markup(message, config))
@@ -1958,8 +2064,8 @@ async def handle_payment_create_group(message: Message, config: Config, state: F
 
 
 @router.message(PaymentStates.create_pass_select)
-async def handle_payment_create_pass_select(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_payment_create_pass_select(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == "❌ Отмена":
@@ -1977,8 +2083,8 @@ async def handle_payment_create_pass_select(message: Message, config: Config, st
 
 
 @router.message(PaymentStates.create_date)
-async def handle_payment_create_date(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_payment_create_date(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == PAYMENT_DATE_BUTTONS[3]:
@@ -2000,7 +2106,7 @@ async def handle_payment_create_date(message: Message, config: Config, state: FS
         selected_date = parsed
 
     data = await state.get_data()
-    visit_id = get_or_create_single_visit(
+    visit_id = await get_or_create_single_visit(
         config.db_path,
         client_id=int(data.get("client_id")),
         group_id=int(data.get("group_id")),
@@ -2013,8 +2119,8 @@ async def handle_payment_create_date(message: Message, config: Config, state: FS
 
 
 @router.message(PaymentStates.create_amount)
-async def handle_payment_create_amount(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_payment_create_amount(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == "❌ Отмена":
@@ -2031,8 +2137,8 @@ async def handle_payment_create_amount(message: Message, config: Config, state:
 
 
 @router.message(PaymentStates.create_method)
-async def handle_payment_create_method(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_payment_create_method(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == PAYMENT_METHOD_BUTTONS[4]:
@@ -2071,8 +2177,8 @@ async def handle_payment_create_method(message: Message, config: Config, state:
 
 
 @router.message(PaymentStates.create_due_date)
-async def handle_payment_create_due_date(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_payment_create_due_date(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == DEFER_DUE_DATE_BUTTONS[4]:
@@ -2112,8 +2218,8 @@ async def handle_payment_create_due_date(message: Message, config: Config, state
 
 
 @router.message(PaymentStates.create_confirm)
-async def handle_payment_create_confirm(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_payment_create_confirm(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if not message.text or message.text not in CONFIRM_BUTTONS:
@@ -2129,7 +2235,7 @@ async def handle_payment_create_confirm(message: Message, config: Config, state:
     amount = int(data.get("amount"))
     accepted_by = message.from_user.id if message.from_user else None
     if data.get("payment_type") == "single":
-        create_payment_single(
+        await create_payment_single(
             config.db_path,
             client_id=int(data.get("client_id")),
             group_id=int(data.get("group_id")),
@@ -2141,7 +2247,7 @@ async def handle_payment_create_confirm(message: Message, config: Config, state:
             accepted_by=accepted_by,
         )
     else:
-        create_payment_pass(
+        await create_payment_pass(
             config.db_path,
             client_id=int(data.get("client_id")),
             group_id=int(data.get("group_id")),
@@ -2160,8 +2266,8 @@ async def handle_payment_create_confirm(message: Message, config: Config, state:
 
 
 @router.message(PaymentStates.close_client_method)
-async def handle_payment_close_client_method(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_payment_close_client_method(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == BOOKING_CLIENT_SEARCH_BUTTONS[3]:
@@ -2184,8 +2290,8 @@ async def handle_payment_close_client_method(message: Message, config: Config, s
 
 
 @router.message(PaymentStates.close_client_phone)
-async def handle_payment_close_client_phone(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_payment_close_client_phone(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == NEW_CLIENT_PHONE_BUTTONS[2]:
@@ -2211,7 +2317,7 @@ async def handle_payment_close_client_phone(message: Message, config: Config, st
         await message.answer("Не удалось распознать телефон, попробуйте еще раз")
         return
 
-    client = get_client_by_phone(config.db_path, normalized)
+    client = await get_client_by_phone(config.db_path, normalized)
     if not client:
         await state.clear()
         await message.answer("Не найдено", reply_markup=not_found_keyboard())
@@ -2222,8 +2328,8 @@ async def handle_payment_close_client_phone(message: Message, config: Config, st
 
 
 @router.message(PaymentStates.close_client_name)
-async def handle_payment_close_client_name(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_payment_close_client_name(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == "❌ Отмена":
@@ -2234,12 +2340,12 @@ async def handle_payment_close_client_name(message: Message, config: Config, sta
         await message.answer("Введите имя или часть имени")
         return
 
-    results = search_clients_by_name(config.db_path, message.text.strip(), limit=11)
+    results, is_fuzzy = await _search_clients(config, message.text.strip())
     if len(results) == 0:
         await state.clear()
         await message.answer("Не найдено", reply_markup=not_found_keyboard())
         return
-    if len(results) == 1:
+    if len(results) == 1 and not is_fuzzy:
         await state.update_data(client_id=results[0][0], client_name=results[0][1])
         await _show_close_deferred_list(message, config, state)
         return
@@ -2251,12 +2357,15 @@ async def handle_payment_close_client_name(message: Message, config: Config, sta
     mapping = {label: row[0] for label, row in zip(labels, results)}
     await state.update_data(search_results=mapping)
     await state.set_state(PaymentStates.close_client_select)
-    await message.answer("Выберите клиента", reply_markup=search_results_keyboard(labels))
+    await message.answer(
+        "Точного совпадения нет, возможно, вы искали:" if is_fuzzy else "Выберите клиента",
+        reply_markup=search_results_keyboard(labels),
+    )
 
 
 @router.message(PaymentStates.close_client_tg)
-async def handle_payment_close_client_tg(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_payment_close_client_tg(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == "❌ Отмена":
@@ -2272,7 +2381,7 @@ async def handle_payment_close_client_tg(message: Message, config: Config, state
         await message.answer("Введите username")
         return
 
-    client = get_client_by_tg_username(config.db_path, normalized)
+    client = await get_client_by_tg_username(config.db_path, normalized)
     if not client:
         await state.clear()
         await message.answer("Не найдено", reply_markup=not_found_keyboard())
@@ -2283,8 +2392,8 @@ async def handle_payment_close_client_tg(message: Message, config: Config, state
 
 
 @router.message(PaymentStates.close_client_select)
-async def handle_payment_close_client_select(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_payment_close_client_select(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == "❌ Отмена":
@@ -2297,7 +2406,7 @@ async def handle_payment_close_client_select(message: Message, config: Config, s
         await message.answer("Выберите клиента из списка")
         return
     client_id = int(mapping[message.text])
-    client = get_client_by_id(config.db_path, client_id)
+    client = await get_client_by_id(config.db_path, client_id)
     if not client:
         await state.clear()
         await message.answer("Клиент не найден", reply_markup=_main_menu_reply_markup(message, config))
@@ -2309,7 +2418,7 @@ async def handle_payment_close_client_select(message: Message, config: Config, s
 async def _show_close_deferred_list(message: Message, config: Config, state: FSMContext) -> None:
     data = await state.get_data()
     client_id = int(data.get("client_id"))
-    deferred = list_deferred_payments_by_client(config.db_path, client_id)
+    deferred = await list_deferred_payments_by_client(config.db_path, client_id)
     if not deferred:
         await state.clear()
         await message.answer("Нет отсрочек", reply_markup=_main_menu_reply_markup(message, config))
@@ -2319,8 +2428,9 @@ async def _show_close_deferred_list(message: Message, config: Config, state: FSM
         for row in deferred
     ]
     mapping = {label: row[0] for label, row in zip(labels, deferred)}
+    # FSM data is stored as JSON, so the keys are pay ids as strings.
     details = {
-        row[0]: {
+        str(row[0]): {
             "amount": row[1],
             "purpose": row[2],
             "group_name": row[4],
@@ -2334,8 +2444,8 @@ async def _show_close_deferred_list(message: Message, config: Config, state: FSM
 
 
 @router.message(PaymentStates.close_payment_select)
-async def handle_payment_close_payment_select(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_payment_close_payment_select(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == "❌ Отмена":
@@ -2354,8 +2464,8 @@ async def handle_payment_close_payment_select(message: Message, config: Config,
 
 
 @router.message(PaymentStates.close_method)
-async def handle_payment_close_method(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_payment_close_method(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == PAYMENT_CLOSE_METHOD_BUTTONS[3]:
@@ -2376,8 +2486,8 @@ async def handle_payment_close_method(message: Message, config: Config, state: F
 
 
 @router.message(PaymentStates.close_date)
-async def handle_payment_close_date(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_payment_close_date(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == PAYMENT_CLOSE_DATE_BUTTONS[3]:
@@ -2399,7 +2509,7 @@ async def handle_payment_close_date(message: Message, config: Config, state: FSM
         pay_date = parsed
     await state.update_data(pay_date=pay_date)
     data = await state.get_data()
-    details = data.get("deferred_details", {}).get(int(data.get("pay_id")), {})
+    details = data.get("deferred_details", {}).get(str(data.get("pay_id")), {})
     summary = _format_close_payment_summary(
         amount=details.get("amount"),
         purpose=details.get("purpose"),
@@ -2413,8 +2523,8 @@ async def handle_payment_close_date(message: Message, config: Config, state: FSM
 
 
 @router.message(PaymentStates.close_confirm)
-async def handle_payment_close_confirm(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_payment_close_confirm(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if not message.text or message.text not in CONFIRM_BUTTONS:
@@ -2425,7 +2535,7 @@ async def handle_payment_close_confirm(message: Message, config: Config, state:
         await message.answer("Отмена", reply_markup=_main_menu_reply_markup(message, config))
         return
     data = await state.get_data()
-    close_deferred_payment(
+    await close_deferred_payment(
         config.db_path,
         pay_id=int(data.get("pay_id")),
         new_method=data.get("close_method"),
@@ -2437,8 +2547,8 @@ async def handle_payment_close_confirm(message: Message, config: Config, state:
 
 
 @router.message(F.text == MAIN_MENU_BUTTONS[5])
-async def handle_pass_menu(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_pass_menu(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     await state.clear()
@@ -2447,8 +2557,8 @@ async def handle_pass_menu(message: Message, config: Config, state: FSMContext)
 
 
 @router.message(PassStates.menu)
-async def handle_pass_menu_choice(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_pass_menu_choice(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == PASS_MENU_BUTTONS[2]:
@@ -2467,8 +2577,8 @@ async def handle_pass_menu_choice(message: Message, config: Config, state: FSMCo
 
 
 @router.message(PassStates.client_method)
-async def handle_pass_client_method(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_pass_client_method(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == BOOKING_CLIENT_SEARCH_BUTTONS[3]:
@@ -2491,8 +2601,8 @@ async def handle_pass_client_method(message: Message, config: Config, state: FSM
 
 
 @router.message(PassStates.client_phone)
-async def handle_pass_client_phone(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_pass_client_phone(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == NEW_CLIENT_PHONE_BUTTONS[2]:
@@ -2518,7 +2628,7 @@ async def handle_pass_client_phone(message: Message, config: Config, state: FSMC
         await message.answer("Не удалось распознать телефон, попробуйте еще раз")
         return
 
-    client = get_client_by_phone(config.db_path, normalized)
+    client = await get_client_by_phone(config.db_path, normalized)
     if not client:
         await state.clear()
         await message.answer("Не найдено", reply_markup=not_found_keyboard())
@@ -2528,13 +2638,13 @@ async def handle_pass_client_phone(message: Message, config: Config, state: FSMC
     await state.set_state(PassStates.group_select)
     await message.answer(
         "Выберите группу",
-        reply_markup=groups_keyboard([_format_group_label(g[0], g[1]) for g in list_active_groups(config.db_path)]),
+        reply_markup=groups_keyboard([_format_group_label(g[0], g[1]) for g in await list_active_groups(config.db_path)]),
     )
 
 
 @router.message(PassStates.client_name)
-async def handle_pass_client_name(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_pass_client_name(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == "❌ Отмена":
@@ -2545,17 +2655,17 @@ async def handle_pass_client_name(message: Message, config: Config, state: FSMCo
         await message.answer("Введите имя или часть имени")
         return
 
-    results = search_clients_by_name(config.db_path, message.text.strip(), limit=11)
+    results, is_fuzzy = await _search_clients(config, message.text.strip())
     if len(results) == 0:
         await state.clear()
         await message.answer("Не найдено", reply_markup=not_found_keyboard())
         return
-    if len(results) == 1:
+    if len(results) == 1 and not is_fuzzy:
         await state.update_data(client_id=results[0][0], client_name=results[0][1])
         await state.set_state(PassStates.group_select)
         await message.answer(
             "Выберите группу",
-            reply_markup=groups_keyboard([_format_group_label(g[0], g[1]) for g in list_active_groups(config.db_path)]),
+            reply_markup=groups_keyboard([_format_group_label(g[0], g[1]) for g in await list_active_groups(config.db_path)]),
         )
         return
     if len(results) > 10:
@@ -2566,12 +2676,15 @@ async def handle_pass_client_name(message: Message, config: Config, state: FSMCo
     mapping = {label: row[0] for label, row in zip(labels, results)}
     await state.update_data(search_results=mapping)
     await state.set_state(PassStates.client_select)
-    await message.answer("Выберите клиента", reply_markup=search_results_keyboard(labels))
+    await message.answer(
+        "Точного совпадения нет, возможно, вы искали:" if is_fuzzy else "Выберите клиента",
+        reply_markup=search_results_keyboard(labels),
+    )
 
 
 @router.message(PassStates.client_tg)
-async def handle_pass_client_tg(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_pass_client_tg(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == "❌ Отмена":
@@ -2587,7 +2700,7 @@ async def handle_pass_client_tg(message: Message, config: Config, state: FSMCont
         await message.answer("Введите username")
         return
 
-    client = get_client_by_tg_username(config.db_path, normalized)
+    client = await get_client_by_tg_username(config.db_path, normalized)
     if not client:
         await state.clear()
         await message.answer("Не найдено", reply_markup=not_found_keyboard())
@@ -2597,13 +2710,13 @@ async def handle_pass_client_tg(message: Message, config: Config, state: FSMCont
     await state.set_state(PassStates.group_select)
     await message.answer(
         "Выберите группу",
-        reply_markup=groups_keyboard([_format_group_label(g[0], g[1]) for g in list_active_groups(config.db_path)]),
+        reply_markup=groups_keyboard([_format_group_label(g[0], g[1]) for g in await list_active_groups(config.db_path)]),
     )
 
 
 @router.message(PassStates.client_select)
-async def handle_pass_client_select(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_pass_client_select(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == "❌ Отмена":
@@ -2616,7 +2729,7 @@ async def handle_pass_client_select(message: Message, config: Config, state: FSM
         await message.answer("Выберите клиента из списка")
         return
     client_id = int(mapping[message.text])
-    client = get_client_by_id(config.db_path, client_id)
+    client = await get_client_by_id(config.db_path, client_id)
     if not client:
         await state.clear()
         await message.answer("Клиент не найден", reply_markup=_main_menu_reply_markup(message, config))
@@ -2625,20 +2738,20 @@ async def handle_pass_client_select(message: Message, config: Config, state: FSM
     await state.set_state(PassStates.group_select)
     await message.answer(
         "Выберите группу",
-        reply_markup=groups_keyboard([_format_group_label(g[0], g[1]) for g in list_active_groups(config.db_path)]),
+        reply_markup=groups_keyboard([_format_group_label(g[0], g[1]) for g in await list_active_groups(config.db_path)]),
     )
 
 
 @router.message(PassStates.group_select)
-async def handle_pass_group_select(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_pass_group_select(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == "❌ Отмена":
         await state.clear()
         await message.answer("Отмена", reply_markup=_main_menu_reply_markup(message, config))
         return
-    groups = list_active_groups(config.db_path)
+    groups = await list_active_groups(config.db_path)
     if not groups:
         await state.clear()
         await message.answer("Групп пока нет", reply_markup=_main_menu_reply_markup(message, config))
@@ -2653,7 +2766,7 @@ async def handle_pass_group_select(message: Message, config: Config, state: FSMC
     data = await state.get_data()
     client_id = int(data.get("client_id"))
     today_str = date.today().strftime("%Y-%m-%d")
-    active_pass = get_active_pass(config.db_path, client_id, group_id, today_str)
+    active_pass = await get_active_pass(config.db_path, client_id, group_id, today_str)
     action = data.get("pass_action")
     if action == "issue":
         if active_pass:
@@ -2710,27 +2823,18 @@ async def handle_pass_group_select(message: Message, config: Config, state: FSMC
     await message.answer(summary, reply_markup=confirm_keyboard())
 
 
-@router.message(PassStates.confirm)
-async def handle_pass_confirm(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
-        await _deny_and_menu(message, config, state)
-        return
-    if not message.text or message.text not in CONFIRM_BUTTONS:
-        await message.answer("Выберите действие", reply_markup=confirm_keyboard())
-        return
-    if message.text == CONFIRM_BUTTONS[1]:
-        await state.clear()
-        await message.answer("Отмена", reply_markup=_main_menu_reply_markup(message, config))
-        return
-    data = await state.get_data()
+async def _issue_pending_pass(
+    message: Message, config: Config, state: FSMContext, data: dict, **payment: object
+) -> Optional[int]:
     try:
-        pass_id = create_pass(
+        return await issue_pass(
             config.db_path,
             client_id=int(data.get("client_id")),
             group_id=int(data.get("group_id")),
             start_date=data.get("pass_start"),
             end_date=data.get("pass_end"),
             is_active=int(data.get("pass_active")),
+            **payment,
         )
     except sqlite3.IntegrityError:
         await state.clear()
@@ -2738,37 +2842,40 @@ async def handle_pass_confirm(message: Message, config: Config, state: FSMContex
             "У клиента уже есть активный абонемент",
             reply_markup=_main_menu_reply_markup(message, config),
         )
-        return
-    upsert_client_group_active(
-        config.db_path,
-        client_id=int(data.get("client_id")),
-        group_id=int(data.get("group_id")),
-    )
-    action = data.get("pass_action")
+        return None
+
+
+def _format_issued_pass(data: dict) -> str:
     status_label = "активный" if int(data.get("pass_active")) == 1 else "неактивный (будущий)"
-    header = "✅ Абонемент выдан" if action == "issue" else "✅ Абонемент продлён (создан на следующий месяц)"
-    text = (
+    header = "✅ Абонемент выдан" if data.get("pass_action") == "issue" else "✅ Абонемент продлён (создан на следующий месяц)"
+    return (
         f"{header}\n"
         f"Клиент: {data.get('client_name')}\n"
         f"Группа: {data.get('group_name')}\n"
         f"Даты: {data.get('pass_start')} – {data.get('pass_end')}\n"
         f"Статус: {status_label}"
     )
+
+
+@router.message(PassStates.confirm)
+async def handle_pass_confirm(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
+        await _deny_and_menu(message, config, state)
+        return
+    if not message.text or message.text not in CONFIRM_BUTTONS:
+        await message.answer("Выберите действие", reply_markup=confirm_keyboard())
+        return
+    if message.text == CONFIRM_BUTTONS[1]:
+        await state.clear()
+        await message.answer("Отмена", reply_markup=_main_menu_reply_markup(message, config))
+        return
     await state.set_state(PassAfterSave.wait_action)
-    await state.update_data(
-        client_id=int(data.get("client_id")),
-        client_name=data.get("client_name"),
-        group_id=int(data.get("group_id")),
-        group_name=data.get("group_name"),
-        pass_id=pass_id,
-        purpose="pass",
-    )
-    await message.answer(text, reply_markup=passes_after_save_menu_kb())
+    await message.answer("Принять оплату сейчас?", reply_markup=passes_after_save_menu_kb())
 
 
 @router.message(PassAfterSave.wait_action)
-async def handle_pass_after_save_action(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_pass_after_save_action(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == PASS_AFTER_SAVE_BUTTONS[0]:
@@ -2776,22 +2883,24 @@ async def handle_pass_after_save_action(message: Message, config: Config, state:
         await message.answer("Выберите способ оплаты:", reply_markup=pass_pay_method_keyboard())
         return
     if message.text == PASS_AFTER_SAVE_BUTTONS[1]:
+        data = await state.get_data()
+        if await _issue_pending_pass(message, config, state, data) is None:
+            return
         await state.clear()
         await state.set_state(PassStates.menu)
-        await message.answer("Абонемент", reply_markup=pass_menu_keyboard())
+        await message.answer(_format_issued_pass(data), reply_markup=pass_menu_keyboard())
         return
     await message.answer("Выберите действие кнопками меню ниже", reply_markup=passes_after_save_menu_kb())
 
 
 @router.message(PassPayStates.choose_method)
-async def handle_pass_pay_choose_method(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_pass_pay_choose_method(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == PASS_PAY_METHOD_BUTTONS[4]:
-        await state.clear()
-        await state.set_state(PassStates.menu)
-        await message.answer("Абонемент", reply_markup=pass_menu_keyboard())
+        await state.set_state(PassAfterSave.wait_action)
+        await message.answer("Принять оплату сейчас?", reply_markup=passes_after_save_menu_kb())
         return
     method_map = {
         PASS_PAY_METHOD_BUTTONS[0]: "cash",
@@ -2808,8 +2917,8 @@ async def handle_pass_pay_choose_method(message: Message, config: Config, state:
 
 
 @router.message(PassPayStates.enter_amount)
-async def handle_pass_pay_amount(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_pass_pay_amount(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     amount = _parse_amount(message.text or "")
@@ -2819,27 +2928,28 @@ async def handle_pass_pay_amount(message: Message, config: Config, state: FSMCon
     data = await state.get_data()
     method = data.get("method")
     status = "deferred" if method == "defer" else "paid"
-    create_payment_pass(
-        config.db_path,
-        client_id=int(data.get("client_id")),
-        group_id=int(data.get("group_id")),
-        pass_id=int(data.get("pass_id")),
-        amount=amount,
-        method=method,
-        status=status,
-        due_date=None,
+    pass_id = await _issue_pending_pass(
+        message,
+        config,
+        state,
+        data,
+        payment_amount=amount,
+        payment_method=method,
+        payment_status=status,
         accepted_by=message.from_user.id if message.from_user else None,
     )
+    if pass_id is None:
+        return
     await state.clear()
     await message.answer(
-        f"✅ Оплата сохранена: {amount} ({_format_payment_method_label(method)})",
+        f"{_format_issued_pass(data)}\n✅ Оплата сохранена: {amount} ({_format_payment_method_label(method)})",
         reply_markup=pass_menu_keyboard(),
     )
 
 
 @router.message(F.text == MAIN_MENU_BUTTONS[6], StateFilter(None))
-async def handle_expense_menu(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_expense_menu(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     await state.clear()
@@ -2848,8 +2958,8 @@ async def handle_expense_menu(message: Message, config: Config, state: FSMContex
 
 
 @router.message(ExpenseStates.menu)
-async def handle_expense_menu_choice(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_expense_menu_choice(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == EXPENSE_MENU_BUTTONS[3]:
@@ -2866,7 +2976,7 @@ async def handle_expense_menu_choice(message: Message, config: Config, state: FS
         return
     if message.text == EXPENSE_MENU_BUTTONS[2]:
         await state.set_state(ExpenseStates.category_menu)
-        categories = list_expense_categories(config.db_path, include_inactive=False)
+        categories = await list_expense_categories(config.db_path, include_inactive=False)
         await message.answer(
             _active_expense_categories_text(categories),
             reply_markup=expense_category_menu_keyboard(),
@@ -2876,8 +2986,8 @@ async def handle_expense_menu_choice(message: Message, config: Config, state: FS
 
 
 @router.message(ExpenseStates.add_date)
-async def handle_expense_add_date(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_expense_add_date(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == EXPENSE_DATE_BUTTONS[4]:
@@ -2886,7 +2996,7 @@ async def handle_expense_add_date(message: Message, config: Config, state: FSMCo
         return
     if message.text == EXPENSE_DATE_BUTTONS[3]:
         created_by = message.from_user.id if message.from_user else 0
-        last_expense = get_last_expense(config.db_path, created_by)
+        last_expense = await get_last_expense(config.db_path, created_by)
         if not last_expense:
             await message.answer("Нет предыдущих расходов")
             return
@@ -2897,7 +3007,7 @@ async def handle_expense_add_date(message: Message, config: Config, state: FSMCo
             last_expense[4],
             last_expense[5],
         )
-        categories = list_expense_categories(config.db_path, include_inactive=True)
+        categories = await list_expense_categories(config.db_path, include_inactive=True)
         category_name = next((c[1] for c in categories if c[0] == category_id), "—")
         await state.update_data(
             exp_date=exp_date,
@@ -2930,8 +3040,8 @@ async def handle_expense_add_date(message: Message, config: Config, state: FSMCo
 
 
 @router.message(ExpenseStates.add_category)
-async def handle_expense_add_category(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_expense_add_category(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == EXPENSE_CATEGORY_SELECT_BACK:
@@ -2968,8 +3078,8 @@ async def handle_expense_add_category(message: Message, config: Config, state: F
 
 
 @router.message(ExpenseStates.add_category_create)
-async def handle_expense_add_category_create(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_expense_add_category_create(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == EXPENSE_CATEGORY_SELECT_BACK:
@@ -2979,14 +3089,14 @@ async def handle_expense_add_category_create(message: Message, config: Config, s
     if not message.text or message.text.strip() == "":
         await message.answer("Введите название категории")
         return
-    create_expense_category(config.db_path, message.text.strip())
+    await create_expense_category(config.db_path, message.text.strip())
     await state.set_state(ExpenseStates.add_category)
     await _show_expense_category_selection(message, config, state)
 
 
 @router.message(ExpenseStates.add_amount)
-async def handle_expense_add_amount(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_expense_add_amount(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     amount = _parse_amount(message.text or "")
@@ -2999,8 +3109,8 @@ async def handle_expense_add_amount(message: Message, config: Config, state: FSM
 
 
 @router.message(ExpenseStates.add_method)
-async def handle_expense_add_method(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_expense_add_method(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == EXPENSE_METHOD_BUTTONS[3]:
@@ -3021,8 +3131,8 @@ async def handle_expense_add_method(message: Message, config: Config, state: FSM
 
 
 @router.message(ExpenseStates.add_comment)
-async def handle_expense_add_comment(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_expense_add_comment(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == EXPENSE_COMMENT_BUTTONS[1]:
@@ -3046,8 +3156,8 @@ async def handle_expense_add_comment(message: Message, config: Config, state: FS
 
 
 @router.message(ExpenseStates.add_confirm)
-async def handle_expense_add_confirm(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_expense_add_confirm(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == EXPENSE_CONFIRM_BUTTONS[2]:
@@ -3062,7 +3172,7 @@ async def handle_expense_add_confirm(message: Message, config: Config, state: FS
         await message.answer("Выберите действие", reply_markup=expense_confirm_keyboard())
         return
     data = await state.get_data()
-    create_expense(
+    await create_expense(
         config.db_path,
         exp_date=data.get("exp_date"),
         category_id=int(data.get("category_id")),
@@ -3076,8 +3186,8 @@ async def handle_expense_add_confirm(message: Message, config: Config, state: FS
 
 
 @router.message(ExpenseStates.add_edit)
-async def handle_expense_add_edit_menu(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_expense_add_edit_menu(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == EXPENSE_EDIT_BUTTONS[4]:
@@ -3093,10 +3203,10 @@ async def handle_expense_add_edit_menu(message: Message, config: Config, state:
         await message.answer(summary, reply_markup=expense_confirm_keyboard())
         return
     if message.text == EXPENSE_EDIT_BUTTONS[0]:
-        categories = list_expense_categories(config.db_path, include_inactive=False)
+        categories = await list_expense_categories(config.db_path, include_inactive=False)
         labels = [f"{c[1]} (id:{c[0]})" for c in categories]
         mapping = {label: c[0] for label, c in zip(labels, categories)}
-        await state.update_data(category_map=mapping, category_names={c[0]: c[1] for c in categories})
+        await state.update_data(category_map=mapping)
         await state.set_state(ExpenseStates.add_category)
         await message.answer("Выберите категорию", reply_markup=categories_selection_keyboard(labels))
         return
@@ -3116,8 +3226,8 @@ async def handle_expense_add_edit_menu(message: Message, config: Config, state:
 
 
 @router.message(ExpenseStates.list_period)
-async def handle_expense_list_period(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_expense_list_period(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == EXPENSE_LIST_PERIOD_BUTTONS[4]:
@@ -3143,8 +3253,8 @@ async def handle_expense_list_period(message: Message, config: Config, state: FS
 
 
 @router.message(ExpenseStates.list_custom_from)
-async def handle_expense_list_custom_from(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_expense_list_custom_from(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     parsed = _parse_iso_date(message.text or "")
@@ -3157,8 +3267,8 @@ async def handle_expense_list_custom_from(message: Message, config: Config, stat
 
 
 @router.message(ExpenseStates.list_custom_to)
-async def handle_expense_list_custom_to(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_expense_list_custom_to(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     parsed = _parse_iso_date(message.text or "")
@@ -3172,7 +3282,7 @@ async def handle_expense_list_custom_to(message: Message, config: Config, state:
 async def _show_expense_list(
     message: Message, config: Config, state: FSMContext, date_from: str, date_to: str
 ) -> None:
-    expenses = list_expenses(config.db_path, date_from, date_to, limit=30)
+    expenses = await list_expenses(config.db_path, date_from, date_to, limit=30)
     if not expenses:
         await state.set_state(ExpenseStates.menu)
         await message.answer("Расходов нет", reply_markup=expense_menu_keyboard())
@@ -3191,8 +3301,8 @@ async def _show_expense_list(
 
 
 @router.message(ExpenseStates.list_select)
-async def handle_expense_list_select(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_expense_list_select(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == "↩️ Назад":
@@ -3204,7 +3314,7 @@ async def handle_expense_list_select(message: Message, config: Config, state: FS
     if message.text not in mapping:
         await message.answer("Выберите расход из списка")
         return
-    expense = get_expense_by_id(config.db_path, int(mapping[message.text]))
+    expense = await get_expense_by_id(config.db_path, int(mapping[message.text]))
     if not expense:
         await message.answer("Расход не найден")
         return
@@ -3215,8 +3325,8 @@ async def handle_expense_list_select(message: Message, config: Config, state: FS
 
 
 @router.message(ExpenseStates.card)
-async def handle_expense_card_actions(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_expense_card_actions(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == EXPENSE_CARD_BUTTONS[2]:
@@ -3225,7 +3335,7 @@ async def handle_expense_card_actions(message: Message, config: Config, state: F
         return
     if message.text == EXPENSE_CARD_BUTTONS[1]:
         data = await state.get_data()
-        delete_expense(config.db_path, int(data.get("expense_id")))
+        await delete_expense(config.db_path, int(data.get("expense_id")))
         await state.set_state(ExpenseStates.menu)
         await message.answer("Удалено ✅", reply_markup=expense_menu_keyboard())
         return
@@ -3237,13 +3347,13 @@ async def handle_expense_card_actions(message: Message, config: Config, state: F
 
 
 @router.message(ExpenseStates.edit_menu)
-async def handle_expense_edit_menu(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_expense_edit_menu(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == EXPENSE_EDIT_BUTTONS[4]:
         data = await state.get_data()
-        expense = get_expense_by_id(config.db_path, int(data.get("expense_id")))
+        expense = await get_expense_by_id(config.db_path, int(data.get("expense_id")))
         if not expense:
             await message.answer("Расход не найден")
             return
@@ -3252,10 +3362,10 @@ async def handle_expense_edit_menu(message: Message, config: Config, state: FSMC
         await message.answer(card, reply_markup=expense_card_keyboard())
         return
     if message.text == EXPENSE_EDIT_BUTTONS[0]:
-        categories = list_expense_categories(config.db_path, include_inactive=False)
+        categories = await list_expense_categories(config.db_path, include_inactive=False)
         labels = [f"{c[1]} (id:{c[0]})" for c in categories]
         mapping = {label: c[0] for label, c in zip(labels, categories)}
-        await state.update_data(category_map=mapping, category_names={c[0]: c[1] for c in categories})
+        await state.update_data(category_map=mapping)
         await state.set_state(ExpenseStates.edit_category)
         await message.answer("Выберите категорию", reply_markup=categories_selection_keyboard(labels))
         return
@@ -3275,8 +3385,8 @@ async def handle_expense_edit_menu(message: Message, config: Config, state: FSMC
 
 
 @router.message(ExpenseStates.edit_category)
-async def handle_expense_edit_category(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_expense_edit_category(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == "↩️ Назад":
@@ -3288,16 +3398,15 @@ async def handle_expense_edit_category(message: Message, config: Config, state:
     if message.text not in mapping:
         await message.answer("Выберите категорию из списка")
         return
-    update_expense(config.db_path, int(data.get("expense_id")), category_id=int(mapping[message.text]))
+    expense = await update_expense(config.db_path, int(data.get("expense_id")), category_id=int(mapping[message.text]))
     await state.set_state(ExpenseStates.card)
-    expense = get_expense_by_id(config.db_path, int(data.get("expense_id")))
     card = _format_expense_card(expense[1], expense[3], expense[4], expense[5], expense[6])
     await message.answer(card, reply_markup=expense_card_keyboard())
 
 
 @router.message(ExpenseStates.edit_amount)
-async def handle_expense_edit_amount(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_expense_edit_amount(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     amount = _parse_amount(message.text or "")
@@ -3305,16 +3414,15 @@ async def handle_expense_edit_amount(message: Message, config: Config, state: FS
         await message.answer("Введите сумму числом")
         return
     data = await state.get_data()
-    update_expense(config.db_path, int(data.get("expense_id")), amount=amount)
+    expense = await update_expense(config.db_path, int(data.get("expense_id")), amount=amount)
     await state.set_state(ExpenseStates.card)
-    expense = get_expense_by_id(config.db_path, int(data.get("expense_id")))
     card = _format_expense_card(expense[1], expense[3], expense[4], expense[5], expense[6])
     await message.answer(card, reply_markup=expense_card_keyboard())
 
 
 @router.message(ExpenseStates.edit_method)
-async def handle_expense_edit_method(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_expense_edit_method(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == EXPENSE_METHOD_BUTTONS[3]:
@@ -3330,16 +3438,15 @@ async def handle_expense_edit_method(message: Message, config: Config, state: FS
         await message.answer("Выберите способ", reply_markup=expense_method_keyboard())
         return
     data = await state.get_data()
-    update_expense(config.db_path, int(data.get("expense_id")), method=method_map[message.text])
+    expense = await update_expense(config.db_path, int(data.get("expense_id")), method=method_map[message.text])
     await state.set_state(ExpenseStates.card)
-    expense = get_expense_by_id(config.db_path, int(data.get("expense_id")))
     card = _format_expense_card(expense[1], expense[3], expense[4], expense[5], expense[6])
     await message.answer(card, reply_markup=expense_card_keyboard())
 
 
 @router.message(ExpenseStates.edit_comment)
-async def handle_expense_edit_comment(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_expense_edit_comment(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == EXPENSE_COMMENT_BUTTONS[1]:
@@ -3350,16 +3457,15 @@ async def handle_expense_edit_comment(message: Message, config: Config, state: F
     if message.text and message.text not in (EXPENSE_COMMENT_BUTTONS[0],):
         comment = message.text.strip()
     data = await state.get_data()
-    update_expense(config.db_path, int(data.get("expense_id")), comment=comment)
+    expense = await update_expense(config.db_path, int(data.get("expense_id")), comment=comment)
     await state.set_state(ExpenseStates.card)
-    expense = get_expense_by_id(config.db_path, int(data.get("expense_id")))
     card = _format_expense_card(expense[1], expense[3], expense[4], expense[5], expense[6])
     await message.answer(card, reply_markup=expense_card_keyboard())
 
 
 @router.message(ExpenseStates.category_menu)
-async def handle_expense_category_menu(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_expense_category_menu(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == EXPENSE_CATEGORY_MENU_BUTTONS[4]:
@@ -3367,7 +3473,7 @@ async def handle_expense_category_menu(message: Message, config: Config, state:
         await message.answer("Расходы", reply_markup=expense_menu_keyboard())
         return
     if message.text == "Категории":
-        categories = list_expense_categories(config.db_path, include_inactive=False)
+        categories = await list_expense_categories(config.db_path, include_inactive=False)
         await message.answer(
             _active_expense_categories_text(categories),
             reply_markup=expense_category_menu_keyboard(),
@@ -3378,7 +3484,7 @@ async def handle_expense_category_menu(message: Message, config: Config, state:
         await message.answer("Введите название категории")
         return
     if message.text == EXPENSE_CATEGORY_MENU_BUTTONS[1]:
-        categories = list_expense_categories(config.db_path, include_inactive=True)
+        categories = await list_expense_categories(config.db_path, include_inactive=True)
         if not categories:
             await message.answer("Категорий нет")
             return
@@ -3389,7 +3495,7 @@ async def handle_expense_category_menu(message: Message, config: Config, state:
         await message.answer("Выберите категорию", reply_markup=categories_selection_keyboard(labels))
         return
     if message.text == EXPENSE_CATEGORY_MENU_BUTTONS[2]:
-        categories = list_expense_categories(config.db_path, include_inactive=False)
+        categories = await list_expense_categories(config.db_path, include_inactive=False)
         if not categories:
             await message.answer("Активных категорий нет")
             return
@@ -3400,7 +3506,7 @@ async def handle_expense_category_menu(message: Message, config: Config, state:
         await message.answer("Выберите категорию", reply_markup=categories_selection_keyboard(labels))
         return
     if message.text == EXPENSE_CATEGORY_MENU_BUTTONS[3]:
-        categories = list_expense_categories(config.db_path, include_inactive=True)
+        categories = await list_expense_categories(config.db_path, include_inactive=True)
         hidden = [c for c in categories if c[2] == 0]
         if not hidden:
             await message.answer("Скрытых категорий нет")
@@ -3417,16 +3523,16 @@ async def handle_expense_category_menu(message: Message, config: Config, state:
 
 
 @router.message(ExpenseStates.category_add)
-async def handle_expense_category_add(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_expense_category_add(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if not message.text or message.text.strip() == "":
         await message.answer("Введите название категории")
         return
-    create_expense_category(config.db_path, message.text.strip())
+    await create_expense_category(config.db_path, message.text.strip())
     await state.set_state(ExpenseStates.category_menu)
-    categories = list_expense_categories(config.db_path, include_inactive=False)
+    categories = await list_expense_categories(config.db_path, include_inactive=False)
     await message.answer("Категория добавлена ✅")
     await message.answer(
         _active_expense_categories_text(categories),
@@ -3435,13 +3541,13 @@ async def handle_expense_category_add(message: Message, config: Config, state: F
 
 
 @router.message(ExpenseStates.category_rename_select)
-async def handle_expense_category_rename_select(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_expense_category_rename_select(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == "↩️ Назад":
         await state.set_state(ExpenseStates.category_menu)
-        categories = list_expense_categories(config.db_path, include_inactive=False)
+        categories = await list_expense_categories(config.db_path, include_inactive=False)
         await message.answer(
             _active_expense_categories_text(categories),
             reply_markup=expense_category_menu_keyboard(),
@@ -3458,17 +3564,17 @@ async def handle_expense_category_rename_select(message: Message, config: Config
 
 
 @router.message(ExpenseStates.category_rename_name)
-async def handle_expense_category_rename_name(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_expense_category_rename_name(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if not message.text or message.text.strip() == "":
         await message.answer("Введите новое название")
         return
     data = await state.get_data()
-    rename_expense_category(config.db_path, int(data.get("category_id")), message.text.strip())
+    await rename_expense_category(config.db_path, int(data.get("category_id")), message.text.strip())
     await state.set_state(ExpenseStates.category_menu)
-    categories = list_expense_categories(config.db_path, include_inactive=False)
+    categories = await list_expense_categories(config.db_path, include_inactive=False)
     await message.answer("Категория переименована ✅")
     await message.answer(
         _active_expense_categories_text(categories),
@@ -3477,13 +3583,13 @@ async def handle_expense_category_rename_name(message: Message, config: Config,
 
 
 @router.message(ExpenseStates.category_hide_select)
-async def handle_expense_category_hide_select(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_expense_category_hide_select(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == "↩️ Назад":
         await state.set_state(ExpenseStates.category_menu)
-        categories = list_expense_categories(config.db_path, include_inactive=False)
+        categories = await list_expense_categories(config.db_path, include_inactive=False)
         await message.answer(
             _active_expense_categories_text(categories),
             reply_markup=expense_category_menu_keyboard(),
@@ -3494,9 +3600,9 @@ async def handle_expense_category_hide_select(message: Message, config: Config,
     if message.text not in mapping:
         await message.answer("Выберите категорию из списка")
         return
-    set_expense_category_active(config.db_path, int(mapping[message.text]), False)
+    await set_expense_category_active(config.db_path, int(mapping[message.text]), False)
     await state.set_state(ExpenseStates.category_menu)
-    categories = list_expense_categories(config.db_path, include_inactive=False)
+    categories = await list_expense_categories(config.db_path, include_inactive=False)
     await message.answer("Категория скрыта ✅")
     await message.answer(
         _active_expense_categories_text(categories),
@@ -3505,13 +3611,13 @@ async def handle_expense_category_hide_select(message: Message, config: Config,
 
 
 @router.message(ExpenseStates.category_show_hidden_select)
-async def handle_expense_category_show_hidden_select(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_expense_category_show_hidden_select(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == "↩️ Назад":
         await state.set_state(ExpenseStates.category_menu)
-        categories = list_expense_categories(config.db_path, include_inactive=False)
+        categories = await list_expense_categories(config.db_path, include_inactive=False)
         await message.answer(
             _active_expense_categories_text(categories),
             reply_markup=expense_category_menu_keyboard(),
@@ -3522,9 +3628,9 @@ async def handle_expense_category_show_hidden_select(message: Message, config: C
     if message.text not in mapping:
         await message.answer("Выберите категорию из списка")
         return
-    set_expense_category_active(config.db_path, int(mapping[message.text]), True)
+    await set_expense_category_active(config.db_path, int(mapping[message.text]), True)
     await state.set_state(ExpenseStates.category_menu)
-    categories = list_expense_categories(config.db_path, include_inactive=False)
+    categories = await list_expense_categories(config.db_path, include_inactive=False)
     await message.answer("Категория активирована ✅")
     await message.answer(
         _active_expense_categories_text(categories),
@@ -3533,8 +3639,8 @@ async def handle_expense_category_show_hidden_select(message: Message, config: C
 
 
 @router.message(F.text == MAIN_MENU_BUTTONS[1])
-async def handle_search_menu(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_search_menu(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     await state.clear()
@@ -3543,8 +3649,8 @@ async def handle_search_menu(message: Message, config: Config, state: FSMContext
 
 
 @router.message(SearchStates.menu)
-async def handle_search_menu_choice(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_search_menu_choice(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == SEARCH_MENU_BUTTONS[3]:
@@ -3567,8 +3673,8 @@ async def handle_search_menu_choice(message: Message, config: Config, state: FSM
 
 
 @router.message(SearchStates.phone)
-async def handle_search_phone(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_search_phone(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == NEW_CLIENT_PHONE_BUTTONS[2]:
@@ -3594,7 +3700,7 @@ async def handle_search_phone(message: Message, config: Config, state: FSMContex
         await message.answer("Не удалось распознать телефон, попробуйте еще раз")
         return
 
-    client = get_client_by_phone(config.db_path, normalized)
+    client = await get_client_by_phone(config.db_path, normalized)
     if not client:
         await state.clear()
         await message.answer("Не найдено", reply_markup=not_found_keyboard())
@@ -3604,8 +3710,8 @@ async def handle_search_phone(message: Message, config: Config, state: FSMContex
 
 
 @router.message(SearchStates.name)
-async def handle_search_name(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_search_name(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == "❌ Отмена":
@@ -3616,13 +3722,13 @@ async def handle_search_name(message: Message, config: Config, state: FSMContext
         await message.answer("Введите имя или часть имени")
         return
 
-    results = search_clients_by_name(config.db_path, message.text.strip(), limit=11)
+    results, is_fuzzy = await _search_clients(config, message.text.strip())
     if len(results) == 0:
         await state.clear()
         await message.answer("Не найдено", reply_markup=not_found_keyboard())
         return
-    if len(results) == 1:
-        client = get_client_by_id(config.db_path, results[0][0])
+    if len(results) == 1 and not is_fuzzy:
+        client = await get_client_by_id(config.db_path, results[0][0])
         await _show_client_card(message, config, client, state)
         return
     if len(results) > 10:
@@ -3633,12 +3739,15 @@ async def handle_search_name(message: Message, config: Config, state: FSMContext
     mapping = {label: row[0] for label, row in zip(labels, results)}
     await state.update_data(search_results=mapping)
     await state.set_state(SearchStates.select)
-    await message.answer("Выберите клиента", reply_markup=search_results_keyboard(labels))
+    await message.answer(
+        "Точного совпадения нет, возможно, вы искали:" if is_fuzzy else "Выберите клиента",
+        reply_markup=search_results_keyboard(labels),
+    )
 
 
 @router.message(SearchStates.tg_username)
-async def handle_search_tg(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_search_tg(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == "❌ Отмена":
@@ -3654,7 +3763,7 @@ async def handle_search_tg(message: Message, config: Config, state: FSMContext)
         await message.answer("Введите username")
         return
 
-    client = get_client_by_tg_username(config.db_path, normalized)
+    client = await get_client_by_tg_username(config.db_path, normalized)
     if not client:
         await state.clear()
         await message.answer("Не найдено", reply_markup=not_found_keyboard())
@@ -3664,8 +3773,8 @@ async def handle_search_tg(message: Message, config: Config, state: FSMContext)
 
 
 @router.message(SearchStates.select)
-async def handle_search_select(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_search_select(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == "❌ Отмена":
@@ -3677,13 +3786,13 @@ async def handle_search_select(message: Message, config: Config, state: FSMConte
     if message.text not in mapping:
         await message.answer("Выберите клиента из списка")
         return
-    client = get_client_by_id(config.db_path, int(mapping[message.text]))
+    client = await get_client_by_id(config.db_path, int(mapping[message.text]))
     await _show_client_card(message, config, client, state)
 
 
 @router.message(SearchStates.card, F.text == CLIENT_ACTION_BUTTONS[4])
-async def handle_client_back_to_search(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_client_back_to_search(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     await state.clear()
@@ -3692,8 +3801,8 @@ async def handle_client_back_to_search(message: Message, config: Config, state:
 
 
 @router.message(SearchStates.card, F.text.in_(CLIENT_ACTION_BUTTONS[:4]))
-async def handle_client_actions(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_client_actions(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if not message.text:
@@ -3711,18 +3820,16 @@ async def handle_client_actions(message: Message, config: Config, state: FSMCont
         await message.answer("Выберите тип записи", reply_markup=booking_type_keyboard())
         return
     if message.text == CLIENT_ACTION_BUTTONS[1]:
-        groups = list_active_groups(config.db_path)
+        groups = await list_active_groups(config.db_path)
         if not groups:
             await state.clear()
             await message.answer("Групп пока нет", reply_markup=_main_menu_reply_markup(message, config))
             return
         labels = [_format_group_label(group[0], group[1]) for group in groups]
-        mapping = {label: group[0] for label, group in zip(labels, groups)}
         await state.clear()
         await state.set_state(AttendanceStates.select_group)
         await state.update_data(
-            group_map=mapping,
-            group_names={group[0]: group[1] for group in groups},
+            group_ids=[group[0] for group in groups],
             prefill_client_id=client_id,
             prefill_client_name=client_name,
         )
@@ -3755,8 +3862,8 @@ async def handle_cancel_any(message: Message, config: Config, state: FSMContext)
 
 
 @router.message(F.text == MAIN_MENU_BUTTONS[7])
-async def handle_reports_menu(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_reports_menu(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     await state.clear()
@@ -3766,8 +3873,8 @@ async def handle_reports_menu(message: Message, config: Config, state: FSMContex
 
 
 @router.message(F.text == MAIN_MENU_BUTTONS[8])
-async def handle_trainers_menu(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_trainers_menu(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     await state.clear()
@@ -3776,8 +3883,8 @@ async def handle_trainers_menu(message: Message, config: Config, state: FSMConte
 
 
 @router.message(F.text == MAIN_MENU_BUTTONS[9])
-async def handle_groups_menu(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_groups_menu(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     await state.clear()
@@ -3858,7 +3965,7 @@ async def handle_admin_add_name(message: Message, config: Config, state: FSMCont
         return
     data = await state.get_data()
     tg_user_id = int(data["tg_user_id"])
-    upsert_admin(config.db_path, tg_user_id=tg_user_id, name=message.text.strip())
+    await upsert_admin(config.db_path, tg_user_id=tg_user_id, name=message.text.strip())
     await state.clear()
     await message.answer("Админ сохранен и активирован ✅", reply_markup=admin_menu_keyboard())
 
@@ -3869,7 +3976,7 @@ async def handle_admin_disable_start(message: Message, config: Config, state: FS
         await message.answer("Доступ запрещен")
         await state.clear()
         return
-    active, inactive = list_admins(config.db_path)
+    active, inactive = await list_admins(config.db_path)
     combined = active + inactive
     if not combined:
         await message.answer("Админов пока нет", reply_markup=admin_menu_keyboard())
@@ -3895,7 +4002,7 @@ async def handle_admin_disable_tg_id(message: Message, config: Config, state: FS
     if not message.text or not message.text.isdigit():
         await message.answer("Нужен tg_user_id числом")
         return
-    success = deactivate_admin(config.db_path, tg_user_id=int(message.text))
+    success = await deactivate_admin(config.db_path, tg_user_id=int(message.text))
     await state.clear()
     if success:
         await message.answer("Админ отключен ✅", reply_markup=admin_menu_keyboard())
@@ -3917,7 +4024,7 @@ async def handle_admin_manage_select(message: Message, config: Config, state: FS
     if admin_id is None:
         await message.answer("Выберите админа из списка")
         return
-    admin = get_admin_by_tg_user_id(config.db_path, admin_id)
+    admin = await get_admin_by_tg_user_id(config.db_path, admin_id)
     if not admin:
         await message.answer("Админ не найден", reply_markup=admin_menu_keyboard())
         await state.clear()
@@ -3945,12 +4052,12 @@ async def handle_admin_manage_action(message: Message, config: Config, state: FS
         await handle_admin_disable_start(message, config, state)
         return
     if message.text == ADMIN_MANAGE_BUTTONS[0]:
-        set_admin_active(config.db_path, int(admin_id), False)
+        await set_admin_active(config.db_path, int(admin_id), False)
         await message.answer("Админ отключен ✅", reply_markup=admin_menu_keyboard())
         await state.clear()
         return
     if message.text == ADMIN_MANAGE_BUTTONS[1]:
-        set_admin_active(config.db_path, int(admin_id), True)
+        await set_admin_active(config.db_path, int(admin_id), True)
         await message.answer("Админ активирован ✅", reply_markup=admin_menu_keyboard())
         await state.clear()
         return
@@ -3963,7 +4070,7 @@ async def handle_admin_list(message: Message, config: Config, state: FSMContext)
         await message.answer("Доступ запрещен")
         await state.clear()
         return
-    active, inactive = list_admins(config.db_path)
+    active, inactive = await list_admins(config.db_path)
     combined = active + inactive
     if not combined:
         await message.answer("Админов пока нет", reply_markup=admin_menu_keyboard())
@@ -4001,43 +4108,55 @@ async def _show_report(message: Message, config: Config, state: FSMContext, repo
     today_date = date.today()
     date_from, date_to, label = await _ensure_report_period(state, today_date)
     period_line = _period_label(date_from, date_to, label)
+    today_str = today_date.strftime("%Y-%m-%d")
+    snapshot = None
+    if report_key in REPORT_SNAPSHOT_PARTS:
+        snapshot = await get_report_snapshot(
+            config.db_path,
+            date_from,
+            date_to,
+            today_str,
+            DEFER_OVERDUE_DAYS,
+            parts=REPORT_SNAPSHOT_PARTS[report_key],
+            unpaid_limit=REPORT_UNPAID_SINGLE_LIMIT,
+            deferred_limit=REPORT_DEFERRED_LIMIT,
+        )
 
     if report_key == "revenue":
-        summary = get_revenue_summary(config.db_path, date_from, date_to)
-        text = _format_revenue_report(period_line, summary)
+        text = _format_revenue_report(period_line, snapshot.revenue)
     elif report_key == "expenses":
-        summary = get_expense_summary(config.db_path, date_from, date_to)
-        text = _format_expense_report(period_line, summary)
+        text = _format_expense_report(period_line, snapshot.expenses)
     elif report_key == "profit":
-        revenue = get_revenue_summary(config.db_path, date_from, date_to)
-        expenses = get_expense_summary(config.db_path, date_from, date_to)
-        text = _format_profit_report(period_line, revenue.total, expenses.total)
+        text = _format_profit_report(period_line, snapshot.revenue.total, snapshot.expenses.total)
     elif report_key == "attendance":
-        summary = get_attendance_summary(config.db_path, date_from, date_to)
-        text = _format_attendance_report(period_line, summary)
+        text = _format_attendance_report(period_line, snapshot.attendance)
     elif report_key == "passes":
-        today_str = today_date.strftime("%Y-%m-%d")
         expiring_from = today_str
         expiring_to = (today_date + timedelta(days=7)).strftime("%Y-%m-%d")
-        active_passes = list_active_passes_today(config.db_path, today_str)
-        expiring = list_passes_expiring(config.db_path, expiring_from, expiring_to)
-        missing = list_clients_without_active_pass(config.db_path, today_str)
+        active_passes = await list_active_passes_today(config.db_path, today_str)
+        expiring = await list_passes_expiring(config.db_path, expiring_from, expiring_to)
+        missing = await list_clients_without_active_pass(config.db_path, today_str)
         text = _format_passes_report(today_str, active_passes, expiring, missing)
     elif report_key == "singles":
-        total_single = count_single_visits(config.db_path, date_from, date_to)
-        total_unpaid = count_single_visits_without_payment(config.db_path, date_from, date_to)
-        unpaid = list_single_visits_without_payment(
-            config.db_path, date_from, date_to, limit=REPORT_UNPAID_SINGLE_LIMIT
-        )
         text = _format_single_visits_report(
-            period_line, total_single, total_unpaid, unpaid, REPORT_UNPAID_SINGLE_LIMIT
+            period_line,
+            snapshot.single_visits,
+            snapshot.unpaid_single_count,
+            snapshot.unpaid_single_visits,
+            REPORT_UNPAID_SINGLE_LIMIT,
         )
     elif report_key == "defers":
-        today_str = today_date.strftime("%Y-%m-%d")
-        total_count, total_amount, latest, overdue = get_deferred_summary(
-            config.db_path, date_from, date_to, today_str, DEFER_OVERDUE_DAYS
+        latest = [
+            (pay_id, client_name, group_name, amount, created_date, due_date)
+            for pay_id, created_date, client_name, group_name, amount, _purpose, due_date in snapshot.deferred
+        ]
+        overdue = [
+            (pay_id, client_name, group_name, amount, created_date)
+            for pay_id, created_date, client_name, group_name, amount, _purpose, _due_date in snapshot.overdue
+        ]
+        text = _format_deferred_report(
+            period_line, snapshot.deferred_count, snapshot.deferred_amount, latest, overdue, DEFER_OVERDUE_DAYS
         )
-        text = _format_deferred_report(period_line, total_count, total_amount, latest, overdue, DEFER_OVERDUE_DAYS)
     else:
         text = "Отчет в разработке"
 
@@ -4055,85 +4174,84 @@ async def _show_last_report_or_menu(message: Message, config: Config, state: FSM
 
 
 @router.message(ReportStates.menu, F.text == REPORT_MENU_BUTTONS[0])
-async def handle_report_revenue(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_report_revenue(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     await _show_report(message, config, state, "revenue")
 
 
 @router.message(ReportStates.menu, F.text == REPORT_MENU_BUTTONS[1])
-async def handle_report_expenses(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_report_expenses(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     await _show_report(message, config, state, "expenses")
 
 
 @router.message(ReportStates.menu, F.text == REPORT_MENU_BUTTONS[2])
-async def handle_report_profit(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_report_profit(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     await _show_report(message, config, state, "profit")
 
 
 @router.message(ReportStates.menu, F.text == REPORT_MENU_BUTTONS[3])
-async def handle_report_attendance(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_report_attendance(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     await _show_report(message, config, state, "attendance")
 
 
 @router.message(ReportStates.menu, F.text == REPORT_MENU_BUTTONS[4])
-async def handle_report_passes(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_report_passes(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     await _show_report(message, config, state, "passes")
 
 
 @router.message(ReportStates.menu, F.text == REPORT_MENU_BUTTONS[5])
-async def handle_report_singles(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_report_singles(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     await _show_report(message, config, state, "singles")
 
 
 @router.message(ReportStates.menu, F.text == REPORT_MENU_BUTTONS[6])
-async def handle_report_defers(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_report_defers(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     await _show_report(message, config, state, "defers")
 
 
 @router.message(ReportStates.menu, F.text == REPORT_MENU_BUTTONS[7])
-async def handle_report_excel(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_report_excel(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     today_date = date.today()
     date_from, date_to, _ = await _ensure_report_period(state, today_date)
     today_str = today_date.strftime("%Y-%m-%d")
-    data = build_excel_report(config.db_path, date_from, date_to, today_str, DEFER_OVERDUE_DAYS)
-    filename = f"report_{date_from}__{date_to}.xlsx"
-
-    owner_file = BufferedInputFile(data, filename=filename)
-    requester_file = BufferedInputFile(data, filename=filename)
-
+    extra_recipients = ()
     if message.from_user and message.from_user.id != config.owner_tg_user_id:
-        await message.bot.send_document(
-            config.owner_tg_user_id,
-            owner_file,
-            caption=f"Отчет {date_from} — {date_to}",
-        )
-    await message.answer_document(
-        requester_file,
+        extra_recipients = (config.owner_tg_user_id,)
+    await send_excel_report(
+        message,
+        config.db_path,
+        date_from,
+        date_to,
+        today_str,
+        DEFER_OVERDUE_DAYS,
+        filename=f"report_{date_from}__{date_to}.xlsx",
         caption=f"Отчет {date_from} — {date_to}",
+        extra_recipients=extra_recipients,
         reply_markup=report_menu_keyboard(),
+        on_miss=lambda: message.answer("Готовлю отчет…"),
     )
 
 
@@ -4144,8 +4262,8 @@ async def handle_report_back_to_main(message: Message, config: Config, state: FS
 
 
 @router.message(ReportStates.view, F.text == REPORT_ACTION_BUTTONS[0])
-async def handle_report_period_menu(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_report_period_menu(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     await state.set_state(ReportStates.period_menu)
@@ -4153,36 +4271,35 @@ async def handle_report_period_menu(message: Message, config: Config, state: FSM
 
 
 @router.message(ReportStates.view, F.text == REPORT_ACTION_BUTTONS[1])
-async def handle_report_view_back(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_report_view_back(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     await _show_report_menu(message, config, state)
 
 
 @router.message(ReportStates.view, F.text == REPORT_ATTENDANCE_TODAY_BUTTON)
-async def handle_report_attendance_today_start(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_report_attendance_today_start(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     data = await state.get_data()
     if data.get("report_last") != "attendance":
         await message.answer("Сначала откройте отчет по посещаемости")
         return
-    groups = list_active_groups(config.db_path)
+    groups = await list_active_groups(config.db_path)
     if not groups:
         await message.answer("Групп пока нет", reply_markup=report_actions_keyboard(include_attendance_today=True))
         return
     labels = [_format_group_label(group[0], group[1]) for group in groups]
-    mapping = {label: group[0] for label, group in zip(labels, groups)}
-    await state.update_data(report_group_map=mapping, report_group_names={group[0]: group[1] for group in groups})
+    await state.update_data(report_group_ids=[group[0] for group in groups])
     await state.set_state(ReportStates.attendance_today_group)
     await message.answer("Выберите группу", reply_markup=groups_keyboard(labels))
 
 
 @router.message(ReportStates.period_menu)
-async def handle_report_period_choice(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_report_period_choice(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if not message.text:
@@ -4232,8 +4349,8 @@ async def handle_report_period_choice(message: Message, config: Config, state: F
 
 
 @router.message(ReportStates.period_custom_from)
-async def handle_report_period_custom_from(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_report_period_custom_from(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if not message.text:
@@ -4253,8 +4370,8 @@ async def handle_report_period_custom_from(message: Message, config: Config, sta
 
 
 @router.message(ReportStates.period_custom_to)
-async def handle_report_period_custom_to(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_report_period_custom_to(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if not message.text:
@@ -4286,8 +4403,8 @@ async def handle_report_period_custom_to(message: Message, config: Config, state
 
 
 @router.message(ReportStates.attendance_today_group)
-async def handle_report_attendance_today_group(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_report_attendance_today_group(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == "❌ Отмена":
@@ -4295,14 +4412,13 @@ async def handle_report_attendance_today_group(message: Message, config: Config,
         await _show_last_report_or_menu(message, config, state)
         return
     data = await state.get_data()
-    mapping = data.get("report_group_map", {})
-    if not message.text or message.text not in mapping:
+    choice = await _resolve_group_choice(config, message.text, data.get("report_group_ids", []))
+    if choice is None:
         await message.answer("Выберите группу из списка")
         return
-    group_id = int(mapping[message.text])
-    group_name = data.get("report_group_names", {}).get(group_id, "Группа")
+    group_id, group_name = choice
     today_str = date.today().strftime("%Y-%m-%d")
-    attendees = list_attended_today_by_group(config.db_path, group_id, today_str)
+    attendees = await list_attended_today_by_group(config.db_path, group_id, today_str)
     if attendees:
         lines = [f"- {full_name} ({phone})" for full_name, phone in attendees]
         text = f"Кто был сегодня ({group_name}, {today_str}):\n" + "\n".join(lines)
@@ -4323,12 +4439,12 @@ async def _show_groups_menu(message: Message, state: FSMContext) -> None:
 
 
 async def _show_trainer_card(message: Message, config: Config, state: FSMContext, trainer_id: int) -> None:
-    trainer = get_trainer_by_id(config.db_path, trainer_id)
+    trainer = await get_trainer_by_id(config.db_path, trainer_id)
     if not trainer:
         await message.answer("Тренер не найден", reply_markup=trainers_menu_keyboard())
         await state.set_state(TrainerStates.menu)
         return
-    groups = list_groups_by_trainer(config.db_path, trainer_id)
+    groups = await list_groups_by_trainer(config.db_path, trainer_id)
     await state.update_data(trainer_id=trainer_id)
     await state.set_state(TrainerStates.card)
     await message.answer(
@@ -4338,7 +4454,7 @@ async def _show_trainer_card(message: Message, config: Config, state: FSMContext
 
 
 async def _show_group_card(message: Message, config: Config, state: FSMContext, group_id: int) -> None:
-    group = get_group_by_id(config.db_path, group_id)
+    group = await get_group_by_id(config.db_path, group_id)
     if not group:
         await message.answer("Группа не найдена", reply_markup=groups_menu_keyboard())
         await state.set_state(GroupStates.menu)
@@ -4352,20 +4468,20 @@ async def _show_group_card(message: Message, config: Config, state: FSMContext,
 
 
 async def _show_schedule_menu(message: Message, config: Config, state: FSMContext, group_id: int) -> None:
-    group = get_group_by_id(config.db_path, group_id)
+    group = await get_group_by_id(config.db_path, group_id)
     if not group:
         await message.answer("Группа не найдена", reply_markup=groups_menu_keyboard())
         await state.set_state(GroupStates.menu)
         return
-    slots = list_schedule_for_group(config.db_path, group_id, include_inactive=True)
+    slots = await list_schedule_for_group(config.db_path, group_id, include_inactive=True)
     await state.update_data(schedule_group_id=group_id)
     await state.set_state(ScheduleStates.menu)
     await message.answer(_format_schedule_list(group[1], slots), reply_markup=schedule_menu_keyboard())
 
 
 @router.message(TrainerStates.menu)
-async def handle_trainers_menu_choice(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_trainers_menu_choice(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == TRAINERS_MENU_BUTTONS[0]:
@@ -4373,7 +4489,7 @@ async def handle_trainers_menu_choice(message: Message, config: Config, state: F
         await message.answer("Введите ФИО тренера")
         return
     if message.text == TRAINERS_MENU_BUTTONS[1]:
-        trainers = list_active_trainers(config.db_path)
+        trainers = await list_active_trainers(config.db_path)
         if not trainers:
             await message.answer("Активных тренеров нет", reply_markup=trainers_menu_keyboard())
             return
@@ -4389,8 +4505,8 @@ async def handle_trainers_menu_choice(message: Message, config: Config, state: F
 
 
 @router.message(TrainerStates.add_name)
-async def handle_trainer_add_name(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_trainer_add_name(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if not message.text or message.text.strip() == "":
@@ -4402,8 +4518,8 @@ async def handle_trainer_add_name(message: Message, config: Config, state: FSMCo
 
 
 @router.message(TrainerStates.add_phone)
-async def handle_trainer_add_phone(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_trainer_add_phone(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == SKIP_BUTTONS[1]:
@@ -4436,8 +4552,8 @@ async def handle_trainer_add_phone(message: Message, config: Config, state: FSMC
 
 
 @router.message(TrainerStates.add_tg)
-async def handle_trainer_add_tg(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_trainer_add_tg(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == SKIP_BUTTONS[1]:
@@ -4462,8 +4578,8 @@ async def handle_trainer_add_tg(message: Message, config: Config, state: FSMCont
 
 
 @router.message(TrainerStates.add_confirm)
-async def handle_trainer_add_confirm(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_trainer_add_confirm(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == CONFIRM_BUTTONS[1]:
@@ -4474,7 +4590,7 @@ async def handle_trainer_add_confirm(message: Message, config: Config, state: FS
         await message.answer("Выберите действие", reply_markup=confirm_keyboard())
         return
     data = await state.get_data()
-    trainer_id = create_trainer(
+    trainer_id = await create_trainer(
         config.db_path,
         full_name=str(data.get("trainer_full_name", "")).strip(),
         phone=data.get("trainer_phone"),
@@ -4484,8 +4600,8 @@ async def handle_trainer_add_confirm(message: Message, config: Config, state: FS
 
 
 @router.message(TrainerStates.list_select)
-async def handle_trainer_list_select(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_trainer_list_select(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == TRAINERS_MENU_BUTTONS[0]:
@@ -4503,19 +4619,19 @@ async def handle_trainer_list_select(message: Message, config: Config, state: FS
 
 
 @router.message(TrainerStates.card, F.text == TRAINER_ACTION_BUTTONS[0])
-async def handle_trainer_attach_group_start(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_trainer_attach_group_start(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
-    groups = list_active_groups(config.db_path)
+    groups = await list_active_groups(config.db_path)
     labels = [_format_choice_label(g[0], g[1]) for g in groups]
     await state.set_state(TrainerStates.attach_group_select)
     await message.answer("Выберите группу", reply_markup=trainer_attach_group_keyboard(labels))
 
 
 @router.message(TrainerStates.card, F.text == TRAINER_ACTION_BUTTONS[1])
-async def handle_trainer_create_group_start(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_trainer_create_group_start(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     await state.set_state(TrainerStates.create_group_name)
@@ -4523,8 +4639,8 @@ async def handle_trainer_create_group_start(message: Message, config: Config, st
 
 
 @router.message(TrainerStates.card, F.text == TRAINER_ACTION_BUTTONS[2])
-async def handle_trainer_detach_group_start(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_trainer_detach_group_start(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     data = await state.get_data()
@@ -4532,7 +4648,7 @@ async def handle_trainer_detach_group_start(message: Message, config: Config, st
     if not trainer_id:
         await message.answer("Тренер не выбран")
         return
-    groups = list_groups_by_trainer(config.db_path, int(trainer_id))
+    groups = await list_groups_by_trainer(config.db_path, int(trainer_id))
     if not groups:
         await message.answer("У тренера нет групп")
         await _show_trainer_card(message, config, state, int(trainer_id))
@@ -4543,8 +4659,8 @@ async def handle_trainer_detach_group_start(message: Message, config: Config, st
 
 
 @router.message(TrainerStates.card, F.text == TRAINER_ACTION_BUTTONS[3])
-async def handle_trainer_rename_start(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_trainer_rename_start(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     await state.set_state(TrainerStates.rename)
@@ -4552,40 +4668,40 @@ async def handle_trainer_rename_start(message: Message, config: Config, state: F
 
 
 @router.message(TrainerStates.card, F.text == TRAINER_ACTION_BUTTONS[4])
-async def handle_trainer_hide(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_trainer_hide(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     data = await state.get_data()
     trainer_id = data.get("trainer_id")
     if trainer_id:
-        set_trainer_active(config.db_path, int(trainer_id), False)
+        await set_trainer_active(config.db_path, int(trainer_id), False)
         await _show_trainer_card(message, config, state, int(trainer_id))
 
 
 @router.message(TrainerStates.card, F.text == TRAINER_ACTION_BUTTONS[5])
-async def handle_trainer_activate(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_trainer_activate(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     data = await state.get_data()
     trainer_id = data.get("trainer_id")
     if trainer_id:
-        set_trainer_active(config.db_path, int(trainer_id), True)
+        await set_trainer_active(config.db_path, int(trainer_id), True)
         await _show_trainer_card(message, config, state, int(trainer_id))
 
 
 @router.message(TrainerStates.card, F.text == TRAINER_ACTION_BUTTONS[6])
-async def handle_trainer_card_back(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_trainer_card_back(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     await _show_trainers_menu(message, state)
 
 
 @router.message(TrainerStates.attach_group_select)
-async def handle_trainer_attach_group_select(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_trainer_attach_group_select(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == TRAINER_ATTACH_GROUP_BACK:
@@ -4609,15 +4725,15 @@ async def handle_trainer_attach_group_select(message: Message, config: Config, s
     if not trainer_id:
         await message.answer("Тренер не выбран")
         return
-    success = set_group_trainer(config.db_path, group_id, int(trainer_id))
+    success = await set_group_trainer(config.db_path, group_id, int(trainer_id))
     if not success:
         await message.answer("Не удалось назначить тренера")
     await _show_trainer_card(message, config, state, int(trainer_id))
 
 
 @router.message(TrainerStates.create_group_name)
-async def handle_trainer_create_group_name(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_trainer_create_group_name(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if not message.text or message.text.strip() == "":
@@ -4629,8 +4745,8 @@ async def handle_trainer_create_group_name(message: Message, config: Config, sta
 
 
 @router.message(TrainerStates.create_group_capacity)
-async def handle_trainer_create_group_capacity(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_trainer_create_group_capacity(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == SKIP_BUTTONS[0]:
@@ -4655,8 +4771,8 @@ async def handle_trainer_create_group_capacity(message: Message, config: Config,
 
 
 @router.message(TrainerStates.create_group_room)
-async def handle_trainer_create_group_room(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_trainer_create_group_room(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == SKIP_BUTTONS[1]:
@@ -4674,7 +4790,7 @@ async def handle_trainer_create_group_room(message: Message, config: Config, sta
         await _show_trainers_menu(message, state)
         return
     try:
-        create_group(
+        await create_group(
             config.db_path,
             name=str(data.get("group_name", "")).strip(),
             capacity=int(data.get("group_capacity", 0) or 0),
@@ -4687,8 +4803,8 @@ async def handle_trainer_create_group_room(message: Message, config: Config, sta
 
 
 @router.message(TrainerStates.detach_group_select)
-async def handle_trainer_detach_group_select(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_trainer_detach_group_select(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == TRAINER_DETACH_GROUP_BACK:
@@ -4703,7 +4819,7 @@ async def handle_trainer_detach_group_select(message: Message, config: Config, s
     if group_id is None:
         await message.answer("Выберите группу из списка")
         return
-    clear_group_trainer(config.db_path, group_id)
+    await clear_group_trainer(config.db_path, group_id)
     data = await state.get_data()
     trainer_id = data.get("trainer_id")
     if trainer_id:
@@ -4713,8 +4829,8 @@ async def handle_trainer_detach_group_select(message: Message, config: Config, s
 
 
 @router.message(TrainerStates.rename)
-async def handle_trainer_rename(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_trainer_rename(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if not message.text or message.text.strip() == "":
@@ -4725,13 +4841,13 @@ async def handle_trainer_rename(message: Message, config: Config, state: FSMCont
     if not trainer_id:
         await _show_trainers_menu(message, state)
         return
-    update_trainer_name(config.db_path, int(trainer_id), message.text.strip())
+    await update_trainer_name(config.db_path, int(trainer_id), message.text.strip())
     await _show_trainer_card(message, config, state, int(trainer_id))
 
 
 @router.message(GroupStates.menu)
-async def handle_groups_menu_choice(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_groups_menu_choice(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == GROUPS_MENU_BUTTONS[0]:
@@ -4739,7 +4855,7 @@ async def handle_groups_menu_choice(message: Message, config: Config, state: FSM
         await message.answer("Введите название группы")
         return
     if message.text == GROUPS_MENU_BUTTONS[1]:
-        groups = list_groups(config.db_path, include_inactive=False)
+        groups = await list_groups(config.db_path, include_inactive=False)
         if not groups:
             await message.answer("Активных групп нет", reply_markup=groups_menu_keyboard())
             return
@@ -4755,8 +4871,8 @@ async def handle_groups_menu_choice(message: Message, config: Config, state: FSM
 
 
 @router.message(GroupStates.create_name)
-async def handle_group_create_name(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_group_create_name(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if not message.text or message.text.strip() == "":
@@ -4768,8 +4884,8 @@ async def handle_group_create_name(message: Message, config: Config, state: FSMC
 
 
 @router.message(GroupStates.create_capacity)
-async def handle_group_create_capacity(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_group_create_capacity(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == SKIP_BUTTONS[0]:
@@ -4789,8 +4905,8 @@ async def handle_group_create_capacity(message: Message, config: Config, state:
 
 
 @router.message(GroupStates.create_room)
-async def handle_group_create_room(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_group_create_room(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == SKIP_BUTTONS[1]:
@@ -4803,12 +4919,12 @@ async def handle_group_create_room(message: Message, config: Config, state: FSMC
 
 
 @router.message(GroupStates.create_assign)
-async def handle_group_create_assign(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_group_create_assign(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == GROUP_CREATE_ASSIGN_BUTTONS[0]:
-        trainers = list_active_trainers(config.db_path)
+        trainers = await list_active_trainers(config.db_path)
         if not trainers:
             await message.answer("Активных тренеров нет", reply_markup=group_create_assign_keyboard())
             return
@@ -4838,8 +4954,8 @@ async def handle_group_create_assign(message: Message, config: Config, state: FS
 
 
 @router.message(GroupStates.create_assign_select)
-async def handle_group_create_assign_select(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_group_create_assign_select(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == GROUP_ASSIGN_TRAINER_BACK:
@@ -4854,7 +4970,7 @@ async def handle_group_create_assign_select(message: Message, config: Config, st
     if trainer_id is None:
         await message.answer("Выберите тренера из списка")
         return
-    trainer = get_trainer_by_id(config.db_path, trainer_id)
+    trainer = await get_trainer_by_id(config.db_path, trainer_id)
     if not trainer:
         await message.answer("Тренер не найден")
         return
@@ -4872,14 +4988,14 @@ async def handle_group_create_assign_select(message: Message, config: Config, st
 
 
 @router.message(GroupStates.create_trainer_name)
-async def handle_group_create_trainer_name(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_group_create_trainer_name(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if not message.text or message.text.strip() == "":
         await message.answer("Введите имя тренера")
         return
-    trainer_id = create_trainer(config.db_path, message.text.strip())
+    trainer_id = await create_trainer(config.db_path, message.text.strip())
     await state.update_data(group_trainer_id=trainer_id, group_trainer_name=message.text.strip())
     await state.set_state(GroupStates.create_confirm)
     data = await state.get_data()
@@ -4894,8 +5010,8 @@ async def handle_group_create_trainer_name(message: Message, config: Config, sta
 
 
 @router.message(GroupStates.create_confirm)
-async def handle_group_create_confirm(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_group_create_confirm(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == CONFIRM_BUTTONS[1]:
@@ -4906,7 +5022,7 @@ async def handle_group_create_confirm(message: Message, config: Config, state: F
         return
     data = await state.get_data()
     try:
-        create_group(
+        await create_group(
             config.db_path,
             name=str(data.get("group_name", "")).strip(),
             capacity=int(data.get("group_capacity", 0) or 0),
@@ -4923,8 +5039,8 @@ async def handle_group_create_confirm(message: Message, config: Config, state: F
 
 
 @router.message(GroupStates.list_select)
-async def handle_group_list_select(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_group_list_select(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == GROUPS_MENU_BUTTONS[0]:
@@ -4942,11 +5058,11 @@ async def handle_group_list_select(message: Message, config: Config, state: FSMC
 
 
 @router.message(GroupStates.card, F.text == GROUP_ACTION_BUTTONS[0])
-async def handle_group_assign_trainer_start(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_group_assign_trainer_start(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
-    trainers = list_active_trainers(config.db_path)
+    trainers = await list_active_trainers(config.db_path)
     if not trainers:
         await message.answer("Активных тренеров нет")
         data = await state.get_data()
@@ -4960,8 +5076,8 @@ async def handle_group_assign_trainer_start(message: Message, config: Config, st
 
 
 @router.message(GroupStates.card, F.text == GROUP_ACTION_BUTTONS[1])
-async def handle_group_create_trainer_assign(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_group_create_trainer_assign(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     await state.set_state(GroupStates.assign_trainer_name)
@@ -4969,20 +5085,20 @@ async def handle_group_create_trainer_assign(message: Message, config: Config, s
 
 
 @router.message(GroupStates.card, F.text == GROUP_ACTION_BUTTONS[2])
-async def handle_group_clear_trainer(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_group_clear_trainer(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     data = await state.get_data()
     group_id = data.get("group_id")
     if group_id:
-        clear_group_trainer(config.db_path, int(group_id))
+        await clear_group_trainer(config.db_path, int(group_id))
         await _show_group_card(message, config, state, int(group_id))
 
 
 @router.message(GroupStates.card, F.text == GROUP_ACTION_BUTTONS[3])
-async def handle_group_rename_start(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_group_rename_start(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     await state.set_state(GroupStates.rename)
@@ -4990,8 +5106,8 @@ async def handle_group_rename_start(message: Message, config: Config, state: FSM
 
 
 @router.message(GroupStates.card, F.text == GROUP_ACTION_BUTTONS[4])
-async def handle_group_schedule(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_group_schedule(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     data = await state.get_data()
@@ -5003,40 +5119,40 @@ async def handle_group_schedule(message: Message, config: Config, state: FSMCont
 
 
 @router.message(GroupStates.card, F.text == GROUP_ACTION_BUTTONS[5])
-async def handle_group_hide(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_group_hide(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     data = await state.get_data()
     group_id = data.get("group_id")
     if group_id:
-        set_group_active(config.db_path, int(group_id), False)
+        await set_group_active(config.db_path, int(group_id), False)
         await _show_group_card(message, config, state, int(group_id))
 
 
 @router.message(GroupStates.card, F.text == GROUP_ACTION_BUTTONS[6])
-async def handle_group_activate(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_group_activate(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     data = await state.get_data()
     group_id = data.get("group_id")
     if group_id:
-        set_group_active(config.db_path, int(group_id), True)
+        await set_group_active(config.db_path, int(group_id), True)
         await _show_group_card(message, config, state, int(group_id))
 
 
 @router.message(GroupStates.card, F.text == GROUP_ACTION_BUTTONS[7])
-async def handle_group_card_back(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_group_card_back(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     await _show_groups_menu(message, state)
 
 
 @router.message(GroupStates.assign_trainer_select)
-async def handle_group_assign_trainer_select(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_group_assign_trainer_select(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == GROUP_ASSIGN_TRAINER_BACK:
@@ -5060,15 +5176,15 @@ async def handle_group_assign_trainer_select(message: Message, config: Config, s
     if not group_id:
         await _show_groups_menu(message, state)
         return
-    success = set_group_trainer(config.db_path, int(group_id), trainer_id)
+    success = await set_group_trainer(config.db_path, int(group_id), trainer_id)
     if not success:
         await message.answer("Не удалось назначить тренера")
     await _show_group_card(message, config, state, int(group_id))
 
 
 @router.message(GroupStates.assign_trainer_name)
-async def handle_group_assign_trainer_name(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_group_assign_trainer_name(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if not message.text or message.text.strip() == "":
@@ -5079,14 +5195,14 @@ async def handle_group_assign_trainer_name(message: Message, config: Config, sta
     if not group_id:
         await _show_groups_menu(message, state)
         return
-    trainer_id = create_trainer(config.db_path, message.text.strip())
-    set_group_trainer(config.db_path, int(group_id), trainer_id)
+    trainer_id = await create_trainer(config.db_path, message.text.strip())
+    await set_group_trainer(config.db_path, int(group_id), trainer_id)
     await _show_group_card(message, config, state, int(group_id))
 
 
 @router.message(GroupStates.rename)
-async def handle_group_rename(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_group_rename(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if not message.text or message.text.strip() == "":
@@ -5097,7 +5213,7 @@ async def handle_group_rename(message: Message, config: Config, state: FSMContex
     if not group_id:
         await _show_groups_menu(message, state)
         return
-    rename_group(config.db_path, int(group_id), message.text.strip())
+    await rename_group(config.db_path, int(group_id), message.text.strip())
     await _show_group_card(message, config, state, int(group_id))
 
 
@@ -5110,8 +5226,8 @@ def _schedule_choice_label(slot: tuple) -> str:
 
 
 @router.message(ScheduleStates.menu)
-async def handle_schedule_menu(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_schedule_menu(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     data = await state.get_data()
@@ -5124,7 +5240,7 @@ async def handle_schedule_menu(message: Message, config: Config, state: FSMConte
         await message.answer("Выберите день", reply_markup=schedule_weekday_keyboard())
         return
     if message.text == SCHEDULE_MENU_BUTTONS[1]:
-        slots = list_schedule_for_group(config.db_path, int(group_id), include_inactive=True)
+        slots = await list_schedule_for_group(config.db_path, int(group_id), include_inactive=True)
         if not slots:
             await message.answer("Расписание пустое", reply_markup=schedule_menu_keyboard())
             return
@@ -5133,7 +5249,7 @@ async def handle_schedule_menu(message: Message, config: Config, state: FSMConte
         await message.answer("Выберите слот", reply_markup=schedule_slots_keyboard(labels))
         return
     if message.text == SCHEDULE_MENU_BUTTONS[2]:
-        slots = list_schedule_for_group(config.db_path, int(group_id), include_inactive=True)
+        slots = await list_schedule_for_group(config.db_path, int(group_id), include_inactive=True)
         if not slots:
             await message.answer("Расписание пустое", reply_markup=schedule_menu_keyboard())
             return
@@ -5148,8 +5264,8 @@ async def handle_schedule_menu(message: Message, config: Config, state: FSMConte
 
 
 @router.message(ScheduleStates.add_weekday)
-async def handle_schedule_add_weekday(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_schedule_add_weekday(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == SCHEDULE_WEEKDAY_BUTTONS[7]:
@@ -5167,8 +5283,8 @@ async def handle_schedule_add_weekday(message: Message, config: Config, state: F
 
 
 @router.message(ScheduleStates.add_time)
-async def handle_schedule_add_time(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_schedule_add_time(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == "↩️ Назад":
@@ -5188,8 +5304,8 @@ async def handle_schedule_add_time(message: Message, config: Config, state: FSMC
 
 
 @router.message(ScheduleStates.add_duration)
-async def handle_schedule_add_duration(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_schedule_add_duration(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == "↩️ Назад":
@@ -5214,8 +5330,8 @@ async def handle_schedule_add_duration(message: Message, config: Config, state:
 
 
 @router.message(ScheduleStates.add_room)
-async def handle_schedule_add_room(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_schedule_add_room(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == "↩️ Назад":
@@ -5234,8 +5350,8 @@ async def handle_schedule_add_room(message: Message, config: Config, state: FSMC
 
 
 @router.message(ScheduleStates.add_confirm)
-async def handle_schedule_add_confirm(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_schedule_add_confirm(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     data = await state.get_data()
@@ -5250,7 +5366,7 @@ async def handle_schedule_add_confirm(message: Message, config: Config, state: F
         await message.answer("Выберите действие", reply_markup=confirm_keyboard())
         return
     try:
-        add_schedule_slot(
+        await add_schedule_slot(
             config.db_path,
             int(group_id),
             int(data.get("schedule_weekday")),
@@ -5267,8 +5383,8 @@ async def handle_schedule_add_confirm(message: Message, config: Config, state: F
 
 
 @router.message(ScheduleStates.edit_select)
-async def handle_schedule_edit_select(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_schedule_edit_select(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == "↩️ Назад":
@@ -5281,7 +5397,7 @@ async def handle_schedule_edit_select(message: Message, config: Config, state: F
     if schedule_id is None:
         await message.answer("Выберите слот из списка")
         return
-    slot = get_schedule_by_id(config.db_path, schedule_id)
+    slot = await get_schedule_by_id(config.db_path, schedule_id)
     if not slot:
         await message.answer("Слот не найден")
         return
@@ -5297,8 +5413,8 @@ async def handle_schedule_edit_select(message: Message, config: Config, state: F
 
 
 @router.message(ScheduleStates.edit_menu)
-async def handle_schedule_edit_menu(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_schedule_edit_menu(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     data = await state.get_data()
@@ -5319,7 +5435,7 @@ async def handle_schedule_edit_menu(message: Message, config: Config, state: FSM
         schedule_id = data.get("schedule_id")
         if schedule_id:
             new_active = message.text == SCHEDULE_EDIT_BUTTONS[4]
-            toggle_schedule_slot(config.db_path, int(schedule_id), new_active)
+            await toggle_schedule_slot(config.db_path, int(schedule_id), new_active)
         if group_id:
             await _show_schedule_menu(message, config, state, int(group_id))
         return
@@ -5332,8 +5448,8 @@ async def handle_schedule_edit_menu(message: Message, config: Config, state: FSM
 
 
 @router.message(ScheduleStates.edit_time)
-async def handle_schedule_edit_time(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_schedule_edit_time(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == "↩️ Назад":
@@ -5350,7 +5466,7 @@ async def handle_schedule_edit_time(message: Message, config: Config, state: FSM
     schedule_id = data.get("schedule_id")
     if schedule_id:
         try:
-            update_schedule_slot(config.db_path, int(schedule_id), start_time=parsed)
+            await update_schedule_slot(config.db_path, int(schedule_id), start_time=parsed)
         except sqlite3.IntegrityError:
             await message.answer("Такой день/время уже добавлены")
     group_id = data.get("schedule_group_id")
@@ -5359,8 +5475,8 @@ async def handle_schedule_edit_time(message: Message, config: Config, state: FSM
 
 
 @router.message(ScheduleStates.edit_duration)
-async def handle_schedule_edit_duration(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_schedule_edit_duration(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == "↩️ Назад":
@@ -5385,15 +5501,15 @@ async def handle_schedule_edit_duration(message: Message, config: Config, state:
     data = await state.get_data()
     schedule_id = data.get("schedule_id")
     if schedule_id:
-        update_schedule_slot(config.db_path, int(schedule_id), duration_min=duration)
+        await update_schedule_slot(config.db_path, int(schedule_id), duration_min=duration)
     group_id = data.get("schedule_group_id")
     if group_id:
         await _show_schedule_menu(message, config, state, int(group_id))
 
 
 @router.message(ScheduleStates.edit_room)
-async def handle_schedule_edit_room(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_schedule_edit_room(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == "↩️ Назад":
@@ -5406,15 +5522,15 @@ async def handle_schedule_edit_room(message: Message, config: Config, state: FSM
     data = await state.get_data()
     schedule_id = data.get("schedule_id")
     if schedule_id:
-        update_schedule_slot(config.db_path, int(schedule_id), room_name=room_name if room_name else None)
+        await update_schedule_slot(config.db_path, int(schedule_id), room_name=room_name if room_name else None)
     group_id = data.get("schedule_group_id")
     if group_id:
         await _show_schedule_menu(message, config, state, int(group_id))
 
 
 @router.message(ScheduleStates.delete_select)
-async def handle_schedule_delete_select(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_schedule_delete_select(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     if message.text == "↩️ Назад":
@@ -5433,8 +5549,8 @@ async def handle_schedule_delete_select(message: Message, config: Config, state:
 
 
 @router.message(ScheduleStates.delete_confirm)
-async def handle_schedule_delete_confirm(message: Message, config: Config, state: FSMContext) -> None:
-    if not _has_access(message, config):
+async def handle_schedule_delete_confirm(message: Message, config: Config, state: FSMContext, role: Optional[str]) -> None:
+    if not _has_access(role):
         await _deny_and_menu(message, config, state)
         return
     data = await state.get_data()
@@ -5448,7 +5564,7 @@ async def handle_schedule_delete_confirm(message: Message, config: Config, state
         return
     schedule_id = data.get("schedule_id")
     if schedule_id:
-        delete_schedule_slot(config.db_path, int(schedule_id))
+        await delete_schedule_slot(config.db_path, int(schedule_id))
         await message.answer("Слот удалён ✅")
     if group_id:
         await _show_schedule_menu(message, config, state, int(group_id))
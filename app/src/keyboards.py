@@ -205,6 +205,13 @@ ATTENDANCE_STATUS_BUTTONS = [
     "Отмена",
 ]
 
+ATTENDANCE_BULK_BUTTON = "👥 Отметить всю группу"
+ATTENDANCE_BULK_BUTTONS = [
+    "💾 Сохранить",
+    "Отмена",
+]
+ATTENDANCE_BULK_MARKS = ("✅", "⬜️")
+
 PAYMENT_MENU_BUTTONS = [
     "➕ Принять оплату",
     "🕒 Закрыть отсрочку",
@@ -262,7 +269,7 @@ PASS_MENU_BUTTONS = [
 
 PASS_AFTER_SAVE_BUTTONS = [
     "💳 Принять оплату",
-    "↩️ В меню 🎫 Абонемент",
+    "💾 Выдать без оплаты",
 ]
 
 PASS_PAY_METHOD_BUTTONS = [
@@ -708,6 +715,22 @@ def attendance_status_keyboard() -> ReplyKeyboardMarkup:
     return ReplyKeyboardMarkup(keyboard=rows, resize_keyboard=True, one_time_keyboard=True)
 
 
+def attendance_clients_keyboard(labels: list[str]) -> ReplyKeyboardMarkup:
+    rows = [[KeyboardButton(text=ATTENDANCE_BULK_BUTTON)]]
+    rows.extend([KeyboardButton(text=label)] for label in labels)
+    rows.append([KeyboardButton(text="❌ Отмена")])
+    return ReplyKeyboardMarkup(keyboard=rows, resize_keyboard=True, one_time_keyboard=True)
+
+
+def attendance_roster_keyboard(labels: list[str], unchecked: set[str]) -> ReplyKeyboardMarkup:
+    rows = [[KeyboardButton(text=ATTENDANCE_BULK_BUTTONS[0])]]
+    for label in labels:
+        mark = ATTENDANCE_BULK_MARKS[1] if label in unchecked else ATTENDANCE_BULK_MARKS[0]
+        rows.append([KeyboardButton(text=f"{mark} {label}")])
+    rows.append([KeyboardButton(text=ATTENDANCE_BULK_BUTTONS[1])])
+    return ReplyKeyboardMarkup(keyboard=rows, resize_keyboard=True)
+
+
 def payment_menu_keyboard() -> ReplyKeyboardMarkup:
     rows = [
         [KeyboardButton(text=PAYMENT_MENU_BUTTONS[0])],
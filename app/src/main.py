@@ -1,27 +1,93 @@
 import asyncio
 import logging
+from typing import Optional
 
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
+from aiohttp import web
 
-from config import load_env
-from db import init_db
+from async_db import configure_executor, shutdown_executor
+from config import BOT_MODE_WEBHOOK, Config, load_env
+from db import init_db, load_active_admin_ids
+from db_pool import add_query_observer, close_all_pools, configure_pool, remove_query_observer
+from fsm_storage import SQLiteStorage
 from handlers import router
+from metrics import record_query, start_metrics_server
+from middlewares import AccessMiddleware, HandlerMetricsMiddleware
+from slow_queries import SlowQueryLog, configure_slow_query_log, get_slow_query_log
+from report_export import shutdown_report_workers
+from webhook import run_webhook
 
+logger = logging.getLogger(__name__)
+
+_metrics_runner: Optional[web.AppRunner] = None
 
-async def main() -> None:
-    logging.basicConfig(level=logging.INFO)
-    config = load_env()
 
+async def on_startup(bot: Bot, dispatcher: Dispatcher, config: Config) -> None:
+    global _metrics_runner
+    if config.metrics_port is not None:
+        add_query_observer(record_query)
+    if config.slow_query_ms > 0:
+        slow_log = SlowQueryLog(config.slow_query_ms, log_path=config.slow_query_log_path)
+        configure_slow_query_log(slow_log)
+        add_query_observer(slow_log)
+    configure_pool(config.db_path, size=config.db_pool_size)
+    configure_executor(config.db_pool_size)
     init_db(config.db_path)
+    load_active_admin_ids(config.db_path)
 
-    bot = Bot(token=config.bot_token)
-    dp = Dispatcher(storage=MemoryStorage())
+    if config.metrics_port is not None:
+        _metrics_runner = await start_metrics_server(config.metrics_host, config.metrics_port)
+
+    if config.bot_mode != BOT_MODE_WEBHOOK:
+        await bot.delete_webhook(drop_pending_updates=True)
+    elif config.webhook_url:
+        await bot.set_webhook(
+            config.webhook_url.rstrip("/") + config.webhook_path,
+            secret_token=config.webhook_secret,
+            allowed_updates=dispatcher.resolve_used_update_types(),
+        )
+        logger.info("Webhook registered at %s%s", config.webhook_url.rstrip("/"), config.webhook_path)
+
+
+async def on_shutdown() -> None:
+    # Registered after aiogram's own fsm.close hook, so pending FSM writes are
+    # already flushed when the pool closes.
+    global _metrics_runner
+    if _metrics_runner is not None:
+        await _metrics_runner.cleanup()
+        _metrics_runner = None
+    shutdown_report_workers()
+    shutdown_executor()
+    close_all_pools()
+    remove_query_observer(record_query)
+    slow_log = get_slow_query_log()
+    if slow_log is not None:
+        remove_query_observer(slow_log)
+    configure_slow_query_log(None)
+
+
+def build_dispatcher(config: Config) -> Dispatcher:
+    dp = Dispatcher(storage=SQLiteStorage(config.db_path, ttl=config.fsm_ttl_hours * 60 * 60))
     dp["config"] = config
+    dp.update.outer_middleware(AccessMiddleware())
+    if config.metrics_port is not None:
+        dp.message.middleware(HandlerMetricsMiddleware())
     dp.include_router(router)
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+    return dp
+
+
+async def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    config = load_env()
 
-    await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot)
+    bot = Bot(token=config.bot_token)
+    dp = build_dispatcher(config)
+    if config.bot_mode == BOT_MODE_WEBHOOK:
+        await run_webhook(dp, bot, config)
+    else:
+        await dp.start_polling(bot)
 
 
 if __name__ == "__main__":
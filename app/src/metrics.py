@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import threading
+from typing import Dict, List, Sequence, Tuple
+
+from aiohttp import web
+
+from db_pool import QueryStats
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str]) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Labels, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        label_names: Sequence[str],
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[Labels, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Labels, value: float) -> None:
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = [0] * (len(self.buckets) + 1) + [0.0]
+                self._series[labels] = series
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series_items = sorted((labels, list(series)) for labels, series in self._series.items())
+        bucket_names = self.label_names + ("le",)
+        for labels, series in series_items:
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{_format_labels(bucket_names, labels + (f'{bound:g}',))} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(bucket_names, labels + ('+Inf',))} {series[-2]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {series[-2]}")
+        return lines
+
+
+HANDLER_SECONDS = Histogram(
+    "bot_handler_duration_seconds", "Message handler latency by handler and FSM state.", ("handler", "state")
+)
+DB_QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds", "SQLite statement time including fetches, by calling function.", ("caller",)
+)
+DB_QUERY_ROWS = Counter("db_query_rows_total", "Rows fetched or changed by SQLite statements.", ("caller",))
+
+REGISTRY = (HANDLER_SECONDS, DB_QUERY_SECONDS, DB_QUERY_ROWS)
+
+
+def record_query(stats: QueryStats) -> None:
+    DB_QUERY_SECONDS.observe((stats.caller,), stats.seconds)
+    DB_QUERY_ROWS.inc((stats.caller,), stats.rows)
+
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+async def _handle_metrics(_request: web.Request) -> web.Response:
+    return web.Response(text=render_metrics(), content_type="text/plain", charset="utf-8")
+
+
+def create_metrics_app() -> web.Application:
+    app = web.Application()
+    app.router.add_get("/metrics", _handle_metrics)
+    return app
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    runner = web.AppRunner(create_metrics_app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from async_db import load_active_admin_ids
+from config import Config
+from db import cached_active_admin_ids
+from metrics import HANDLER_SECONDS
+
+ROLE_OWNER = "owner"
+ROLE_ADMIN = "admin"
+
+
+async def resolve_role(config: Config, tg_user_id: Optional[int]) -> Optional[str]:
+    if tg_user_id is None:
+        return None
+    if tg_user_id == config.owner_tg_user_id:
+        return ROLE_OWNER
+    admin_ids = cached_active_admin_ids(config.db_path)
+    if admin_ids is None:
+        admin_ids = await load_active_admin_ids(config.db_path)
+    return ROLE_ADMIN if tg_user_id in admin_ids else None
+
+
+class AccessMiddleware(BaseMiddleware):
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        data["role"] = await resolve_role(data["config"], user.id if user else None)
+        return await handler(event, data)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    # Registered as an inner middleware, so data already carries the matched
+    # handler and the FSM state the update arrived in.
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            handler_object = data.get("handler")
+            name = handler_object.callback.__name__ if handler_object is not None else "unknown"
+            HANDLER_SECONDS.observe((name, data.get("raw_state") or "none"), time.perf_counter() - started)
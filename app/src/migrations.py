@@ -0,0 +1,623 @@
+from __future__ import annotations
+
+import sqlite3
+from typing import Callable, List, Optional, Tuple
+
+from search_index import index_client_search
+
+REPORT_SOURCE_TABLES = ("clients", "groups", "expense_categories", "visits", "passes", "payments", "expenses")
+
+
+def _migration_1_baseline(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS groups (
+          group_id     INTEGER PRIMARY KEY AUTOINCREMENT,
+          name         TEXT NOT NULL,
+          trainer_name TEXT,
+          trainer_id   INTEGER,
+          capacity     INTEGER NOT NULL DEFAULT 0 CHECK (capacity >= 0),
+          room_name    TEXT,
+          is_active    INTEGER NOT NULL DEFAULT 1 CHECK (is_active IN (0,1))
+        );
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS trainers (
+          trainer_id   INTEGER PRIMARY KEY AUTOINCREMENT,
+          full_name    TEXT NOT NULL,
+          phone        TEXT,
+          tg_user_id   INTEGER,
+          tg_username  TEXT,
+          is_active    INTEGER NOT NULL DEFAULT 1 CHECK (is_active IN (0,1)),
+          created_at   TEXT NOT NULL DEFAULT (datetime('now'))
+        );
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_trainers_active ON trainers(is_active);")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_trainers_tg_user_id ON trainers(tg_user_id);")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schedule (
+          schedule_id  INTEGER PRIMARY KEY AUTOINCREMENT,
+          group_id     INTEGER NOT NULL REFERENCES groups(group_id) ON DELETE CASCADE,
+          day_of_week  INTEGER NOT NULL CHECK (day_of_week BETWEEN 1 AND 7),
+          time_hhmm    TEXT NOT NULL,
+          duration_min INTEGER NOT NULL CHECK (duration_min > 0),
+          room_name    TEXT,
+          valid_from   TEXT,
+          valid_to     TEXT,
+          is_active    INTEGER NOT NULL DEFAULT 1 CHECK (is_active IN (0,1)),
+          created_at   TEXT NOT NULL DEFAULT (datetime('now'))
+        );
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS ix_schedule_group_weekday
+          ON schedule(group_id, day_of_week);
+        """
+    )
+    conn.execute(
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_schedule_unique_slot
+          ON schedule(group_id, day_of_week, time_hhmm);
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS admins (
+          tg_user_id INTEGER UNIQUE,
+          name TEXT NOT NULL,
+          is_active INTEGER NOT NULL DEFAULT 1 CHECK (is_active IN (0,1)),
+          created_at TEXT NOT NULL DEFAULT (datetime('now'))
+        );
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS clients (
+          client_id    INTEGER PRIMARY KEY AUTOINCREMENT,
+          full_name    TEXT NOT NULL,
+          phone        TEXT NOT NULL,
+          tg_user_id   INTEGER,
+          tg_username  TEXT,
+          birth_date   TEXT,
+          comment      TEXT,
+          created_at   TEXT NOT NULL DEFAULT (datetime('now')),
+          status       TEXT NOT NULL DEFAULT 'active' CHECK (status IN ('active','inactive'))
+        );
+        """
+    )
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_clients_phone ON clients(phone);")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_clients_tg_user_id ON clients(tg_user_id);")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_clients_tg_username ON clients(tg_username);")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS client_groups (
+          client_id   INTEGER NOT NULL REFERENCES clients(client_id) ON DELETE CASCADE,
+          group_id    INTEGER NOT NULL REFERENCES groups(group_id) ON DELETE CASCADE,
+          status      TEXT NOT NULL DEFAULT 'active' CHECK (status IN ('active','inactive')),
+          since_date  TEXT NOT NULL DEFAULT (date('now')),
+          until_date  TEXT,
+          PRIMARY KEY (client_id, group_id)
+        );
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS visits (
+          visit_id     INTEGER PRIMARY KEY AUTOINCREMENT,
+          visit_date   TEXT NOT NULL,
+          group_id     INTEGER NOT NULL REFERENCES groups(group_id),
+          schedule_id  INTEGER REFERENCES schedule(schedule_id),
+          client_id    INTEGER NOT NULL REFERENCES clients(client_id),
+          status       TEXT NOT NULL CHECK (status IN ('booked','attended','noshow','cancelled')),
+          created_by   INTEGER,
+          created_at   TEXT NOT NULL DEFAULT (datetime('now')),
+          comment      TEXT
+        );
+        """
+    )
+    conn.execute(
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_visits_unique
+          ON visits(visit_date, group_id, schedule_id, client_id);
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_visits_date_group ON visits(visit_date, group_id);")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS passes (
+          pass_id     INTEGER PRIMARY KEY AUTOINCREMENT,
+          client_id   INTEGER NOT NULL REFERENCES clients(client_id) ON DELETE CASCADE,
+          group_id    INTEGER NOT NULL REFERENCES groups(group_id) ON DELETE CASCADE,
+          pass_type   TEXT NOT NULL DEFAULT 'monthly',
+          start_date  TEXT NOT NULL,
+          end_date    TEXT NOT NULL,
+          is_active   INTEGER NOT NULL DEFAULT 1 CHECK (is_active IN (0,1)),
+          price       INTEGER,
+          comment     TEXT,
+          created_at  TEXT NOT NULL DEFAULT (datetime('now'))
+        );
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS ix_passes_client_group
+          ON passes(client_id, group_id, is_active);
+        """
+    )
+    conn.execute(
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_passes_one_active_per_group
+          ON passes(client_id, group_id)
+          WHERE is_active = 1;
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS payments (
+          pay_id       INTEGER PRIMARY KEY AUTOINCREMENT,
+          pay_date     TEXT NOT NULL DEFAULT (date('now')),
+          client_id    INTEGER REFERENCES clients(client_id),
+          group_id     INTEGER REFERENCES groups(group_id),
+          pass_id      INTEGER REFERENCES passes(pass_id),
+          visit_id     INTEGER REFERENCES visits(visit_id),
+          amount       INTEGER NOT NULL CHECK (amount > 0),
+          method       TEXT NOT NULL CHECK (method IN ('cash','transfer','qr','defer')),
+          status       TEXT NOT NULL DEFAULT 'paid' CHECK (status IN ('paid','deferred','cancelled')),
+          purpose      TEXT NOT NULL CHECK (purpose IN ('pass','single','other')),
+          due_date     TEXT,
+          accepted_by  INTEGER,
+          comment      TEXT,
+          created_at   TEXT NOT NULL DEFAULT (datetime('now'))
+        );
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_payments_date ON payments(pay_date);")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_payments_client ON payments(client_id);")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_payments_group ON payments(group_id);")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_payments_visit ON payments(visit_id);")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_payments_status_due ON payments(status, due_date);")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS expense_categories (
+          category_id INTEGER PRIMARY KEY AUTOINCREMENT,
+          code        TEXT NOT NULL UNIQUE,
+          name        TEXT NOT NULL,
+          is_active   INTEGER NOT NULL DEFAULT 1 CHECK (is_active IN (0,1))
+        );
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_expense_categories_active ON expense_categories(is_active);")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS expenses (
+          expense_id   INTEGER PRIMARY KEY AUTOINCREMENT,
+          exp_date     TEXT NOT NULL DEFAULT (date('now')),
+          category_id  INTEGER NOT NULL REFERENCES expense_categories(category_id),
+          amount       INTEGER NOT NULL CHECK (amount > 0),
+          method       TEXT NOT NULL CHECK (method IN ('cash','transfer','qr')),
+          comment      TEXT,
+          created_by   INTEGER,
+          created_at   TEXT NOT NULL DEFAULT (datetime('now'))
+        );
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_expenses_date ON expenses(exp_date);")
+    _ensure_groups_trainer_column(conn)
+    _ensure_schedule_columns(conn)
+
+
+def _ensure_groups_trainer_column(conn: sqlite3.Connection) -> None:
+    cur = conn.execute("PRAGMA table_info(groups);")
+    columns = {row[1] for row in cur.fetchall()}
+    if "trainer_id" not in columns:
+        conn.execute("ALTER TABLE groups ADD COLUMN trainer_id INTEGER;")
+
+
+def _ensure_schedule_columns(conn: sqlite3.Connection) -> None:
+    cur = conn.execute("PRAGMA table_info(schedule);")
+    columns = {row[1] for row in cur.fetchall()}
+    if "room_name" not in columns:
+        conn.execute("ALTER TABLE schedule ADD COLUMN room_name TEXT;")
+    if "valid_from" not in columns:
+        conn.execute("ALTER TABLE schedule ADD COLUMN valid_from TEXT;")
+    if "valid_to" not in columns:
+        conn.execute("ALTER TABLE schedule ADD COLUMN valid_to TEXT;")
+    if "created_at" not in columns:
+        conn.execute(
+            "ALTER TABLE schedule ADD COLUMN created_at TEXT NOT NULL DEFAULT (datetime('now'));"
+        )
+
+
+def _migration_2_client_search(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS clients_search USING fts5(
+          name_folded,
+          tokenize = 'trigram'
+        );
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS client_search_keys (
+          client_id  INTEGER PRIMARY KEY REFERENCES clients(client_id) ON DELETE CASCADE,
+          name_key   TEXT NOT NULL,
+          phone_key  TEXT NOT NULL
+        );
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_client_search_keys_name ON client_search_keys(name_key);")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_client_search_keys_phone ON client_search_keys(phone_key);")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS search_words (
+          word_id     INTEGER PRIMARY KEY AUTOINCREMENT,
+          word        TEXT NOT NULL UNIQUE,
+          gram_count  INTEGER NOT NULL
+        );
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS search_word_ngrams (
+          gram     TEXT NOT NULL,
+          word_id  INTEGER NOT NULL REFERENCES search_words(word_id) ON DELETE CASCADE,
+          PRIMARY KEY (gram, word_id)
+        ) WITHOUT ROWID;
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS client_words (
+          word_id    INTEGER NOT NULL REFERENCES search_words(word_id) ON DELETE CASCADE,
+          client_id  INTEGER NOT NULL REFERENCES clients(client_id) ON DELETE CASCADE,
+          PRIMARY KEY (word_id, client_id)
+        ) WITHOUT ROWID;
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS client_phone_ngrams (
+          gram       TEXT NOT NULL,
+          client_id  INTEGER NOT NULL REFERENCES clients(client_id) ON DELETE CASCADE,
+          PRIMARY KEY (gram, client_id)
+        ) WITHOUT ROWID;
+        """
+    )
+    _backfill_clients_search(conn)
+
+
+def _backfill_clients_search(conn: sqlite3.Connection) -> None:
+    cur = conn.execute(
+        """
+        SELECT client_id, full_name, phone
+        FROM clients
+        WHERE client_id NOT IN (SELECT client_id FROM client_search_keys)
+        """
+    )
+    for client_id, full_name, phone in cur.fetchall():
+        index_client_search(conn, client_id, full_name, phone)
+
+
+def _migration_3_single_visit_uniqueness(conn: sqlite3.Connection) -> None:
+    # ux_visits_unique includes the nullable schedule_id, so rows without a
+    # schedule slot were never deduplicated. Collapse them onto the oldest
+    # row, keeping the latest status and repointing payments.
+    cur = conn.execute(
+        """
+        SELECT MIN(visit_id), MAX(visit_id), visit_date, group_id, client_id
+        FROM visits
+        WHERE schedule_id IS NULL
+        GROUP BY visit_date, group_id, client_id
+        HAVING COUNT(*) > 1
+        """
+    )
+    for keep_id, latest_id, visit_date, group_id, client_id in cur.fetchall():
+        conn.execute(
+            """
+            UPDATE visits
+            SET (status, created_by) = (SELECT status, created_by FROM visits WHERE visit_id = ?)
+            WHERE visit_id = ?
+            """,
+            (latest_id, keep_id),
+        )
+        conn.execute(
+            """
+            UPDATE payments
+            SET visit_id = ?
+            WHERE visit_id IN (
+              SELECT visit_id FROM visits
+              WHERE visit_date = ? AND group_id = ? AND client_id = ?
+                AND schedule_id IS NULL AND visit_id != ?
+            )
+            """,
+            (keep_id, visit_date, group_id, client_id, keep_id),
+        )
+        conn.execute(
+            """
+            DELETE FROM visits
+            WHERE visit_date = ? AND group_id = ? AND client_id = ?
+              AND schedule_id IS NULL AND visit_id != ?
+            """,
+            (visit_date, group_id, client_id, keep_id),
+        )
+    conn.execute(
+        """
+        CREATE UNIQUE INDEX ux_visits_single_unique
+          ON visits(visit_date, group_id, client_id)
+          WHERE schedule_id IS NULL;
+        """
+    )
+
+
+def _rollup_add_sql(
+    rollup: str, keys: List[Tuple[str, str, str]], condition: str, amount_column: Optional[str], row: str
+) -> str:
+    rollup_keys = [rollup_key for _, rollup_key, _ in keys]
+    values = ", ".join(f"{row}.{source_key}" for source_key, _, _ in keys)
+    amount_insert = f", {row}.{amount_column}" if amount_column else ""
+    amount_update = "amount = amount + excluded.amount, " if amount_column else ""
+    return f"""
+      INSERT INTO {rollup}({", ".join(rollup_keys)}{", amount" if amount_column else ""}, row_count)
+      SELECT {values}{amount_insert}, 1
+      WHERE {condition.format(row=row)}
+      ON CONFLICT({", ".join(rollup_keys)}) DO UPDATE SET {amount_update}row_count = row_count + 1;
+    """
+
+
+def _rollup_remove_sql(
+    rollup: str, keys: List[Tuple[str, str, str]], condition: str, amount_column: Optional[str], row: str
+) -> str:
+    match = " AND ".join(f"{rollup_key} = {row}.{source_key}" for source_key, rollup_key, _ in keys)
+    amount_update = f"amount = amount - {row}.{amount_column}, " if amount_column else ""
+    return f"""
+      UPDATE {rollup} SET {amount_update}row_count = row_count - 1
+      WHERE {match} AND {condition.format(row=row)};
+      DELETE FROM {rollup} WHERE {match} AND row_count = 0;
+    """
+
+
+def _fill_rollup(
+    conn: sqlite3.Connection,
+    source: str,
+    rollup: str,
+    keys: List[Tuple[str, str, str]],
+    condition: str,
+    amount_column: Optional[str],
+) -> None:
+    rollup_keys = [rollup_key for _, rollup_key, _ in keys]
+    key_list = ", ".join(source_key for source_key, _, _ in keys)
+    conn.execute(
+        f"""
+        INSERT INTO {rollup}({", ".join(rollup_keys)}{", amount" if amount_column else ""}, row_count)
+        SELECT {key_list}{f", SUM({amount_column})" if amount_column else ""}, COUNT(*)
+        FROM {source}
+        WHERE {condition.format(row=source)}
+        GROUP BY {key_list};
+        """
+    )
+
+
+def _create_daily_rollup(
+    conn: sqlite3.Connection,
+    source: str,
+    rollup: str,
+    keys: List[Tuple[str, str, str]],
+    condition: str,
+    amount_column: Optional[str] = None,
+) -> None:
+    # Triggers keep `rollup` equal to
+    # SELECT keys, SUM(amount), COUNT(*) FROM source WHERE condition GROUP BY keys.
+    rollup_keys = [rollup_key for _, rollup_key, _ in keys]
+    columns = ", ".join(f"{rollup_key} {sql_type} NOT NULL" for _, rollup_key, sql_type in keys)
+    amount_def = "amount INTEGER NOT NULL, " if amount_column else ""
+    conn.execute(
+        f"""
+        CREATE TABLE {rollup} (
+          {columns},
+          {amount_def}row_count INTEGER NOT NULL,
+          PRIMARY KEY ({", ".join(rollup_keys)})
+        ) WITHOUT ROWID;
+        """
+    )
+    add_new = _rollup_add_sql(rollup, keys, condition, amount_column, "NEW")
+    remove_old = _rollup_remove_sql(rollup, keys, condition, amount_column, "OLD")
+    conn.execute(f"CREATE TRIGGER tr_{rollup}_insert AFTER INSERT ON {source} BEGIN {add_new} END;")
+    conn.execute(f"CREATE TRIGGER tr_{rollup}_delete AFTER DELETE ON {source} BEGIN {remove_old} END;")
+    conn.execute(f"CREATE TRIGGER tr_{rollup}_update AFTER UPDATE ON {source} BEGIN {remove_old} {add_new} END;")
+    _fill_rollup(conn, source, rollup, keys, condition, amount_column)
+
+
+REVENUE_ROLLUP_KEYS = [("pay_date", "day", "TEXT"), ("method", "method", "TEXT"), ("purpose", "purpose", "TEXT")]
+REVENUE_ROLLUP_CONDITION = "{row}.status = 'paid'"
+
+
+def _migration_4_daily_rollups(conn: sqlite3.Connection) -> None:
+    _create_daily_rollup(
+        conn,
+        "payments",
+        "report_revenue_daily",
+        REVENUE_ROLLUP_KEYS,
+        REVENUE_ROLLUP_CONDITION,
+        amount_column="amount",
+    )
+    _create_daily_rollup(
+        conn,
+        "expenses",
+        "report_expense_daily",
+        [("exp_date", "day", "TEXT"), ("category_id", "category_id", "INTEGER"), ("method", "method", "TEXT")],
+        "1",
+        amount_column="amount",
+    )
+    _create_daily_rollup(
+        conn,
+        "visits",
+        "report_visit_daily",
+        [("visit_date", "day", "TEXT"), ("group_id", "group_id", "INTEGER"), ("status", "status", "TEXT")],
+        "1",
+    )
+
+
+def _migration_5_data_version(conn: sqlite3.Connection) -> None:
+    # A global counter bumped by every write to the tables reports read, so
+    # generated reports can be cached until the underlying data changes.
+    conn.execute(
+        """
+        CREATE TABLE data_version (
+          id       INTEGER PRIMARY KEY CHECK (id = 1),
+          version  INTEGER NOT NULL
+        );
+        """
+    )
+    conn.execute("INSERT INTO data_version(id, version) VALUES (1, 0);")
+    for table in REPORT_SOURCE_TABLES:
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            conn.execute(
+                f"""
+                CREATE TRIGGER tr_{table}_data_version_{event.lower()} AFTER {event} ON {table}
+                BEGIN
+                  UPDATE data_version SET version = version + 1 WHERE id = 1;
+                END;
+                """
+            )
+
+
+def _migration_6_report_files(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE report_files (
+          date_from     TEXT NOT NULL,
+          date_to       TEXT NOT NULL,
+          report_today  TEXT NOT NULL,
+          overdue_days  INTEGER NOT NULL,
+          data_version  INTEGER NOT NULL,
+          file_id       TEXT NOT NULL,
+          created_at    TEXT NOT NULL DEFAULT (datetime('now')),
+          PRIMARY KEY (date_from, date_to, report_today, overdue_days, data_version)
+        );
+        """
+    )
+
+
+def _migration_7_query_indexes(conn: sqlite3.Connection) -> None:
+    # Indexes are extended rather than added next to their prefixes, so the
+    # older narrower ones are dropped to keep write amplification flat.
+    conn.execute("DROP INDEX IF EXISTS ix_passes_client_group;")
+    conn.execute(
+        """
+        CREATE INDEX ix_passes_client_group_period
+          ON passes(client_id, group_id, is_active, start_date, end_date);
+        """
+    )
+    conn.execute("CREATE INDEX ix_passes_active_end ON passes(end_date) WHERE is_active = 1;")
+    conn.execute("DROP INDEX IF EXISTS ix_payments_visit;")
+    conn.execute("CREATE INDEX ix_payments_visit_purpose ON payments(visit_id, purpose, status);")
+    conn.execute("DROP INDEX IF EXISTS ix_visits_date_group;")
+    conn.execute("CREATE INDEX ix_visits_date_group_status ON visits(visit_date, group_id, status);")
+    conn.execute(
+        """
+        CREATE INDEX ix_client_groups_active
+          ON client_groups(group_id, client_id)
+          WHERE status = 'active';
+        """
+    )
+    conn.execute("CREATE INDEX ix_clients_tg_username_key ON clients(lower(ltrim(tg_username, '@')));")
+    conn.execute("CREATE INDEX ix_expenses_created_by ON expenses(created_by, created_at);")
+
+
+def _migration_8_payment_created_date(conn: sqlite3.Connection) -> None:
+    # date(created_at) cannot use an index, so the creation day is stored
+    # alongside the timestamp. The trigger fills it on every insert so no
+    # payment drops out of the deferral reports.
+    conn.execute("ALTER TABLE payments ADD COLUMN created_date TEXT;")
+    conn.execute("UPDATE payments SET created_date = date(created_at);")
+    conn.execute(
+        """
+        CREATE TRIGGER tr_payments_created_date AFTER INSERT ON payments
+        WHEN NEW.created_date IS NULL
+        BEGIN
+          UPDATE payments SET created_date = date(NEW.created_at) WHERE pay_id = NEW.pay_id;
+        END;
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX ix_payments_open_deferrals
+          ON payments(created_date)
+          WHERE status = 'deferred' AND method = 'defer';
+        """
+    )
+
+
+def _migration_9_fsm_states(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE fsm_states (
+          storage_key  TEXT PRIMARY KEY,
+          state        TEXT,
+          data         BLOB,
+          updated_at   REAL NOT NULL
+        ) WITHOUT ROWID;
+        """
+    )
+    conn.execute("CREATE INDEX ix_fsm_states_updated ON fsm_states(updated_at);")
+
+
+def _migration_10_revenue_rollup_update_columns(conn: sqlite3.Connection) -> None:
+    # tr_payments_created_date fills created_date with an UPDATE that runs
+    # before the rollup insert trigger, so a rollup update trigger on every
+    # column counted the new payment twice. It now watches only the columns
+    # the rollup reads, and the rollup is rebuilt once.
+    add = _rollup_add_sql("report_revenue_daily", REVENUE_ROLLUP_KEYS, REVENUE_ROLLUP_CONDITION, "amount", "NEW")
+    remove = _rollup_remove_sql("report_revenue_daily", REVENUE_ROLLUP_KEYS, REVENUE_ROLLUP_CONDITION, "amount", "OLD")
+    conn.execute("DROP TRIGGER tr_report_revenue_daily_update;")
+    conn.execute(
+        "CREATE TRIGGER tr_report_revenue_daily_update "
+        "AFTER UPDATE OF pay_date, method, purpose, status, amount ON payments "
+        f"BEGIN {remove} {add} END;"
+    )
+    conn.execute("DELETE FROM report_revenue_daily;")
+    _fill_rollup(conn, "payments", "report_revenue_daily", REVENUE_ROLLUP_KEYS, REVENUE_ROLLUP_CONDITION, "amount")
+
+
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Connection], None]]] = [
+    (1, "baseline schema", _migration_1_baseline),
+    (2, "client search indexes", _migration_2_client_search),
+    (3, "unique single visits", _migration_3_single_visit_uniqueness),
+    (4, "daily report rollups", _migration_4_daily_rollups),
+    (5, "report data version", _migration_5_data_version),
+    (6, "uploaded report files", _migration_6_report_files),
+    (7, "query plan indexes", _migration_7_query_indexes),
+    (8, "payment created date", _migration_8_payment_created_date),
+    (9, "persistent fsm states", _migration_9_fsm_states),
+    (10, "revenue rollup update columns", _migration_10_revenue_rollup_update_columns),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    return int(conn.execute("PRAGMA user_version;").fetchone()[0])
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    current = get_schema_version(conn)
+    if current >= LATEST_VERSION:
+        return current
+    for version, _description, step in MIGRATIONS:
+        if version <= current:
+            continue
+        conn.execute("BEGIN IMMEDIATE;")
+        try:
+            step(conn)
+            conn.execute(f"PRAGMA user_version = {version};")
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+        current = version
+    return current
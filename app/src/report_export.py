@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from aiogram.types import BufferedInputFile, Message
+
+from async_db import get_data_version, get_report_file_id, save_report_file_id
+from reporting import build_excel_report
+
+DEFAULT_REPORT_WORKERS = 1
+REPORT_CACHE_SIZE = 16
+
+ReportKey = Tuple[str, str, str, str, int, int]
+
+_executor: Optional[ThreadPoolExecutor] = None
+_workers = DEFAULT_REPORT_WORKERS
+_cache: "OrderedDict[ReportKey, bytes]" = OrderedDict()
+_inflight: Dict[ReportKey, "asyncio.Future[bytes]"] = {}
+
+
+def configure_report_workers(max_workers: int) -> None:
+    global _executor, _workers
+    if max_workers < 1:
+        raise ValueError("Report worker count must be positive")
+    previous = _executor
+    _workers = max_workers
+    _executor = None
+    if previous is not None:
+        previous.shutdown(wait=False)
+
+
+def shutdown_report_workers(wait: bool = True) -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=wait)
+        _executor = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=_workers, thread_name_prefix="report")
+    return _executor
+
+
+def clear_report_cache() -> None:
+    _cache.clear()
+
+
+def _remember(key: ReportKey, data: bytes) -> None:
+    _cache[key] = data
+    _cache.move_to_end(key)
+    while len(_cache) > REPORT_CACHE_SIZE:
+        _cache.popitem(last=False)
+
+
+async def get_excel_report(
+    db_path: str,
+    date_from: str,
+    date_to: str,
+    today: str,
+    overdue_days: int,
+    on_miss: Optional[Callable[[], Awaitable[object]]] = None,
+) -> bytes:
+    version = await get_data_version(db_path)
+    return await _get_excel_report_bytes(db_path, date_from, date_to, today, overdue_days, version, on_miss)
+
+
+async def _get_excel_report_bytes(
+    db_path: str,
+    date_from: str,
+    date_to: str,
+    today: str,
+    overdue_days: int,
+    version: int,
+    on_miss: Optional[Callable[[], Awaitable[object]]],
+) -> bytes:
+    key = (db_path, date_from, date_to, today, overdue_days, version)
+    cached = _cache.get(key)
+    if cached is not None:
+        _cache.move_to_end(key)
+        return cached
+
+    pending = _inflight.get(key)
+    if pending is None:
+        loop = asyncio.get_running_loop()
+        pending = loop.run_in_executor(
+            _get_executor(), build_excel_report, db_path, date_from, date_to, today, overdue_days
+        )
+        _inflight[key] = pending
+        pending.add_done_callback(lambda _future: _inflight.pop(key, None))
+    if on_miss is not None:
+        await on_miss()
+    data = await asyncio.shield(pending)
+    _remember(key, data)
+    return data
+
+
+async def send_excel_report(
+    message: Message,
+    db_path: str,
+    date_from: str,
+    date_to: str,
+    today: str,
+    overdue_days: int,
+    filename: str,
+    caption: str,
+    extra_recipients: Tuple[int, ...] = (),
+    reply_markup: Any = None,
+    on_miss: Optional[Callable[[], Awaitable[object]]] = None,
+) -> str:
+    version = await get_data_version(db_path)
+    file_id = await get_report_file_id(db_path, date_from, date_to, today, overdue_days, version)
+    if file_id is None:
+        data = await _get_excel_report_bytes(db_path, date_from, date_to, today, overdue_days, version, on_miss)
+        sent = await message.answer_document(
+            BufferedInputFile(data, filename=filename), caption=caption, reply_markup=reply_markup
+        )
+        file_id = sent.document.file_id
+        await save_report_file_id(db_path, date_from, date_to, today, overdue_days, version, file_id)
+    else:
+        await message.answer_document(file_id, caption=caption, reply_markup=reply_markup)
+    for chat_id in extra_recipients:
+        await message.bot.send_document(chat_id, file_id, caption=caption)
+    return file_id
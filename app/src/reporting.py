@@ -1,14 +1,18 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from io import BytesIO
 import sqlite3
-from typing import Iterable, List, Optional, Tuple
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from io import BytesIO
+from typing import Collection, Iterable, List, Optional, Sequence, Tuple
 
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font
 from openpyxl.utils import get_column_letter
 
+from db_pool import connection
+
 
 @dataclass(frozen=True)
 class RevenueSummary:
@@ -37,44 +41,50 @@ class AttendanceSummary:
     cancelled: int
 
 
+SNAPSHOT_PARTS = ("revenue", "expenses", "attendance", "singles", "defers")
+
+
+@dataclass(frozen=True)
+class ReportSnapshot:
+    # Parts that were not requested are left empty.
+    date_from: str
+    date_to: str
+    today: str
+    overdue_days: int
+    revenue: Optional[RevenueSummary] = None
+    expenses: Optional[ExpenseSummary] = None
+    attendance: Optional[AttendanceSummary] = None
+    single_visits: int = 0
+    unpaid_single_count: int = 0
+    unpaid_single_visits: List[Tuple[str, str, str, str]] = field(default_factory=list)
+    deferred_count: int = 0
+    deferred_amount: int = 0
+    deferred: List[Tuple[int, str, str, str, int, str, Optional[str]]] = field(default_factory=list)
+    overdue: List[Tuple[int, str, str, str, int, str, Optional[str]]] = field(default_factory=list)
+
+
 def _int_or_zero(value: Optional[int]) -> int:
     return int(value or 0)
 
 
 def get_revenue_summary(db_path: str, date_from: str, date_to: str) -> RevenueSummary:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         cur = conn.execute(
             """
-            SELECT
-              COALESCE(SUM(amount), 0) AS total_amount,
-              COUNT(*) AS total_count
-            FROM payments
-            WHERE status = 'paid'
-              AND method IN ('cash','transfer','qr')
-              AND pay_date BETWEEN ? AND ?
-            """,
-            (date_from, date_to),
-        )
-        row = cur.fetchone() or (0, 0)
-        total_amount = _int_or_zero(row[0])
-        total_count = _int_or_zero(row[1])
-
-        cur = conn.execute(
-            """
-            SELECT method, COALESCE(SUM(amount), 0) AS total_amount
-            FROM payments
-            WHERE status = 'paid'
-              AND method IN ('cash','transfer','qr')
-              AND pay_date BETWEEN ? AND ?
+            SELECT method, SUM(amount) AS total_amount, SUM(row_count) AS total_count
+            FROM report_revenue_daily
+            WHERE method IN ('cash','transfer','qr')
+              AND day BETWEEN ? AND ?
             GROUP BY method
             """,
             (date_from, date_to),
         )
-        by_method = {row[0]: _int_or_zero(row[1]) for row in cur.fetchall()}
+        rows = cur.fetchall()
+    by_method = {row[0]: _int_or_zero(row[1]) for row in rows}
 
     return RevenueSummary(
-        total=total_amount,
-        count=total_count,
+        total=sum(by_method.values()),
+        count=sum(_int_or_zero(row[2]) for row in rows),
         cash=by_method.get("cash", 0),
         transfer=by_method.get("transfer", 0),
         qr=by_method.get("qr", 0),
@@ -84,47 +94,39 @@ def get_revenue_summary(db_path: str, date_from: str, date_to: str) -> RevenueSu
 def list_paid_payments(
     db_path: str, date_from: str, date_to: str
 ) -> List[Tuple[str, str, str, str, int, str]]:
-    with sqlite3.connect(db_path) as conn:
-        cur = conn.execute(
-            """
-            SELECT
-              p.pay_date,
-              COALESCE(c.full_name, '—') AS client_name,
-              COALESCE(g.name, '—') AS group_name,
-              p.purpose,
-              p.amount,
-              p.method
-            FROM payments p
-            LEFT JOIN clients c ON c.client_id = p.client_id
-            LEFT JOIN groups g ON g.group_id = p.group_id
-            WHERE p.status = 'paid'
-              AND p.method IN ('cash','transfer','qr')
-              AND p.pay_date BETWEEN ? AND ?
-            ORDER BY p.pay_date DESC, p.pay_id DESC
-            """,
-            (date_from, date_to),
-        )
-        return cur.fetchall()
+    with connection(db_path) as conn:
+        return _paid_payments_cursor(conn, date_from, date_to).fetchall()
+
+
+def _paid_payments_cursor(conn: sqlite3.Connection, date_from: str, date_to: str) -> sqlite3.Cursor:
+    return conn.execute(
+        """
+        SELECT
+          p.pay_date,
+          COALESCE(c.full_name, '—') AS client_name,
+          COALESCE(g.name, '—') AS group_name,
+          p.purpose,
+          p.amount,
+          p.method
+        FROM payments p
+        LEFT JOIN clients c ON c.client_id = p.client_id
+        LEFT JOIN groups g ON g.group_id = p.group_id
+        WHERE p.status = 'paid'
+          AND p.method IN ('cash','transfer','qr')
+          AND p.pay_date BETWEEN ? AND ?
+        ORDER BY p.pay_date DESC, p.pay_id DESC
+        """,
+        (date_from, date_to),
+    )
 
 
 def get_expense_summary(db_path: str, date_from: str, date_to: str) -> ExpenseSummary:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         cur = conn.execute(
             """
-            SELECT
-              COALESCE(SUM(amount), 0) AS total_amount
-            FROM expenses
-            WHERE exp_date BETWEEN ? AND ?
-            """,
-            (date_from, date_to),
-        )
-        total_amount = _int_or_zero(cur.fetchone()[0])
-
-        cur = conn.execute(
-            """
-            SELECT method, COALESCE(SUM(amount), 0) AS total_amount
-            FROM expenses
-            WHERE exp_date BETWEEN ? AND ?
+            SELECT method, SUM(amount) AS total_amount
+            FROM report_expense_daily
+            WHERE day BETWEEN ? AND ?
             GROUP BY method
             """,
             (date_from, date_to),
@@ -133,10 +135,10 @@ def get_expense_summary(db_path: str, date_from: str, date_to: str) -> ExpenseSu
 
         cur = conn.execute(
             """
-            SELECT c.name, COALESCE(SUM(e.amount), 0) AS total_amount
-            FROM expenses e
+            SELECT c.name, SUM(e.amount) AS total_amount
+            FROM report_expense_daily e
             JOIN expense_categories c ON c.category_id = e.category_id
-            WHERE e.exp_date BETWEEN ? AND ?
+            WHERE e.day BETWEEN ? AND ?
             GROUP BY c.name
             ORDER BY total_amount DESC
             """,
@@ -144,6 +146,8 @@ def get_expense_summary(db_path: str, date_from: str, date_to: str) -> ExpenseSu
         )
         categories = [(row[0], _int_or_zero(row[1])) for row in cur.fetchall()]
 
+    total_amount = sum(by_method.values())
+
     top = categories[:5]
     other_amount = sum(amount for _, amount in categories[5:])
     return ExpenseSummary(
@@ -159,32 +163,35 @@ def get_expense_summary(db_path: str, date_from: str, date_to: str) -> ExpenseSu
 def list_expenses_for_period(
     db_path: str, date_from: str, date_to: str
 ) -> List[Tuple[str, str, int, str, Optional[str]]]:
-    with sqlite3.connect(db_path) as conn:
-        cur = conn.execute(
-            """
-            SELECT
-              e.exp_date,
-              c.name,
-              e.amount,
-              e.method,
-              e.comment
-            FROM expenses e
-            JOIN expense_categories c ON c.category_id = e.category_id
-            WHERE e.exp_date BETWEEN ? AND ?
-            ORDER BY e.exp_date DESC, e.expense_id DESC
-            """,
-            (date_from, date_to),
-        )
-        return cur.fetchall()
+    with connection(db_path) as conn:
+        return _expenses_cursor(conn, date_from, date_to).fetchall()
+
+
+def _expenses_cursor(conn: sqlite3.Connection, date_from: str, date_to: str) -> sqlite3.Cursor:
+    return conn.execute(
+        """
+        SELECT
+          e.exp_date,
+          c.name,
+          e.amount,
+          e.method,
+          e.comment
+        FROM expenses e
+        JOIN expense_categories c ON c.category_id = e.category_id
+        WHERE e.exp_date BETWEEN ? AND ?
+        ORDER BY e.exp_date DESC, e.expense_id DESC
+        """,
+        (date_from, date_to),
+    )
 
 
 def get_attendance_summary(db_path: str, date_from: str, date_to: str) -> AttendanceSummary:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         cur = conn.execute(
             """
-            SELECT status, COUNT(*) AS total_count
-            FROM visits
-            WHERE visit_date BETWEEN ? AND ?
+            SELECT status, SUM(row_count) AS total_count
+            FROM report_visit_daily
+            WHERE day BETWEEN ? AND ?
             GROUP BY status
             """,
             (date_from, date_to),
@@ -201,7 +208,7 @@ def get_attendance_summary(db_path: str, date_from: str, date_to: str) -> Attend
 def list_attended_today_by_group(
     db_path: str, group_id: int, visit_date: str
 ) -> List[Tuple[str, str]]:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         cur = conn.execute(
             """
             SELECT c.full_name, c.phone
@@ -220,7 +227,7 @@ def list_attended_today_by_group(
 def list_active_passes_today(
     db_path: str, today: str
 ) -> List[Tuple[str, str, str, str]]:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         cur = conn.execute(
             """
             SELECT c.full_name, g.name, p.start_date, p.end_date
@@ -240,7 +247,7 @@ def list_active_passes_today(
 def list_passes_expiring(
     db_path: str, date_from: str, date_to: str
 ) -> List[Tuple[str, str, str]]:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         cur = conn.execute(
             """
             SELECT c.full_name, g.name, p.end_date
@@ -259,7 +266,7 @@ def list_passes_expiring(
 def list_clients_without_active_pass(
     db_path: str, today: str
 ) -> List[Tuple[str, str]]:
-    with sqlite3.connect(db_path) as conn:
+    with connection(db_path) as conn:
         cur = conn.execute(
             """
             SELECT c.full_name, g.name
@@ -285,212 +292,191 @@ def list_clients_without_active_pass(
         return cur.fetchall()
 
 
-def count_single_visits(
-    db_path: str, date_from: str, date_to: str
-) -> int:
-    with sqlite3.connect(db_path) as conn:
-        cur = conn.execute(
-            """
-            SELECT COUNT(*)
-            FROM visits v
-            WHERE v.visit_date BETWEEN ? AND ?
-              AND v.status IN ('booked','attended')
-              AND NOT EXISTS (
-                SELECT 1
-                FROM passes p
-                WHERE p.client_id = v.client_id
-                  AND p.group_id = v.group_id
-                  AND p.is_active = 1
-                  AND p.start_date <= v.visit_date
-                  AND p.end_date >= v.visit_date
-              )
-            """,
-            (date_from, date_to),
-        )
-        return _int_or_zero(cur.fetchone()[0])
+_SINGLE_VISITS_WHERE = """
+    v.visit_date BETWEEN ? AND ?
+    AND v.status IN ('booked','attended')
+    AND NOT EXISTS (
+      SELECT 1
+      FROM passes p
+      WHERE p.client_id = v.client_id
+        AND p.group_id = v.group_id
+        AND p.is_active = 1
+        AND p.start_date <= v.visit_date
+        AND p.end_date >= v.visit_date
+    )
+"""
+
+_SINGLE_VISIT_PAID = """
+    EXISTS (
+      SELECT 1
+      FROM payments pay
+      WHERE pay.visit_id = v.visit_id
+        AND pay.purpose = 'single'
+        AND pay.status != 'cancelled'
+    )
+"""
 
 
-def list_single_visits_without_payment(
-    db_path: str, date_from: str, date_to: str, limit: Optional[int] = None
-) -> List[Tuple[str, str, str, str]]:
-    limit_clause = ""
-    params: list = [date_from, date_to]
-    if limit is not None:
-        limit_clause = "LIMIT ?"
-        params.append(limit)
-    with sqlite3.connect(db_path) as conn:
-        cur = conn.execute(
-            f"""
-            SELECT v.visit_date, c.full_name, g.name, v.status
-            FROM visits v
-            JOIN clients c ON c.client_id = v.client_id
-            JOIN groups g ON g.group_id = v.group_id
-            WHERE v.visit_date BETWEEN ? AND ?
-              AND v.status IN ('booked','attended')
-              AND NOT EXISTS (
-                SELECT 1
-                FROM passes p
-                WHERE p.client_id = v.client_id
-                  AND p.group_id = v.group_id
-                  AND p.is_active = 1
-                  AND p.start_date <= v.visit_date
-                  AND p.end_date >= v.visit_date
-              )
-              AND NOT EXISTS (
-                SELECT 1
-                FROM payments pay
-                WHERE pay.visit_id = v.visit_id
-                  AND pay.purpose = 'single'
-                  AND pay.status != 'cancelled'
-              )
-            ORDER BY v.visit_date DESC, v.visit_id DESC
-            {limit_clause}
-            """,
-            tuple(params),
-        )
-        return cur.fetchall()
+def _count_single_visits(conn: sqlite3.Connection, date_from: str, date_to: str) -> Tuple[int, int]:
+    cur = conn.execute(
+        f"""
+        SELECT COUNT(*), SUM(NOT {_SINGLE_VISIT_PAID})
+        FROM visits v
+        WHERE {_SINGLE_VISITS_WHERE}
+        """,
+        (date_from, date_to),
+    )
+    total, unpaid = cur.fetchone()
+    return int(total), _int_or_zero(unpaid)
 
 
-def count_single_visits_without_payment(db_path: str, date_from: str, date_to: str) -> int:
-    with sqlite3.connect(db_path) as conn:
-        cur = conn.execute(
-            """
-            SELECT COUNT(*)
-            FROM visits v
-            WHERE v.visit_date BETWEEN ? AND ?
-              AND v.status IN ('booked','attended')
-              AND NOT EXISTS (
-                SELECT 1
-                FROM passes p
-                WHERE p.client_id = v.client_id
-                  AND p.group_id = v.group_id
-                  AND p.is_active = 1
-                  AND p.start_date <= v.visit_date
-                  AND p.end_date >= v.visit_date
-              )
-              AND NOT EXISTS (
-                SELECT 1
-                FROM payments pay
-                WHERE pay.visit_id = v.visit_id
-                  AND pay.purpose = 'single'
-                  AND pay.status != 'cancelled'
-              )
-            """,
-            (date_from, date_to),
-        )
-        return _int_or_zero(cur.fetchone()[0])
+def _list_unpaid_single_visits(
+    conn: sqlite3.Connection, date_from: str, date_to: str, limit: int
+) -> List[Tuple[str, str, str, str]]:
+    cur = conn.execute(
+        f"""
+        SELECT v.visit_date, c.full_name, g.name, v.status
+        FROM visits v
+        JOIN clients c ON c.client_id = v.client_id
+        JOIN groups g ON g.group_id = v.group_id
+        WHERE {_SINGLE_VISITS_WHERE}
+          AND NOT {_SINGLE_VISIT_PAID}
+        ORDER BY v.visit_date DESC, v.visit_id DESC
+        LIMIT ?
+        """,
+        (date_from, date_to, limit),
+    )
+    return cur.fetchall()
+
+
+# Without statistics the planner prefers ix_payments_status_due and sorts in a
+# temp b-tree, so open-deferral queries name the partial index explicitly.
+_OPEN_DEFERRALS_WHERE = """
+    p.status = 'deferred'
+    AND p.method = 'defer'
+    AND p.created_date BETWEEN ? AND ?
+"""
+
+
+def _count_open_deferrals(conn: sqlite3.Connection, created_from: str, created_to: str) -> Tuple[int, int]:
+    cur = conn.execute(
+        f"""
+        SELECT COUNT(*), SUM(p.amount)
+        FROM payments p INDEXED BY ix_payments_open_deferrals
+        WHERE {_OPEN_DEFERRALS_WHERE}
+        """,
+        (created_from, created_to),
+    )
+    count, amount = cur.fetchone()
+    return int(count), _int_or_zero(amount)
+
+
+def _list_open_deferrals(
+    conn: sqlite3.Connection,
+    created_from: Optional[str],
+    created_to: str,
+    newest_first: bool,
+    limit: Optional[int] = None,
+) -> List[Tuple[int, str, str, str, int, str, Optional[str]]]:
+    return _open_deferrals_cursor(conn, created_from, created_to, newest_first, limit).fetchall()
+
+
+def _overdue_before(today: str, overdue_days: int) -> str:
+    return (date.fromisoformat(today) - timedelta(days=overdue_days)).isoformat()
+
+
+def _open_deferrals_cursor(
+    conn: sqlite3.Connection,
+    created_from: Optional[str],
+    created_to: str,
+    newest_first: bool,
+    limit: Optional[int] = None,
+) -> sqlite3.Cursor:
+    order = "DESC" if newest_first else "ASC"
+    return conn.execute(
+        f"""
+        SELECT p.pay_id,
+               p.created_date,
+               COALESCE(c.full_name, '—') AS client_name,
+               COALESCE(g.name, '—') AS group_name,
+               p.amount,
+               p.purpose,
+               p.due_date
+        FROM payments p INDEXED BY ix_payments_open_deferrals
+        LEFT JOIN clients c ON c.client_id = p.client_id
+        LEFT JOIN groups g ON g.group_id = p.group_id
+        WHERE {_OPEN_DEFERRALS_WHERE}
+        ORDER BY p.created_date {order}, p.pay_id {order}
+        LIMIT ?
+        """,
+        (created_from or "", created_to, -1 if limit is None else limit),
+    )
 
 
-def get_deferred_summary(
+def get_report_snapshot(
     db_path: str,
     date_from: str,
     date_to: str,
     today: str,
     overdue_days: int,
-) -> Tuple[int, int, List[Tuple[int, str, str, int, str, Optional[str]]], List[Tuple[int, str, str, int, str]]]:
-    with sqlite3.connect(db_path) as conn:
-        cur = conn.execute(
-            """
-            SELECT COUNT(*), COALESCE(SUM(amount), 0)
-            FROM payments
-            WHERE status = 'deferred'
-              AND method = 'defer'
-              AND date(created_at) BETWEEN ? AND ?
-            """,
-            (date_from, date_to),
-        )
-        total_count, total_amount = cur.fetchone() or (0, 0)
-
-        cur = conn.execute(
-            """
-            SELECT p.pay_id, COALESCE(c.full_name, '—') AS client_name,
-                   COALESCE(g.name, '—') AS group_name, p.amount,
-                   date(p.created_at) AS created_date,
-                   p.due_date
-            FROM payments p
-            LEFT JOIN clients c ON c.client_id = p.client_id
-            LEFT JOIN groups g ON g.group_id = p.group_id
-            WHERE p.status = 'deferred'
-              AND p.method = 'defer'
-              AND date(p.created_at) BETWEEN ? AND ?
-            ORDER BY p.created_at DESC, p.pay_id DESC
-            LIMIT 10
-            """,
-            (date_from, date_to),
-        )
-        latest = cur.fetchall()
-
-        cur = conn.execute(
-            """
-            SELECT p.pay_id, COALESCE(c.full_name, '—') AS client_name,
-                   COALESCE(g.name, '—') AS group_name, p.amount,
-                   date(p.created_at) AS created_date
-            FROM payments p
-            LEFT JOIN clients c ON c.client_id = p.client_id
-            LEFT JOIN groups g ON g.group_id = p.group_id
-            WHERE p.status = 'deferred'
-              AND p.method = 'defer'
-              AND date(p.created_at) <= date(?, ?)
-            ORDER BY p.created_at ASC, p.pay_id ASC
-            """,
-            (today, f"-{overdue_days} days"),
-        )
-        overdue = cur.fetchall()
-
-    return (
-        _int_or_zero(total_count),
-        _int_or_zero(total_amount),
-        latest,
-        overdue,
+    parts: Collection[str] = SNAPSHOT_PARTS,
+    unpaid_limit: int = 20,
+    deferred_limit: int = 10,
+) -> ReportSnapshot:
+    unknown = set(parts) - set(SNAPSHOT_PARTS)
+    if unknown:
+        raise ValueError(f"Unknown report parts: {sorted(unknown)}")
+    values = {}
+    with connection(db_path) as conn:
+        if not conn.in_transaction:
+            conn.execute("BEGIN;")
+        if "revenue" in parts:
+            values["revenue"] = get_revenue_summary(db_path, date_from, date_to)
+        if "expenses" in parts:
+            values["expenses"] = get_expense_summary(db_path, date_from, date_to)
+        if "attendance" in parts:
+            values["attendance"] = get_attendance_summary(db_path, date_from, date_to)
+        if "singles" in parts:
+            values["single_visits"], values["unpaid_single_count"] = _count_single_visits(conn, date_from, date_to)
+            values["unpaid_single_visits"] = _list_unpaid_single_visits(conn, date_from, date_to, unpaid_limit)
+        if "defers" in parts:
+            overdue_before = _overdue_before(today, overdue_days)
+            values["deferred_count"], values["deferred_amount"] = _count_open_deferrals(conn, date_from, date_to)
+            values["deferred"] = _list_open_deferrals(conn, date_from, date_to, newest_first=True, limit=deferred_limit)
+            values["overdue"] = _list_open_deferrals(conn, None, overdue_before, newest_first=False)
+
+    return ReportSnapshot(
+        date_from=date_from,
+        date_to=date_to,
+        today=today,
+        overdue_days=overdue_days,
+        **values,
     )
 
 
-def list_deferred_payments(
-    db_path: str, date_from: str, date_to: str
-) -> List[Tuple[str, str, str, int, str, Optional[str]]]:
-    with sqlite3.connect(db_path) as conn:
-        cur = conn.execute(
-            """
-            SELECT date(p.created_at) AS created_date,
-                   COALESCE(c.full_name, '—') AS client_name,
-                   COALESCE(g.name, '—') AS group_name,
-                   p.amount,
-                   p.purpose,
-                   p.due_date
-            FROM payments p
-            LEFT JOIN clients c ON c.client_id = p.client_id
-            LEFT JOIN groups g ON g.group_id = p.group_id
-            WHERE p.status = 'deferred'
-              AND p.method = 'defer'
-              AND date(p.created_at) BETWEEN ? AND ?
-            ORDER BY p.created_at DESC, p.pay_id DESC
-            """,
-            (date_from, date_to),
-        )
-        return cur.fetchall()
+class _StreamingSheet:
+    # Write-only sheets take column widths only before the first row, so each
+    # sheet declares them up front and rows go straight to the worksheet.
+    def __init__(self, wb: Workbook, title: str, widths: Sequence[int]) -> None:
+        self._ws = wb.create_sheet(title)
+        for index, width in enumerate(widths, start=1):
+            self._ws.column_dimensions[get_column_letter(index)].width = width
+        self._bold = Font(bold=True)
 
+    def append(self, values: Sequence) -> None:
+        self._ws.append(list(values))
 
-def list_overdue_deferred_payments(
-    db_path: str, today: str, overdue_days: int
-) -> List[Tuple[str, str, str, int]]:
-    with sqlite3.connect(db_path) as conn:
-        cur = conn.execute(
-            """
-            SELECT date(p.created_at) AS created_date,
-                   COALESCE(c.full_name, '—') AS client_name,
-                   COALESCE(g.name, '—') AS group_name,
-                   p.amount
-            FROM payments p
-            LEFT JOIN clients c ON c.client_id = p.client_id
-            LEFT JOIN groups g ON g.group_id = p.group_id
-            WHERE p.status = 'deferred'
-              AND p.method = 'defer'
-              AND date(p.created_at) <= date(?, ?)
-            ORDER BY p.created_at ASC, p.pay_id ASC
-            """,
-            (today, f"-{overdue_days} days"),
-        )
-        return cur.fetchall()
+    def header(self, values: Sequence[str]) -> None:
+        cells = []
+        for value in values:
+            cell = WriteOnlyCell(self._ws, value=value)
+            cell.font = self._bold
+            cells.append(cell)
+        self._ws.append(cells)
+
+    def extend(self, rows: Iterable[Sequence]) -> None:
+        for row in rows:
+            self._ws.append(list(row))
 
 
 def build_excel_report(
@@ -500,96 +486,72 @@ def build_excel_report(
     today: str,
     overdue_days: int,
 ) -> bytes:
-    revenue_summary = get_revenue_summary(db_path, date_from, date_to)
-    expense_summary = get_expense_summary(db_path, date_from, date_to)
-    attendance = get_attendance_summary(db_path, date_from, date_to)
-    profit = revenue_summary.total - expense_summary.total
-
-    paid_payments = list_paid_payments(db_path, date_from, date_to)
-    expenses = list_expenses_for_period(db_path, date_from, date_to)
-    deferred = list_deferred_payments(db_path, date_from, date_to)
-    overdue = list_overdue_deferred_payments(db_path, today, overdue_days)
-
-    wb = Workbook()
-    ws_summary = wb.active
-    ws_summary.title = "Summary"
-
-    _append_header(ws_summary, ["Показатель", "Сумма"])
-    ws_summary.append(["Выручка", revenue_summary.total])
-    ws_summary.append(["Расходы", expense_summary.total])
-    ws_summary.append(["Прибыль", profit])
-    ws_summary.append([])
-    ws_summary.append(["Период", f"{date_from} — {date_to}"])
-
-    ws_revenue = wb.create_sheet("Revenue")
-    _append_header(ws_revenue, ["Метод", "Сумма"])
-    ws_revenue.append(["Наличные", revenue_summary.cash])
-    ws_revenue.append(["Перевод", revenue_summary.transfer])
-    ws_revenue.append(["QR", revenue_summary.qr])
-    ws_revenue.append([])
-    _append_header(ws_revenue, ["Дата", "Клиент", "Группа", "Тип", "Сумма", "Метод"])
-    for row in paid_payments:
-        ws_revenue.append(list(row))
-
-    ws_expenses = wb.create_sheet("Expenses")
-    _append_header(ws_expenses, ["Метод", "Сумма"])
-    ws_expenses.append(["Наличные", expense_summary.cash])
-    ws_expenses.append(["Перевод", expense_summary.transfer])
-    ws_expenses.append(["QR", expense_summary.qr])
-    ws_expenses.append([])
-    _append_header(ws_expenses, ["Категория", "Сумма"])
-    for name, amount in expense_summary.categories:
-        ws_expenses.append([name, amount])
-    if expense_summary.other_amount:
-        ws_expenses.append(["Прочие", expense_summary.other_amount])
-    ws_expenses.append([])
-    _append_header(ws_expenses, ["Дата", "Категория", "Сумма", "Метод", "Комментарий"])
-    for row in expenses:
-        ws_expenses.append(list(row))
-
-    ws_attendance = wb.create_sheet("Attendance")
-    _append_header(ws_attendance, ["Статус", "Количество"])
-    ws_attendance.append(["booked", attendance.booked])
-    ws_attendance.append(["attended", attendance.attended])
-    ws_attendance.append(["noshow", attendance.noshow])
-    ws_attendance.append(["cancelled", attendance.cancelled])
-    ws_attendance.append([])
-    ws_attendance.append(["Период", f"{date_from} — {date_to}"])
-
-    ws_defers = wb.create_sheet("Defers")
-    _append_header(ws_defers, ["Дата", "Клиент", "Группа", "Сумма", "Тип", "Срок оплаты"])
-    for row in deferred:
-        ws_defers.append(list(row))
-    ws_defers.append([])
-    _append_header(ws_defers, ["Просрочено с", "Клиент", "Группа", "Сумма"])
-    for row in overdue:
-        ws_defers.append(list(row))
-
-    for ws in wb.worksheets:
-        _auto_fit_columns(ws)
+    wb = Workbook(write_only=True)
+    with connection(db_path) as conn:
+        if not conn.in_transaction:
+            conn.execute("BEGIN;")
+        snapshot = get_report_snapshot(
+            db_path, date_from, date_to, today, overdue_days, parts=("revenue", "expenses", "attendance")
+        )
+        revenue_summary = snapshot.revenue
+        expense_summary = snapshot.expenses
+        attendance = snapshot.attendance
+
+        ws_summary = _StreamingSheet(wb, "Summary", [14, 25])
+        ws_summary.header(["Показатель", "Сумма"])
+        ws_summary.append(["Выручка", revenue_summary.total])
+        ws_summary.append(["Расходы", expense_summary.total])
+        ws_summary.append(["Прибыль", revenue_summary.total - expense_summary.total])
+        ws_summary.append([])
+        ws_summary.append(["Период", f"{date_from} — {date_to}"])
+
+        ws_revenue = _StreamingSheet(wb, "Revenue", [12, 30, 20, 10, 10, 10])
+        ws_revenue.header(["Метод", "Сумма"])
+        ws_revenue.append(["Наличные", revenue_summary.cash])
+        ws_revenue.append(["Перевод", revenue_summary.transfer])
+        ws_revenue.append(["QR", revenue_summary.qr])
+        ws_revenue.append([])
+        ws_revenue.header(["Дата", "Клиент", "Группа", "Тип", "Сумма", "Метод"])
+        ws_revenue.extend(_paid_payments_cursor(conn, date_from, date_to))
+
+        ws_expenses = _StreamingSheet(wb, "Expenses", [20, 20, 10, 10, 40])
+        ws_expenses.header(["Метод", "Сумма"])
+        ws_expenses.append(["Наличные", expense_summary.cash])
+        ws_expenses.append(["Перевод", expense_summary.transfer])
+        ws_expenses.append(["QR", expense_summary.qr])
+        ws_expenses.append([])
+        ws_expenses.header(["Категория", "Сумма"])
+        for name, amount in expense_summary.categories:
+            ws_expenses.append([name, amount])
+        if expense_summary.other_amount:
+            ws_expenses.append(["Прочие", expense_summary.other_amount])
+        ws_expenses.append([])
+        ws_expenses.header(["Дата", "Категория", "Сумма", "Метод", "Комментарий"])
+        ws_expenses.extend(_expenses_cursor(conn, date_from, date_to))
+
+        ws_attendance = _StreamingSheet(wb, "Attendance", [12, 25])
+        ws_attendance.header(["Статус", "Количество"])
+        ws_attendance.append(["booked", attendance.booked])
+        ws_attendance.append(["attended", attendance.attended])
+        ws_attendance.append(["noshow", attendance.noshow])
+        ws_attendance.append(["cancelled", attendance.cancelled])
+        ws_attendance.append([])
+        ws_attendance.append(["Период", f"{date_from} — {date_to}"])
+
+        overdue_before = _overdue_before(today, overdue_days)
+        ws_defers = _StreamingSheet(wb, "Defers", [14, 30, 20, 10, 10, 12])
+        ws_defers.header(["Дата", "Клиент", "Группа", "Сумма", "Тип", "Срок оплаты"])
+        for _pay_id, created_date, client_name, group_name, amount, purpose, due_date in _open_deferrals_cursor(
+            conn, date_from, date_to, newest_first=True
+        ):
+            ws_defers.append([created_date, client_name, group_name, amount, purpose, due_date])
+        ws_defers.append([])
+        ws_defers.header(["Просрочено с", "Клиент", "Группа", "Сумма"])
+        for _pay_id, created_date, client_name, group_name, amount, _purpose, _due_date in _open_deferrals_cursor(
+            conn, None, overdue_before, newest_first=False
+        ):
+            ws_defers.append([created_date, client_name, group_name, amount])
 
     buffer = BytesIO()
     wb.save(buffer)
     return buffer.getvalue()
-
-
-def _append_header(ws, values: Iterable[str]) -> None:
-    row_values = list(values)
-    ws.append(row_values)
-    row_idx = ws.max_row
-    bold = Font(bold=True)
-    for col_idx in range(1, len(row_values) + 1):
-        ws.cell(row=row_idx, column=col_idx).font = bold
-
-
-def _auto_fit_columns(ws) -> None:
-    for column_cells in ws.columns:
-        length = 0
-        col_letter = get_column_letter(column_cells[0].column)
-        for cell in column_cells:
-            if cell.value is None:
-                continue
-            value_len = len(str(cell.value))
-            if value_len > length:
-                length = value_len
-        ws.column_dimensions[col_letter].width = min(max(length + 2, 10), 60)
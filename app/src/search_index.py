@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import sqlite3
+
+
+def fuzzy_key(text: str) -> str:
+    folded = text.casefold().replace("ё", "е")
+    cleaned = "".join(ch if ch.isalnum() else " " for ch in folded)
+    return " ".join(cleaned.split())
+
+
+def word_trigrams(word: str) -> set:
+    padded = f"  {word} "
+    return {padded[idx : idx + 3] for idx in range(len(padded) - 2)}
+
+
+def phone_trigrams(digits: str) -> set:
+    return {digits[idx : idx + 3] for idx in range(len(digits) - 2)}
+
+
+def index_client_search(conn: sqlite3.Connection, client_id: int, full_name: str, phone: str) -> None:
+    name_key = fuzzy_key(full_name)
+    phone_key = "".join(ch for ch in phone if ch.isdigit())
+    conn.execute(
+        "INSERT OR REPLACE INTO clients_search(rowid, name_folded) VALUES (?, ?)",
+        (client_id, full_name.casefold()),
+    )
+    conn.execute(
+        "INSERT OR REPLACE INTO client_search_keys(client_id, name_key, phone_key) VALUES (?, ?, ?)",
+        (client_id, name_key, phone_key),
+    )
+    for word in set(name_key.split()):
+        grams = word_trigrams(word)
+        cur = conn.execute(
+            "INSERT OR IGNORE INTO search_words(word, gram_count) VALUES (?, ?)",
+            (word, len(grams)),
+        )
+        if cur.rowcount > 0:
+            word_id = int(cur.lastrowid)
+            conn.executemany(
+                "INSERT INTO search_word_ngrams(gram, word_id) VALUES (?, ?)",
+                ((gram, word_id) for gram in grams),
+            )
+        else:
+            word_id = conn.execute(
+                "SELECT word_id FROM search_words WHERE word = ?", (word,)
+            ).fetchone()[0]
+        conn.execute(
+            "INSERT OR IGNORE INTO client_words(word_id, client_id) VALUES (?, ?)",
+            (word_id, client_id),
+        )
+    conn.executemany(
+        "INSERT OR IGNORE INTO client_phone_ngrams(gram, client_id) VALUES (?, ?)",
+        ((gram, client_id) for gram in phone_trigrams(phone_key)),
+    )
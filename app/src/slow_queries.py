@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import logging
+import sqlite3
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from logging.handlers import RotatingFileHandler
+from typing import Any, Deque, List, Optional, Tuple
+
+from db_pool import QueryStats
+
+DEFAULT_SLOW_QUERY_MS = 200
+SLOW_QUERY_BUFFER_SIZE = 200
+SLOW_QUERY_LOG_MAX_BYTES = 1024 * 1024
+SLOW_QUERY_LOG_BACKUPS = 3
+
+
+@dataclass(frozen=True)
+class SlowQuery:
+    logged_at: float
+    caller: str
+    sql: str
+    parameter_shape: str
+    seconds: float
+    rows: int
+    plan: Tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class SlowQueryOffender:
+    caller: str
+    sql: str
+    count: int
+    total_seconds: float
+    max_seconds: float
+    plan: Tuple[str, ...]
+
+
+def parameter_shape(parameters: Any) -> str:
+    # Types only: bound values may hold client names and phones.
+    if parameters is None:
+        return "executemany"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + "}"
+    return "(" + ", ".join(type(value).__name__ for value in parameters) + ")"
+
+
+def _explain(stats: QueryStats) -> Tuple[str, ...]:
+    if stats.parameters is None or stats.connection is None:
+        return ()
+    try:
+        # An explicit plain cursor keeps the EXPLAIN itself out of the observers.
+        cur = stats.connection.cursor(sqlite3.Cursor)
+        rows = cur.execute("EXPLAIN QUERY PLAN " + stats.sql, stats.parameters).fetchall()
+    except sqlite3.Error:
+        return ()
+    return tuple(row[3] for row in rows)
+
+
+class SlowQueryLog:
+    def __init__(
+        self,
+        threshold_ms: float = DEFAULT_SLOW_QUERY_MS,
+        size: int = SLOW_QUERY_BUFFER_SIZE,
+        log_path: Optional[str] = None,
+    ) -> None:
+        self.threshold = threshold_ms / 1000
+        self._entries: Deque[SlowQuery] = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self._file: Optional[RotatingFileHandler] = None
+        if log_path:
+            self._file = RotatingFileHandler(
+                log_path, maxBytes=SLOW_QUERY_LOG_MAX_BYTES, backupCount=SLOW_QUERY_LOG_BACKUPS, encoding="utf-8"
+            )
+            self._file.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+
+    def __call__(self, stats: QueryStats) -> None:
+        if stats.seconds < self.threshold:
+            return
+        entry = SlowQuery(
+            logged_at=time.time(),
+            caller=stats.caller,
+            sql=" ".join(stats.sql.split()),
+            parameter_shape=parameter_shape(stats.parameters),
+            seconds=stats.seconds,
+            rows=stats.rows,
+            plan=_explain(stats),
+        )
+        with self._lock:
+            self._entries.append(entry)
+        if self._file is not None:
+            message = (
+                f"{entry.seconds * 1000:.1f}ms rows={entry.rows} {entry.caller} {entry.sql} "
+                f"params={entry.parameter_shape} plan={' | '.join(entry.plan)}"
+            )
+            self._file.handle(logging.makeLogRecord({"msg": message, "levelno": logging.WARNING}))
+
+    def entries(self) -> List[SlowQuery]:
+        with self._lock:
+            return list(self._entries)
+
+    def top(self, limit: int = 5) -> List[SlowQueryOffender]:
+        grouped = {}
+        for entry in self.entries():
+            key = (entry.caller, entry.sql)
+            current = grouped.get(key)
+            if current is None:
+                grouped[key] = SlowQueryOffender(
+                    entry.caller, entry.sql, 1, entry.seconds, entry.seconds, entry.plan
+                )
+            else:
+                grouped[key] = SlowQueryOffender(
+                    entry.caller,
+                    entry.sql,
+                    current.count + 1,
+                    current.total_seconds + entry.seconds,
+                    max(current.max_seconds, entry.seconds),
+                    entry.plan,
+                )
+        return sorted(grouped.values(), key=lambda item: item.total_seconds, reverse=True)[:limit]
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+_slow_log: Optional[SlowQueryLog] = None
+
+
+def configure_slow_query_log(log: Optional[SlowQueryLog]) -> None:
+    global _slow_log
+    previous = _slow_log
+    _slow_log = log
+    if previous is not None and previous is not log:
+        previous.close()
+
+
+def get_slow_query_log() -> Optional[SlowQueryLog]:
+    return _slow_log
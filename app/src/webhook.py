@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import signal
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+from aiohttp import web
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class _DrainingRequestHandler(SimpleRequestHandler):
+    # Updates are acknowledged at once and handled in background tasks, so a
+    # slow handler (the Excel report) never outlives Telegram's webhook timeout
+    # and gets the update redelivered. Shutdown waits for those tasks.
+    async def drain(self) -> None:
+        while self._background_feed_update_tasks:
+            await asyncio.gather(*self._background_feed_update_tasks, return_exceptions=True)
+
+
+def create_webhook_app(dp: Dispatcher, bot: Bot, config: Config) -> web.Application:
+    app = web.Application()
+    handler = _DrainingRequestHandler(dispatcher=dp, bot=bot, secret_token=config.webhook_secret)
+    app.router.add_post(config.webhook_path, handler.handle)
+    workflow_data = {"dispatcher": dp, "bot": bot, **dp.workflow_data}
+
+    async def on_startup(_app: web.Application) -> None:
+        await dp.emit_startup(**workflow_data)
+
+    async def on_shutdown(_app: web.Application) -> None:
+        # The site no longer accepts requests here; on_cleanup runs after this
+        # and closes the FSM storage and the DB pool.
+        await handler.drain()
+
+    async def on_cleanup(_app: web.Application) -> None:
+        try:
+            await dp.emit_shutdown(**workflow_data)
+        finally:
+            await bot.session.close()
+
+    app.on_startup.append(on_startup)
+    app.on_shutdown.append(on_shutdown)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, config: Config) -> None:
+    runner = web.AppRunner(create_webhook_app(dp, bot, config))
+    await runner.setup()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            # Windows: Ctrl+C cancels the task instead, cleanup still runs.
+            pass
+    try:
+        await web.TCPSite(runner, config.webhook_host, config.webhook_port).start()
+        logger.info(
+            "Listening for webhook updates on %s:%s%s", config.webhook_host, config.webhook_port, config.webhook_path
+        )
+        await stop.wait()
+    finally:
+        await runner.cleanup()
@@ -0,0 +1,72 @@
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
+SRC_PATH = os.path.join(PROJECT_ROOT, "app", "src")
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+from db import create_client, get_client_by_id, init_db, is_admin_active, upsert_admin
+from db_pool import close_all_pools
+
+ITERATIONS = 2000
+
+
+def _fresh_connection_lookup(db_path: str, client_id: int):
+    with sqlite3.connect(db_path) as conn:
+        cur = conn.execute(
+            """
+            SELECT client_id, full_name, phone, tg_username, birth_date, comment
+            FROM clients
+            WHERE client_id = ?
+            LIMIT 1
+            """,
+            (client_id,),
+        )
+        return cur.fetchone()
+
+
+def _fresh_connection_admin(db_path: str, tg_user_id: int) -> bool:
+    with sqlite3.connect(db_path) as conn:
+        cur = conn.execute(
+            "SELECT 1 FROM admins WHERE tg_user_id = ? AND is_active = 1 LIMIT 1",
+            (tg_user_id,),
+        )
+        return cur.fetchone() is not None
+
+
+def _measure(label: str, func, *args) -> float:
+    timings = []
+    for _ in range(ITERATIONS):
+        started = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - started)
+    median_us = statistics.median(timings) * 1_000_000
+    print(f"{label:<40} median {median_us:8.1f} us/call")
+    return median_us
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "bench.sqlite")
+        init_db(db_path)
+        client_id = create_client(db_path, "Анна", "+70000000000", None, None, None, None)
+        upsert_admin(db_path, 1001, "Админ")
+
+        before = _measure("get_client_by_id (connect per call)", _fresh_connection_lookup, db_path, client_id)
+        after = _measure("get_client_by_id (pooled)", get_client_by_id, db_path, client_id)
+        print(f"{'speedup':<40} x{before / after:.1f}")
+
+        before = _measure("is_admin_active (connect per call)", _fresh_connection_admin, db_path, 1001)
+        after = _measure("is_admin_active (pooled)", is_admin_active, db_path, 1001)
+        print(f"{'speedup':<40} x{before / after:.1f}")
+        close_all_pools()
+
+
+if __name__ == "__main__":
+    main()
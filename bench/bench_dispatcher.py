@@ -0,0 +1,442 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
+SRC_PATH = os.path.join(PROJECT_ROOT, "app", "src")
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+if CURRENT_DIR not in sys.path:
+    sys.path.insert(0, CURRENT_DIR)
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import SendDocument, TelegramMethod
+from aiogram.types import Chat, Document, Message, ReplyKeyboardMarkup, Update, User
+
+from async_db import configure_executor, shutdown_executor
+from config import Config
+from db import init_db, load_active_admin_ids, upsert_admin
+from db_pool import close_all_pools, configure_pool, connection
+from fsm_storage import SQLiteStorage
+from handlers import router
+from keyboards import (
+    ATTENDANCE_BULK_BUTTON,
+    ATTENDANCE_BULK_BUTTONS,
+    ATTENDANCE_BULK_MARKS,
+    ATTENDANCE_DATE_BUTTONS,
+    BOOKING_CLIENT_SEARCH_BUTTONS,
+    BOOKING_DATE_BUTTONS,
+    BOOKING_TYPE_BUTTONS,
+    CLIENT_ACTION_BUTTONS,
+    CONFIRM_BUTTONS,
+    DEFER_DUE_DATE_BUTTONS,
+    MAIN_MENU_BUTTONS,
+    PAYMENT_DATE_BUTTONS,
+    PAYMENT_MENU_BUTTONS,
+    PAYMENT_METHOD_BUTTONS,
+    PAYMENT_TYPE_BUTTONS,
+    REPORT_ACTION_BUTTONS,
+    REPORT_MENU_BUTTONS,
+    SKIP_BUTTONS,
+)
+from middlewares import AccessMiddleware
+from report_export import shutdown_report_workers
+from synthetic_data import SIZES, cached_dataset
+
+BOT_TOKEN = "123456:LOADTEST"
+OWNER_ID = 1
+FIRST_ADMIN_ID = 500_000
+# Share of each flow in the default mix: mostly attendance and payments,
+# as on a class evening.
+DEFAULT_MIX = {"attendance": 4, "payment": 3, "booking": 2, "new_client": 1, "reports": 1}
+
+
+class FlowError(RuntimeError):
+    pass
+
+
+@dataclass(frozen=True)
+class Reply:
+    text: str
+    buttons: Tuple[str, ...]
+
+
+def _buttons(markup: Any) -> Tuple[str, ...]:
+    if not isinstance(markup, ReplyKeyboardMarkup):
+        return ()
+    return tuple(button.text for row in markup.keyboard for button in row)
+
+
+class StubSession(BaseSession):
+    # Answers every Bot API call locally: sent messages are echoed back as
+    # Message objects and remembered as the chat's latest reply.
+    def __init__(self, api_latency: float = 0.0) -> None:
+        super().__init__()
+        self.api_latency = api_latency
+        self.requests = 0
+        self.last_reply: Dict[int, Reply] = {}
+        self.reply_counts: Dict[int, int] = {}
+        self._message_ids = itertools.count(1)
+
+    async def make_request(self, bot: Bot, method: TelegramMethod[Any], timeout: Optional[int] = None) -> Any:
+        self.requests += 1
+        if self.api_latency:
+            await asyncio.sleep(self.api_latency)
+        if method.__returning__ is bool:
+            return True
+        if method.__returning__ is not Message:
+            raise NotImplementedError(f"{type(method).__name__} is not stubbed")
+        chat_id = int(method.chat_id)
+        message_id = next(self._message_ids)
+        text = getattr(method, "text", None) or getattr(method, "caption", None) or ""
+        self.last_reply[chat_id] = Reply(text, _buttons(getattr(method, "reply_markup", None)))
+        self.reply_counts[chat_id] = self.reply_counts.get(chat_id, 0) + 1
+        document = None
+        if isinstance(method, SendDocument):
+            document = Document(file_id=f"document-{message_id}", file_unique_id=f"document-{message_id}")
+        return Message(
+            message_id=message_id,
+            date=datetime.now(timezone.utc),
+            chat=Chat(id=chat_id, type="private"),
+            text=text if document is None else None,
+            caption=text if document is not None else None,
+            document=document,
+        )
+
+    async def stream_content(
+        self,
+        url: str,
+        headers: Optional[Dict[str, Any]] = None,
+        timeout: int = 30,
+        chunk_size: int = 65536,
+        raise_for_status: bool = True,
+    ) -> AsyncGenerator[bytes, None]:
+        raise NotImplementedError("downloads are not stubbed")
+        yield b""
+
+    async def close(self) -> None:
+        pass
+
+
+@dataclass
+class Stats:
+    update_seconds: List[float] = field(default_factory=list)
+    flow_seconds: Dict[str, List[float]] = field(default_factory=dict)
+    flow_errors: Dict[str, List[str]] = field(default_factory=dict)
+
+
+class SimulatedAdmin:
+    _update_ids = itertools.count(1)
+
+    def __init__(
+        self,
+        user_id: int,
+        rng: random.Random,
+        phones: List[str],
+        dp: Dispatcher,
+        bot: Bot,
+        session: StubSession,
+        stats: Stats,
+    ) -> None:
+        self.user_id = user_id
+        self.rng = rng
+        self.phones = phones
+        self.dp = dp
+        self.bot = bot
+        self.session = session
+        self.stats = stats
+        self._user = User(id=user_id, is_bot=False, first_name=f"Админ {user_id}")
+        self._chat = Chat(id=user_id, type="private")
+        self._message_ids = itertools.count(1)
+
+    async def send(self, text: str) -> Reply:
+        update = Update(
+            update_id=next(self._update_ids),
+            message=Message(
+                message_id=next(self._message_ids),
+                date=datetime.now(timezone.utc),
+                chat=self._chat,
+                from_user=self._user,
+                text=text,
+            ),
+        )
+        replies_before = self.session.reply_counts.get(self.user_id, 0)
+        started = time.perf_counter()
+        await self.dp.feed_update(self.bot, update)
+        self.stats.update_seconds.append(time.perf_counter() - started)
+        if self.session.reply_counts.get(self.user_id, 0) == replies_before:
+            raise FlowError(f"no reply to {text!r}")
+        return self.session.last_reply[self.user_id]
+
+    def pick(self, reply: Reply, predicate: Callable[[str], bool]) -> str:
+        options = [button for button in reply.buttons if predicate(button)]
+        if not options:
+            raise FlowError(f"no matching button after {reply.text[:60]!r}")
+        return self.rng.choice(options)
+
+    def phone(self) -> str:
+        return self.rng.choice(self.phones)
+
+    async def reset(self) -> None:
+        await self.dp.fsm.get_context(self.bot, chat_id=self.user_id, user_id=self.user_id).clear()
+
+
+def _expect(reply: Reply, *fragments: str) -> None:
+    if not any(fragment in reply.text for fragment in fragments):
+        raise FlowError(f"unexpected reply {reply.text[:80]!r}")
+
+
+def _is_group(button: str) -> bool:
+    return " (id:" in button
+
+
+async def _flow_new_client(admin: SimulatedAdmin) -> None:
+    await admin.send(MAIN_MENU_BUTTONS[0])
+    reply = await admin.send(f"+7955{admin.rng.randrange(10**7):07d}")
+    _expect(reply, "ФИО", "уже существует")
+    if "уже существует" in reply.text:
+        return
+    await admin.send(f"Нагрузочный Клиент {admin.user_id}")
+    await admin.send(SKIP_BUTTONS[0])
+    await admin.send(SKIP_BUTTONS[0])
+    await admin.send(SKIP_BUTTONS[0])
+    reply = await admin.send(CONFIRM_BUTTONS[0])
+    if CLIENT_ACTION_BUTTONS[5] not in reply.buttons:
+        raise FlowError(f"no client card: {reply.text[:80]!r}")
+    await admin.send(CLIENT_ACTION_BUTTONS[5])
+
+
+async def _flow_booking(admin: SimulatedAdmin) -> None:
+    await admin.send(MAIN_MENU_BUTTONS[2])
+    await admin.send(BOOKING_CLIENT_SEARCH_BUTTONS[0])
+    _expect(await admin.send(admin.phone()), "тип записи")
+    reply = await admin.send(BOOKING_TYPE_BUTTONS[0])
+    await admin.send(admin.pick(reply, _is_group))
+    await admin.send(BOOKING_DATE_BUTTONS[1])
+    _expect(await admin.send(CONFIRM_BUTTONS[0]), "Готово", "Запись уже существует")
+
+
+async def _flow_attendance(admin: SimulatedAdmin) -> None:
+    reply = await admin.send(MAIN_MENU_BUTTONS[3])
+    await admin.send(admin.pick(reply, _is_group))
+    reply = await admin.send(ATTENDANCE_DATE_BUTTONS[0])
+    if reply.text.startswith("Нет клиентов"):
+        return
+    reply = await admin.send(ATTENDANCE_BULK_BUTTON)
+    for _ in range(admin.rng.randint(0, 2)):
+        reply = await admin.send(admin.pick(reply, lambda button: button.startswith(ATTENDANCE_BULK_MARKS)))
+    _expect(await admin.send(ATTENDANCE_BULK_BUTTONS[0]), "Готово")
+
+
+async def _flow_payment(admin: SimulatedAdmin) -> None:
+    await admin.send(MAIN_MENU_BUTTONS[4])
+    await admin.send(PAYMENT_MENU_BUTTONS[0])
+    await admin.send(PAYMENT_TYPE_BUTTONS[0])
+    await admin.send(BOOKING_CLIENT_SEARCH_BUTTONS[0])
+    reply = await admin.send(admin.phone())
+    await admin.send(admin.pick(reply, _is_group))
+    await admin.send(PAYMENT_DATE_BUTTONS[0])
+    await admin.send(str(admin.rng.choice((500, 700, 1000))))
+    method = admin.rng.choices(PAYMENT_METHOD_BUTTONS[:4], weights=(3, 4, 3, 1))[0]
+    await admin.send(method)
+    if method == PAYMENT_METHOD_BUTTONS[3]:
+        await admin.send(DEFER_DUE_DATE_BUTTONS[1])
+    _expect(await admin.send(CONFIRM_BUTTONS[0]), "Готово")
+
+
+async def _flow_reports(admin: SimulatedAdmin) -> None:
+    await admin.send(MAIN_MENU_BUTTONS[7])
+    for report in (REPORT_MENU_BUTTONS[0], REPORT_MENU_BUTTONS[3], REPORT_MENU_BUTTONS[6]):
+        await admin.send(report)
+        await admin.send(REPORT_ACTION_BUTTONS[1])
+    _expect(await admin.send(REPORT_MENU_BUTTONS[7]), "Отчет")
+    _expect(await admin.send(REPORT_MENU_BUTTONS[8]), "Главное меню")
+
+
+FLOWS: Dict[str, Callable[[SimulatedAdmin], Awaitable[None]]] = {
+    "new_client": _flow_new_client,
+    "booking": _flow_booking,
+    "attendance": _flow_attendance,
+    "payment": _flow_payment,
+    "reports": _flow_reports,
+}
+
+
+async def _run_admin(admin: SimulatedAdmin, mix: Dict[str, int], deadline: float, max_flows: Optional[int]) -> None:
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    completed = 0
+    while time.perf_counter() < deadline and (max_flows is None or completed < max_flows):
+        name = admin.rng.choices(names, weights)[0]
+        started = time.perf_counter()
+        try:
+            await FLOWS[name](admin)
+        except Exception as exc:
+            admin.stats.flow_errors.setdefault(name, []).append(f"{type(exc).__name__}: {exc}")
+            await admin.reset()
+        else:
+            admin.stats.flow_seconds.setdefault(name, []).append(time.perf_counter() - started)
+        completed += 1
+
+
+def _sample_phones(db_path: str, rng: random.Random, count: int) -> List[str]:
+    with connection(db_path) as conn:
+        phones = [
+            row[0]
+            for row in conn.execute(
+                """
+                SELECT DISTINCT c.phone
+                FROM client_groups cg JOIN clients c ON c.client_id = cg.client_id
+                WHERE cg.status = 'active'
+                ORDER BY c.phone
+                """
+            )
+        ]
+    return rng.sample(phones, min(count, len(phones)))
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "p50_ms": round(statistics.median(ordered) * 1000, 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))] * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+async def _run_level(
+    dp: Dispatcher, bot: Bot, session: StubSession, phones: List[str], admin_ids: List[int], args: argparse.Namespace
+) -> Dict[str, Any]:
+    stats = Stats()
+    requests_before = session.requests
+    simulated = [
+        SimulatedAdmin(admin_id, random.Random(args.seed + admin_id), phones, dp, bot, session, stats)
+        for admin_id in admin_ids
+    ]
+    started = time.perf_counter()
+    await asyncio.gather(*(_run_admin(admin, args.mix, started + args.duration, args.flows) for admin in simulated))
+    elapsed = time.perf_counter() - started
+
+    flows = {name: _percentiles(values) for name, values in sorted(stats.flow_seconds.items())}
+    errors = {name: {"count": len(messages), "first": messages[0]} for name, messages in stats.flow_errors.items()}
+    return {
+        "admins": len(admin_ids),
+        "seconds": round(elapsed, 3),
+        "updates": len(stats.update_seconds),
+        "updates_per_second": round(len(stats.update_seconds) / elapsed, 1),
+        "api_requests": session.requests - requests_before,
+        "update_latency": _percentiles(stats.update_seconds) if stats.update_seconds else {},
+        "flows": flows,
+        "errors": errors,
+    }
+
+
+async def run_load(db_path: str, args: argparse.Namespace) -> List[Dict[str, Any]]:
+    # One dispatcher serves every concurrency level: the handlers router can
+    # only be attached once per process. Levels run back to back on the same
+    # database, so later ones see the rows earlier ones wrote.
+    configure_pool(db_path, size=args.pool_size)
+    configure_executor(args.pool_size)
+    init_db(db_path)
+    admin_ids = [FIRST_ADMIN_ID + index for index in range(max(args.admins))]
+    for admin_id in admin_ids:
+        upsert_admin(db_path, admin_id, f"Нагрузка {admin_id}")
+    load_active_admin_ids(db_path)
+
+    config = Config(
+        bot_token=BOT_TOKEN, owner_tg_user_id=OWNER_ID, db_path=db_path, tz="UTC", db_pool_size=args.pool_size
+    )
+    session = StubSession(args.api_latency_ms / 1000)
+    bot = Bot(token=BOT_TOKEN, session=session)
+    storage = SQLiteStorage(db_path)
+    dp = Dispatcher(storage=storage)
+    dp["config"] = config
+    dp.update.outer_middleware(AccessMiddleware())
+    dp.include_router(router)
+
+    phones = _sample_phones(db_path, random.Random(args.seed), 500)
+    results = []
+    try:
+        for admins in args.admins:
+            result = await _run_level(dp, bot, session, phones, admin_ids[:admins], args)
+            results.append(result)
+            _print_result(result)
+        await storage.close()
+    finally:
+        await bot.session.close()
+        shutdown_report_workers()
+        shutdown_executor()
+        close_all_pools()
+    return results
+
+
+def _print_result(result: Dict[str, Any]) -> None:
+    latency = result["update_latency"]
+    print(
+        f"{result['admins']:3d} admins: {result['updates_per_second']:8.1f} updates/s  "
+        f"update p50 {latency.get('p50_ms', 0):7.2f} ms  p95 {latency.get('p95_ms', 0):7.2f} ms",
+        file=sys.stderr,
+    )
+    for name, row in result["flows"].items():
+        print(
+            f"    {name:<12} {row['count']:5d} flows  p50 {row['p50_ms']:8.1f} ms  p95 {row['p95_ms']:8.1f} ms",
+            file=sys.stderr,
+        )
+    for name, row in result["errors"].items():
+        print(f"    {name:<12} {row['count']:5d} errors, first: {row['first']}", file=sys.stderr)
+
+
+def _parse_mix(raw: str) -> Dict[str, int]:
+    mix = {}
+    for part in raw.split(","):
+        name, _, weight = part.partition("=")
+        if name not in FLOWS:
+            raise argparse.ArgumentTypeError(f"unknown flow {name!r}; expected one of {', '.join(FLOWS)}")
+        mix[name] = int(weight or 1)
+    return mix
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Feed synthetic admin flows through the dispatcher without Telegram")
+    parser.add_argument("--size", choices=sorted(SIZES), default="small")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--admins", type=int, nargs="+", default=[1, 4, 16], help="concurrent admins per run")
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds per run")
+    parser.add_argument("--flows", type=int, help="stop each admin after this many flows")
+    parser.add_argument("--mix", type=_parse_mix, default=dict(DEFAULT_MIX), help="e.g. attendance=4,payment=3,reports=1")
+    parser.add_argument("--api-latency-ms", type=float, default=0.0, help="simulated Bot API round trip")
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--json", dest="json_path", help="write results to this file ('-' for stdout)")
+    args = parser.parse_args()
+
+    source = cached_dataset(args.size, args.seed)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "load.sqlite")
+        shutil.copyfile(source, db_path)
+        results = asyncio.run(run_load(db_path, args))
+
+    report = {"size": args.size, "seed": args.seed, "api_latency_ms": args.api_latency_ms, "runs": results}
+    if args.json_path == "-":
+        json.dump(report, sys.stdout, indent=2, ensure_ascii=False)
+        print()
+    elif args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from io import BytesIO
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
+SRC_PATH = os.path.join(PROJECT_ROOT, "app", "src")
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+from openpyxl import Workbook
+
+from db import init_db
+from db_pool import close_all_pools, connection
+from reporting import build_excel_report, list_expenses_for_period, list_paid_payments
+
+ROWS = int(os.getenv("BENCH_ROWS", "20000"))
+DATE_FROM = "2024-01-01"
+DATE_TO = "2024-12-31"
+
+
+def _seed(db_path: str) -> None:
+    rng = random.Random(42)
+    with connection(db_path) as conn:
+        conn.executemany(
+            "INSERT INTO clients(full_name, phone) VALUES (?, ?)",
+            [(f"Клиент {index}", f"+7900{index:07d}") for index in range(1000)],
+        )
+        conn.execute("INSERT INTO groups(name) VALUES ('Джаз')")
+        category_id = conn.execute(
+            "INSERT INTO expense_categories(code, name) VALUES ('rent', 'Аренда')"
+        ).lastrowid
+        days = [f"2024-{month:02d}-{day:02d}" for month in range(1, 13) for day in range(1, 29)]
+        conn.executemany(
+            """
+            INSERT INTO payments(pay_date, client_id, group_id, amount, method, status, purpose)
+            VALUES (?, ?, 1, ?, ?, 'paid', 'single')
+            """,
+            [
+                (rng.choice(days), rng.randint(1, 1000), rng.randint(300, 5000), rng.choice(("cash", "transfer", "qr")))
+                for _ in range(ROWS)
+            ],
+        )
+        conn.executemany(
+            "INSERT INTO expenses(exp_date, category_id, amount, method, comment) VALUES (?, ?, ?, 'cash', ?)",
+            [(rng.choice(days), category_id, rng.randint(100, 3000), f"Расход {index}") for index in range(ROWS)],
+        )
+
+
+def _in_memory_report(db_path: str) -> bytes:
+    wb = Workbook()
+    ws_revenue = wb.active
+    for row in list_paid_payments(db_path, DATE_FROM, DATE_TO):
+        ws_revenue.append(list(row))
+    ws_expenses = wb.create_sheet("Expenses")
+    for row in list_expenses_for_period(db_path, DATE_FROM, DATE_TO):
+        ws_expenses.append(list(row))
+    for ws in wb.worksheets:
+        for column_cells in ws.columns:
+            max(len(str(cell.value)) for cell in column_cells if cell.value is not None)
+    buffer = BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def _measure(label: str, func, *args) -> None:
+    started = time.perf_counter()
+    data = func(*args)
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} {elapsed:6.2f} s  peak {peak / 1024 / 1024:7.1f} MiB  size {len(data) / 1024:8.0f} KiB")
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "bench.sqlite")
+        init_db(db_path)
+        _seed(db_path)
+        print(f"{ROWS} payments + {ROWS} expenses in {DATE_FROM} — {DATE_TO}")
+        _measure("in-memory workbook", _in_memory_report, db_path)
+        _measure("streaming write-only export", build_excel_report, db_path, DATE_FROM, DATE_TO, DATE_TO, 7)
+        close_all_pools()
+
+
+if __name__ == "__main__":
+    main()
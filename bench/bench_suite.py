@@ -0,0 +1,418 @@
+import argparse
+import inspect
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
+SRC_PATH = os.path.join(PROJECT_ROOT, "app", "src")
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+if CURRENT_DIR not in sys.path:
+    sys.path.insert(0, CURRENT_DIR)
+
+import db
+import reporting
+from db_pool import QueryStats, add_query_observer, close_all_pools, connection, remove_query_observer
+from synthetic_data import OWNER_ID, SIZES, cached_dataset
+
+DEFAULT_BASELINE = os.path.join(CURRENT_DIR, "baseline.json")
+# The progress handler fires every N SQLite VM instructions; the count is a
+# deterministic stand-in for rows scanned, which sqlite3 does not expose.
+VM_STEP_GRANULARITY = 100
+# Median latency has to be this much slower than the baseline, and by more
+# than the noise floor, to count as a regression (p95 of fsync-bound writes is
+# too noisy to gate on). VM work is deterministic, so a small
+# increase there already means a plan changed.
+LATENCY_TOLERANCE = 1.5
+LATENCY_NOISE_FLOOR_MS = 0.05
+VM_STEPS_TOLERANCE = 1.1
+# Functions that are setup or cache plumbing rather than a request path.
+NOT_BENCHMARKED = {"init_db", "transaction", "invalidate_admin_cache", "reference_version", "cached_active_admin_ids"}
+
+
+@dataclass
+class Context:
+    db_path: str
+    today: str
+    month_from: str
+    year_from: str
+    client_id: int
+    phone: str
+    tg_username: str
+    group_id: int
+    trainer_id: int
+    schedule_id: int
+    visit_id: int
+    pass_id: int
+    pay_id: int
+    category_id: int
+    expense_id: int
+    surname: str
+
+
+@dataclass(frozen=True)
+class Case:
+    # args runs outside the measured call, so a delete or close case can
+    # create the row it consumes.
+    func: Callable[..., Any]
+    args: Callable[[Context, int], tuple]
+
+    @property
+    def name(self) -> str:
+        return f"{self.func.__module__}.{self.func.__name__}"
+
+
+def _cases() -> List[Case]:
+    # Reads come first: the writes at the end change the data they would see.
+    reads = [
+        Case(db.get_data_version, lambda c, i: (c.db_path,)),
+        Case(db.get_report_file_id, lambda c, i: (c.db_path, c.month_from, c.today, c.today, 7, 1)),
+        Case(db.load_fsm_state, lambda c, i: (c.db_path, "bench:0", 0)),
+        Case(db.list_admins, lambda c, i: (c.db_path,)),
+        Case(db.get_admin_by_tg_user_id, lambda c, i: (c.db_path, OWNER_ID + 1)),
+        Case(db.load_active_admin_ids, lambda c, i: (c.db_path,)),
+        Case(db.is_admin_active, lambda c, i: (c.db_path, OWNER_ID + 1)),
+        Case(db.get_client_by_phone, lambda c, i: (c.db_path, c.phone)),
+        Case(db.get_client_by_tg_username, lambda c, i: (c.db_path, "@" + c.tg_username)),
+        Case(db.get_client_by_id, lambda c, i: (c.db_path, c.client_id)),
+        Case(db.search_clients_by_name, lambda c, i: (c.db_path, c.surname[:4])),
+        Case(db.search_clients_fuzzy, lambda c, i: (c.db_path, c.surname[1] + c.surname[0] + c.surname[2:])),
+        Case(db.list_active_groups, lambda c, i: (c.db_path,)),
+        Case(db.get_active_pass, lambda c, i: (c.db_path, c.client_id, c.group_id, c.today)),
+        Case(db.get_pass_by_id, lambda c, i: (c.db_path, c.pass_id)),
+        Case(db.get_group_by_id, lambda c, i: (c.db_path, c.group_id)),
+        Case(db.list_groups, lambda c, i: (c.db_path, True)),
+        Case(db.list_groups_by_trainer, lambda c, i: (c.db_path, c.trainer_id)),
+        Case(db.list_schedule_for_group, lambda c, i: (c.db_path, c.group_id)),
+        Case(db.get_schedule_by_id, lambda c, i: (c.db_path, c.schedule_id)),
+        Case(db.list_active_trainers, lambda c, i: (c.db_path,)),
+        Case(db.list_trainers, lambda c, i: (c.db_path, True)),
+        Case(db.get_trainer_by_id, lambda c, i: (c.db_path, c.trainer_id)),
+        Case(db.visit_exists, lambda c, i: (c.db_path, c.today, c.group_id, c.client_id)),
+        Case(db.list_clients_for_attendance, lambda c, i: (c.db_path, c.group_id, c.today)),
+        Case(db.get_visit_by_date_group_client, lambda c, i: (c.db_path, c.today, c.group_id, c.client_id)),
+        Case(db.list_active_passes, lambda c, i: (c.db_path, c.client_id, c.group_id, c.today)),
+        Case(db.list_deferred_payments_by_client, lambda c, i: (c.db_path, c.client_id)),
+        Case(db.get_payment_by_id, lambda c, i: (c.db_path, c.pay_id)),
+        Case(db.get_defer_summary, lambda c, i: (c.db_path, c.client_id, c.today)),
+        Case(db.list_expense_categories, lambda c, i: (c.db_path, True)),
+        Case(db.get_last_expense, lambda c, i: (c.db_path, OWNER_ID)),
+        Case(db.list_expenses, lambda c, i: (c.db_path, c.month_from, c.today)),
+        Case(db.get_expense_by_id, lambda c, i: (c.db_path, c.expense_id)),
+        Case(reporting.get_revenue_summary, lambda c, i: (c.db_path, c.month_from, c.today)),
+        Case(reporting.list_paid_payments, lambda c, i: (c.db_path, c.month_from, c.today)),
+        Case(reporting.get_expense_summary, lambda c, i: (c.db_path, c.month_from, c.today)),
+        Case(reporting.list_expenses_for_period, lambda c, i: (c.db_path, c.month_from, c.today)),
+        Case(reporting.get_attendance_summary, lambda c, i: (c.db_path, c.month_from, c.today)),
+        Case(reporting.list_attended_today_by_group, lambda c, i: (c.db_path, c.group_id, c.today)),
+        Case(reporting.list_active_passes_today, lambda c, i: (c.db_path, c.today)),
+        Case(reporting.list_passes_expiring, lambda c, i: (c.db_path, c.today, _shift(c.today, 7))),
+        Case(reporting.list_clients_without_active_pass, lambda c, i: (c.db_path, c.today)),
+        Case(reporting.get_report_snapshot, lambda c, i: (c.db_path, c.month_from, c.today, c.today, 7)),
+        Case(reporting.build_excel_report, lambda c, i: (c.db_path, c.month_from, c.today, c.today, 7)),
+        Case(reporting.build_excel_report, lambda c, i: (c.db_path, c.year_from, c.today, c.today, 7)),
+    ]
+    writes = [
+        Case(db.save_report_file_id, lambda c, i: (c.db_path, c.month_from, c.today, c.today, 7, i, f"file-{i}")),
+        Case(db.save_fsm_states, lambda c, i: (c.db_path, [(f"bench:{i}", "Bench:state", b"\x00", time.time())], 0)),
+        Case(db.upsert_admin, lambda c, i: (c.db_path, OWNER_ID + 100 + i, f"Бенч {i}")),
+        Case(db.deactivate_admin, lambda c, i: (c.db_path, OWNER_ID + 100)),
+        Case(db.set_admin_active, lambda c, i: (c.db_path, OWNER_ID + 1, True)),
+        Case(db.create_trainer, lambda c, i: (c.db_path, f"Бенч Тренер {i}")),
+        Case(db.update_trainer_name, lambda c, i: (c.db_path, c.trainer_id, f"Тренер {i}")),
+        Case(db.set_trainer_active, lambda c, i: (c.db_path, c.trainer_id, True)),
+        Case(db.create_group, lambda c, i: (c.db_path, f"Бенч {i}", None, 12, None, 1, c.trainer_id)),
+        Case(db.rename_group, lambda c, i: (c.db_path, c.group_id, f"Бенч {i}")),
+        Case(db.set_group_active, lambda c, i: (c.db_path, c.group_id, True)),
+        # Clearing first leaves the group with its trainer once both cases ran.
+        Case(db.clear_group_trainer, lambda c, i: (c.db_path, c.group_id)),
+        Case(db.set_group_trainer, lambda c, i: (c.db_path, c.group_id, c.trainer_id)),
+        Case(db.add_schedule_slot, lambda c, i: (c.db_path, c.group_id, 7, f"{i // 60 % 24:02d}:{i % 60:02d}")),
+        Case(db.update_schedule_slot, lambda c, i: (c.db_path, c.schedule_id, None, None, 60 + i % 30)),
+        Case(db.toggle_schedule_slot, lambda c, i: (c.db_path, c.schedule_id, True)),
+        Case(db.delete_schedule_slot, lambda c, i: (c.db_path, db.add_schedule_slot(c.db_path, c.group_id, 6, "23:59"))),
+        Case(db.create_expense_category, lambda c, i: (c.db_path, f"Бенч {i}")),
+        Case(db.rename_expense_category, lambda c, i: (c.db_path, c.category_id, f"Бенч Аренда {i}")),
+        Case(db.set_expense_category_active, lambda c, i: (c.db_path, c.category_id, True)),
+        Case(db.create_client, lambda c, i: (c.db_path, f"Бенч Клиент {i}", f"+7000{i:07d}", None, None, None, None)),
+        Case(db.create_pass, lambda c, i: (c.db_path, c.client_id, c.group_id, c.year_from, c.month_from, 0, 4000)),
+        Case(db.issue_pass, lambda c, i: (c.db_path, c.client_id, c.group_id, c.year_from, c.month_from, 0, 4000)),
+        Case(db.upsert_client_group_active, lambda c, i: (c.db_path, c.client_id, c.group_id)),
+        Case(db.create_single_visit_booked, lambda c, i: (c.db_path, _shift(c.today, i + 1), c.group_id, c.client_id, OWNER_ID)),
+        Case(db.get_or_create_single_visit, lambda c, i: (c.db_path, c.client_id, c.group_id, _shift(c.today, i + 1), OWNER_ID)),
+        Case(db.upsert_visit_status, lambda c, i: (c.db_path, c.today, c.group_id, c.client_id, "attended", OWNER_ID)),
+        Case(db.upsert_visit_statuses, lambda c, i: (c.db_path, _shift(c.today, 1), c.group_id, [(c.client_id, "booked")], OWNER_ID)),
+        Case(
+            db.create_payment_single,
+            lambda c, i: (c.db_path, c.client_id, c.group_id, c.visit_id, 500, "cash", "paid", None, OWNER_ID),
+        ),
+        Case(
+            db.create_payment_pass,
+            lambda c, i: (c.db_path, c.client_id, c.group_id, c.pass_id, 4000, "qr", "paid", None, OWNER_ID),
+        ),
+        Case(
+            db.close_deferred_payment,
+            lambda c, i: (
+                c.db_path,
+                db.create_payment_single(
+                    c.db_path, c.client_id, c.group_id, c.visit_id, 500, "defer", "deferred", None, OWNER_ID
+                ),
+                "cash",
+                c.today,
+                OWNER_ID,
+            ),
+        ),
+        Case(db.create_expense, lambda c, i: (c.db_path, c.today, c.category_id, 1000 + i, "cash", None, OWNER_ID)),
+        Case(db.update_expense, lambda c, i: (c.db_path, c.expense_id, None, None, 2000 + i)),
+        Case(
+            db.delete_expense,
+            lambda c, i: (c.db_path, db.create_expense(c.db_path, c.today, c.category_id, 1, "cash", None, OWNER_ID)),
+        ),
+    ]
+    return reads + writes
+
+
+def _shift(day: str, days: int) -> str:
+    return (date.fromisoformat(day) + timedelta(days=days)).isoformat()
+
+
+def _public_functions() -> List[str]:
+    names = []
+    for module in (db, reporting):
+        for name, func in inspect.getmembers(module, inspect.isfunction):
+            if func.__module__ == module.__name__ and not name.startswith("_") and name not in NOT_BENCHMARKED:
+                names.append(f"{module.__name__}.{name}")
+    return sorted(names)
+
+
+def _context(db_path: str) -> Context:
+    with connection(db_path) as conn:
+        today = conn.execute("SELECT MAX(visit_date) FROM visits").fetchone()[0]
+        # The busiest group and its most regular member stand in for the
+        # typical attendance screen.
+        group_id = conn.execute(
+            "SELECT group_id FROM client_groups WHERE status = 'active' GROUP BY group_id ORDER BY COUNT(*) DESC, group_id LIMIT 1"
+        ).fetchone()[0]
+        client_id, phone = conn.execute(
+            """
+            SELECT c.client_id, c.phone
+            FROM visits v JOIN clients c ON c.client_id = v.client_id
+            WHERE v.group_id = ?
+            GROUP BY c.client_id ORDER BY COUNT(*) DESC, c.client_id LIMIT 1
+            """,
+            (group_id,),
+        ).fetchone()
+        surname = conn.execute("SELECT full_name FROM clients WHERE client_id = ?", (client_id,)).fetchone()[0]
+        return Context(
+            db_path=db_path,
+            today=today,
+            month_from=_shift(today, -29),
+            year_from=_shift(today, -364),
+            client_id=client_id,
+            phone=phone,
+            tg_username=conn.execute(
+                "SELECT tg_username FROM clients WHERE tg_username IS NOT NULL ORDER BY client_id LIMIT 1"
+            ).fetchone()[0],
+            group_id=group_id,
+            trainer_id=conn.execute("SELECT trainer_id FROM groups WHERE group_id = ?", (group_id,)).fetchone()[0],
+            schedule_id=conn.execute("SELECT MIN(schedule_id) FROM schedule WHERE group_id = ?", (group_id,)).fetchone()[0],
+            visit_id=conn.execute(
+                "SELECT MAX(visit_id) FROM visits WHERE group_id = ? AND client_id = ?", (group_id, client_id)
+            ).fetchone()[0],
+            pass_id=conn.execute(
+                "SELECT MAX(pass_id) FROM passes WHERE group_id = ? AND client_id = ?", (group_id, client_id)
+            ).fetchone()[0],
+            pay_id=conn.execute("SELECT MAX(pay_id) FROM payments WHERE client_id = ?", (client_id,)).fetchone()[0],
+            category_id=conn.execute("SELECT MIN(category_id) FROM expense_categories").fetchone()[0],
+            expense_id=conn.execute("SELECT MAX(expense_id) FROM expenses").fetchone()[0],
+            surname=surname.split()[-1],
+        )
+
+
+class _Work:
+    def __init__(self) -> None:
+        self.statements = 0
+        self.rows = 0
+        self.vm_steps = 0
+
+    def __call__(self, stats: QueryStats) -> None:
+        self.statements += 1
+        self.rows += stats.rows
+
+    def step(self) -> int:
+        self.vm_steps += VM_STEP_GRANULARITY
+        return 0
+
+
+def _percentile(timings: List[float], fraction: float) -> float:
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def _run_case(case: Case, ctx: Context, min_runs: int, budget: float) -> Dict[str, Any]:
+    counter = [0]
+
+    def next_args() -> tuple:
+        args = case.args(ctx, counter[0])
+        counter[0] += 1
+        return args
+
+    case.func(*next_args())
+    # Work and allocations are measured on their own calls, before the timed
+    # ones, so the tracing overhead stays out of the latency numbers and write
+    # cases see the same data state on every run.
+    args = next_args()
+    work = _Work()
+    with connection(ctx.db_path) as conn:
+        conn.set_progress_handler(work.step, VM_STEP_GRANULARITY)
+    add_query_observer(work)
+    try:
+        case.func(*args)
+    finally:
+        remove_query_observer(work)
+        with connection(ctx.db_path) as conn:
+            conn.set_progress_handler(None, VM_STEP_GRANULARITY)
+
+    args = next_args()
+    tracemalloc.start()
+    try:
+        baseline_bytes = tracemalloc.get_traced_memory()[0]
+        case.func(*args)
+        current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    timings: List[float] = []
+    started = time.perf_counter()
+    while len(timings) < min_runs or (time.perf_counter() - started < budget and len(timings) < 1000):
+        args = next_args()
+        begin = time.perf_counter()
+        case.func(*args)
+        timings.append(time.perf_counter() - begin)
+    return {
+        "runs": len(timings),
+        "p50_ms": round(statistics.median(timings) * 1000, 4),
+        "p95_ms": round(_percentile(timings, 0.95) * 1000, 4),
+        "statements": work.statements,
+        "rows": work.rows,
+        "vm_steps": work.vm_steps,
+        "alloc_peak_kib": round((peak_bytes - baseline_bytes) / 1024, 1),
+        "alloc_retained_kib": round((current_bytes - baseline_bytes) / 1024, 1),
+    }
+
+
+def run_size(size: str, seed: int, min_runs: int, budget: float, only: Optional[str]) -> Dict[str, Dict[str, Any]]:
+    source = cached_dataset(size, seed)
+    results: Dict[str, Dict[str, Any]] = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "bench.sqlite")
+        shutil.copyfile(source, db_path)
+        # Connections opened while an observer is registered stay instrumented;
+        # with no observer attached they take the plain path.
+        opener = _Work()
+        add_query_observer(opener)
+        try:
+            ctx = _context(db_path)
+        finally:
+            remove_query_observer(opener)
+        seen: Dict[str, int] = {}
+        for case in _cases():
+            if only and only not in case.name:
+                continue
+            seen[case.name] = seen.get(case.name, 0) + 1
+            label = case.name if seen[case.name] == 1 else f"{case.name}#{seen[case.name]}"
+            results[label] = _run_case(case, ctx, min_runs, budget)
+            row = results[label]
+            print(
+                f"{size:<7} {label:<45} p50 {row['p50_ms']:9.3f} ms  p95 {row['p95_ms']:9.3f} ms  "
+                f"rows {row['rows']:7d}  vm {row['vm_steps']:10d}  alloc {row['alloc_peak_kib']:9.1f} KiB",
+                file=sys.stderr,
+            )
+        close_all_pools()
+    return results
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    regressions = []
+    for size, cases in current["results"].items():
+        for name, row in cases.items():
+            before = baseline.get("results", {}).get(size, {}).get(name)
+            if before is None:
+                continue
+            if (
+                row["p50_ms"] > before["p50_ms"] * LATENCY_TOLERANCE
+                and row["p50_ms"] - before["p50_ms"] > LATENCY_NOISE_FLOOR_MS
+            ):
+                regressions.append(f"{size} {name}: p50 {before['p50_ms']:.3f} -> {row['p50_ms']:.3f} ms")
+            if row["vm_steps"] > max(before["vm_steps"] * VM_STEPS_TOLERANCE, before["vm_steps"] + VM_STEP_GRANULARITY):
+                regressions.append(f"{size} {name}: vm steps {before['vm_steps']} -> {row['vm_steps']}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark db.py and reporting.py against synthetic datasets")
+    parser.add_argument("--sizes", nargs="+", choices=sorted(SIZES), default=["tiny", "small"])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--min-runs", type=int, default=20)
+    parser.add_argument("--budget", type=float, default=1.0, help="seconds of timed calls per case")
+    parser.add_argument("--only", help="run only cases whose name contains this text")
+    parser.add_argument("--json", dest="json_path", help="write results to this file ('-' for stdout)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="overwrite the baseline with these results")
+    args = parser.parse_args()
+
+    current = {
+        "meta": {
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "machine": platform.machine(),
+            "seed": args.seed,
+            "vm_step_granularity": VM_STEP_GRANULARITY,
+        },
+        "results": {size: run_size(size, args.seed, args.min_runs, args.budget, args.only) for size in args.sizes},
+    }
+    if not args.only:
+        covered = {name.split("#")[0] for cases in current["results"].values() for name in cases}
+        missing = [name for name in _public_functions() if name not in covered]
+        if missing:
+            print("not benchmarked: " + ", ".join(missing), file=sys.stderr)
+
+    if args.json_path == "-":
+        json.dump(current, sys.stdout, indent=2, ensure_ascii=False)
+        print()
+    elif args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as handle:
+            json.dump(current, handle, indent=2, ensure_ascii=False)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as handle:
+            json.dump(current, handle, indent=2, ensure_ascii=False)
+        print(f"baseline saved to {args.baseline}", file=sys.stderr)
+        return
+    if not os.path.exists(args.baseline):
+        print(f"no baseline at {args.baseline}; run with --save-baseline to create one", file=sys.stderr)
+        return
+    with open(args.baseline, encoding="utf-8") as handle:
+        regressions = compare(current, json.load(handle))
+    if regressions:
+        print("regressions against baseline:", file=sys.stderr)
+        for line in regressions:
+            print(f"  {line}", file=sys.stderr)
+        sys.exit(1)
+    print("no regressions against baseline", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
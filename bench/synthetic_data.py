@@ -0,0 +1,471 @@
+import argparse
+import calendar
+import os
+import random
+import sys
+import time
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
+SRC_PATH = os.path.join(PROJECT_ROOT, "app", "src")
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+from db import (
+    add_schedule_slot,
+    create_client,
+    create_expense,
+    create_expense_category,
+    create_group,
+    create_pass,
+    create_trainer,
+    get_visit_by_date_group_client,
+    init_db,
+    transaction,
+    upsert_admin,
+    upsert_client_group_active,
+    upsert_visit_statuses,
+)
+from db_pool import close_all_pools, connection
+
+
+@dataclass(frozen=True)
+class DatasetSize:
+    clients: int
+    groups: int
+    trainers: int
+    years: int
+
+
+SIZES = {
+    "tiny": DatasetSize(clients=300, groups=6, trainers=3, years=1),
+    "small": DatasetSize(clients=3000, groups=30, trainers=8, years=2),
+    "medium": DatasetSize(clients=15000, groups=120, trainers=25, years=3),
+    "school": DatasetSize(clients=50000, groups=300, trainers=60, years=5),
+}
+
+DATA_DIR = os.path.join(CURRENT_DIR, ".data")
+# Fixed so a seed always produces the same database; override with --end-date.
+DEFAULT_END_DATE = date(2025, 12, 31)
+OWNER_ID = 1000
+
+FEMALE_NAMES = [
+    ("Анна", "anna"), ("Мария", "maria"), ("Елена", "elena"), ("Ольга", "olga"), ("Наталья", "natalia"),
+    ("Екатерина", "katya"), ("Татьяна", "tanya"), ("Ирина", "irina"), ("Юлия", "yulia"), ("Светлана", "sveta"),
+    ("Дарья", "dasha"), ("Алина", "alina"), ("Полина", "polina"), ("Виктория", "vika"), ("София", "sofia"),
+    ("Ксения", "ksenia"), ("Вероника", "veronika"), ("Алёна", "alena"), ("Кристина", "kristina"), ("Милана", "milana"),
+]
+MALE_NAMES = [
+    ("Александр", "sasha"), ("Дмитрий", "dima"), ("Максим", "max"), ("Иван", "ivan"), ("Артём", "artem"),
+    ("Никита", "nikita"), ("Михаил", "misha"), ("Егор", "egor"), ("Андрей", "andrey"), ("Илья", "ilya"),
+    ("Кирилл", "kirill"), ("Роман", "roma"), ("Денис", "denis"), ("Тимур", "timur"), ("Марк", "mark"),
+]
+SURNAMES = [
+    "Иванов", "Смирнов", "Кузнецов", "Попов", "Васильев", "Петров", "Соколов", "Михайлов", "Новиков",
+    "Фёдоров", "Морозов", "Волков", "Алексеев", "Лебедев", "Семёнов", "Егоров", "Павлов", "Козлов",
+    "Степанов", "Николаев", "Орлов", "Андреев", "Макаров", "Никитин", "Захаров", "Зайцев", "Соловьёв",
+    "Борисов", "Яковлев", "Григорьев", "Романов", "Воробьёв", "Сергеев", "Кузьмин", "Фролов",
+    "Александров", "Дмитриев", "Королёв", "Гусев", "Киселёв", "Ильин", "Максимов", "Поляков",
+    "Сорокин", "Виноградов", "Ковалёв", "Белов", "Медведев", "Антонов", "Тарасов", "Жуков",
+    "Баранов", "Филиппов", "Комаров", "Давыдов", "Беляев", "Герасимов", "Богданов", "Осипов",
+    "Сидоров", "Матвеев", "Титов", "Марков", "Миронов", "Крылов", "Куликов", "Карпов",
+    "Вишневский", "Покровский", "Островский",
+]
+STYLES = [
+    "Хип-хоп", "Джаз-фанк", "Контемп", "Балет", "Стретчинг", "Латина", "Вог", "Брейк-данс", "Хай хилс",
+    "Танцевальный микс", "Бачата", "Сальса", "Тверк", "Дэнсхолл", "Модерн", "Восточные танцы",
+]
+LEVELS = ["Начинающие", "Продолжающие", "Профи", "Дети 5-7", "Дети 8-11", "Подростки"]
+ROOMS = ["Зал 1", "Зал 2", "Зал 3", "Малый зал", "Большой зал", "Зеркальный зал"]
+TIMES = ["10:00", "11:00", "12:00", "17:00", "18:00", "18:30", "19:00", "19:30", "20:00", "21:00"]
+EXPENSE_CATEGORIES = ["Аренда", "Зарплата тренерам", "Реклама", "Хозтовары", "Коммунальные услуги", "Ремонт"]
+MISC_EXPENSES = [("Реклама", 2000, 15000), ("Хозтовары", 300, 4000), ("Ремонт", 1000, 30000)]
+PAYMENT_METHODS = (("cash", "transfer", "qr"), (30, 40, 30))
+
+# A member's session turns into: attended / noshow / cancelled / nothing recorded.
+ATTENDANCE_WEIGHTS = (78, 12, 5, 5)
+# A visit without a pass is paid on the spot / deferred / never paid.
+SINGLE_PAYMENT_WEIGHTS = (80, 12, 8)
+PASS_COVERAGE = 0.92
+DEFERRED_PASS_SHARE = 0.06
+DEFERRAL_CLOSED_SHARE = 0.85
+
+
+@dataclass
+class _Membership:
+    client_id: int
+    group_id: int
+    start: date
+    end: date
+
+
+def _surname(rng: random.Random, female: bool) -> str:
+    surname = rng.choice(SURNAMES)
+    if not female:
+        return surname
+    if surname.endswith("ский"):
+        return surname[:-2] + "ая"
+    return surname + "а"
+
+
+def _birth_date(rng: random.Random, today: date) -> Optional[str]:
+    if rng.random() < 0.3:
+        return None
+    bucket = rng.choices((0, 1, 2), weights=(35, 60, 5))[0]
+    age = (rng.randint(5, 16), rng.randint(18, 45), rng.randint(46, 65))[bucket]
+    born = today - timedelta(days=age * 365 + rng.randint(0, 364))
+    return born.isoformat()
+
+
+def _month_end(day: date) -> date:
+    return day.replace(day=calendar.monthrange(day.year, day.month)[1])
+
+
+def _pick_method(rng: random.Random) -> str:
+    return rng.choices(*PAYMENT_METHODS)[0]
+
+
+class _PaymentWriter:
+    # Payments are inserted in bulk with their historical dates; the db.py
+    # helpers stamp date('now'), which would put all history on one day.
+    def __init__(self, db_path: str, rng: random.Random, end: date) -> None:
+        self.db_path = db_path
+        self.rng = rng
+        self.end = end
+        self.rows: List[tuple] = []
+        self.count = 0
+
+    def add(
+        self,
+        day: date,
+        client_id: int,
+        group_id: int,
+        amount: int,
+        purpose: str,
+        deferred: bool,
+        pass_id: Optional[int] = None,
+        visit_id: Optional[int] = None,
+    ) -> None:
+        created_at = f"{day.isoformat()} {self.rng.randint(9, 21):02d}:{self.rng.randint(0, 59):02d}:00"
+        method, status, pay_date, due_date = _pick_method(self.rng), "paid", day, None
+        if deferred:
+            due_date = day + timedelta(days=self.rng.choice((3, 7, 10, 14)))
+            closed_on = day + timedelta(days=self.rng.randint(1, 21))
+            if self.rng.random() < DEFERRAL_CLOSED_SHARE and closed_on <= self.end:
+                pay_date = closed_on
+            else:
+                method, status = "defer", "deferred"
+        self.rows.append(
+            (
+                pay_date.isoformat(),
+                client_id,
+                group_id,
+                pass_id,
+                visit_id,
+                amount,
+                method,
+                status,
+                purpose,
+                due_date.isoformat() if due_date else None,
+                OWNER_ID,
+                created_at,
+                day.isoformat(),
+            )
+        )
+
+    def flush(self) -> None:
+        if not self.rows:
+            return
+        with connection(self.db_path) as conn:
+            conn.executemany(
+                """
+                INSERT INTO payments(
+                  pay_date, client_id, group_id, pass_id, visit_id, amount, method, status, purpose,
+                  due_date, accepted_by, created_at, created_date
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                self.rows,
+            )
+        self.count += len(self.rows)
+        self.rows = []
+
+
+def _create_staff_and_groups(
+    db_path: str, rng: random.Random, size: DatasetSize
+) -> Tuple[List[int], Dict[int, int], Dict[int, List[int]]]:
+    for index in range(3):
+        upsert_admin(db_path, OWNER_ID + index + 1, f"Администратор {index + 1}")
+    trainer_ids = []
+    for _ in range(size.trainers):
+        female = rng.random() < 0.7
+        first, _latin = rng.choice(FEMALE_NAMES if female else MALE_NAMES)
+        trainer_ids.append(create_trainer(db_path, f"{first} {_surname(rng, female)}"))
+
+    group_ids: List[int] = []
+    group_prices: Dict[int, int] = {}
+    weekday_groups: Dict[int, List[int]] = {weekday: [] for weekday in range(1, 8)}
+    rooms = ROOMS[: max(2, min(len(ROOMS), size.groups // 20 + 2))]
+    for index in range(size.groups):
+        style = STYLES[index % len(STYLES)]
+        level = rng.choice(LEVELS)
+        room = rng.choice(rooms)
+        group_id = create_group(
+            db_path,
+            f"{style} {level} #{index // len(STYLES) + 1}",
+            capacity=rng.randint(8, 20),
+            room_name=room,
+            trainer_id=rng.choice(trainer_ids),
+        )
+        group_ids.append(group_id)
+        group_prices[group_id] = rng.choice((3000, 3500, 4000, 4500, 5000, 6000))
+        slots = rng.choices((2, 3), weights=(70, 30))[0]
+        weekdays = sorted(rng.sample(range(1, 7) if rng.random() < 0.9 else range(1, 8), slots))
+        start_time = rng.choice(TIMES)
+        for weekday in weekdays:
+            add_schedule_slot(db_path, group_id, weekday, start_time, 60, room)
+            weekday_groups[weekday].append(group_id)
+    return group_ids, group_prices, weekday_groups
+
+
+def _create_clients(
+    db_path: str, rng: random.Random, size: DatasetSize, start: date, end: date, group_ids: List[int]
+) -> Tuple[List[int], List[_Membership]]:
+    # Popularity follows a Zipf-like curve: a few groups are always full,
+    # the tail is half-empty.
+    popularity = [1 / (rank + 1) ** 0.6 for rank in range(len(group_ids))]
+    ranked_groups = group_ids[:]
+    rng.shuffle(ranked_groups)
+    span = (end - start).days
+    client_ids: List[int] = []
+    memberships: List[_Membership] = []
+    for index in range(size.clients):
+        female = rng.random() < 0.75
+        first, latin = rng.choice(FEMALE_NAMES if female else MALE_NAMES)
+        username = f"{latin}_{index}" if rng.random() < 0.6 else None
+        client_id = create_client(
+            db_path,
+            f"{first} {_surname(rng, female)}",
+            f"+79{(index * 7919 + 1000003) % 10**9:09d}",
+            None,
+            username,
+            _birth_date(rng, end),
+            None,
+        )
+        client_ids.append(client_id)
+        if rng.random() < 0.15:
+            continue
+        # Later join dates are more likely: the school grows over time.
+        joined = start + timedelta(days=int(span * rng.random() ** 0.8))
+        for group_id in set(rng.choices(ranked_groups, weights=popularity, k=rng.choices((1, 2, 3), (70, 25, 5))[0])):
+            months = 1
+            while rng.random() > 1 / 8:
+                months += 1
+            left = min(end, joined + timedelta(days=30 * months))
+            memberships.append(_Membership(client_id, group_id, joined, left))
+    memberships.sort(key=lambda item: (item.start, item.client_id, item.group_id))
+    return client_ids, memberships
+
+
+def _create_passes(
+    db_path: str,
+    rng: random.Random,
+    memberships: List[_Membership],
+    group_prices: Dict[int, int],
+    end: date,
+    payments: _PaymentWriter,
+) -> Dict[Tuple[int, int], List[Tuple[date, date]]]:
+    covered: Dict[Tuple[int, int], List[Tuple[date, date]]] = {}
+    for membership in memberships:
+        key = (membership.client_id, membership.group_id)
+        month_start = membership.start.replace(day=1)
+        while month_start <= membership.end:
+            pass_start = max(month_start, membership.start)
+            pass_end = _month_end(month_start)
+            if rng.random() < PASS_COVERAGE:
+                # Only the pass that is still running stays active, matching the
+                # one-active-pass-per-group rule.
+                is_active = 1 if pass_end >= end and membership.end >= end else 0
+                pass_id = create_pass(
+                    db_path,
+                    membership.client_id,
+                    membership.group_id,
+                    pass_start.isoformat(),
+                    pass_end.isoformat(),
+                    is_active,
+                    group_prices[membership.group_id],
+                )
+                covered.setdefault(key, []).append((pass_start, pass_end))
+                payments.add(
+                    pass_start,
+                    membership.client_id,
+                    membership.group_id,
+                    group_prices[membership.group_id],
+                    "pass",
+                    rng.random() < DEFERRED_PASS_SHARE,
+                    pass_id=pass_id,
+                )
+            month_start = pass_end + timedelta(days=1)
+        if membership.end >= end:
+            upsert_client_group_active(db_path, membership.client_id, membership.group_id)
+    payments.flush()
+    return covered
+
+
+def _has_pass(covered: Dict[Tuple[int, int], List[Tuple[date, date]]], client_id: int, group_id: int, day: date) -> bool:
+    return any(start <= day <= stop for start, stop in covered.get((client_id, group_id), ()))
+
+
+def _create_visits(
+    db_path: str,
+    rng: random.Random,
+    memberships: List[_Membership],
+    covered: Dict[Tuple[int, int], List[Tuple[date, date]]],
+    client_ids: List[int],
+    weekday_groups: Dict[int, List[int]],
+    group_prices: Dict[int, int],
+    start: date,
+    end: date,
+    payments: _PaymentWriter,
+) -> int:
+    by_group: Dict[int, List[_Membership]] = {}
+    for membership in memberships:
+        by_group.setdefault(membership.group_id, []).append(membership)
+    cursors = {group_id: 0 for group_id in by_group}
+    active: Dict[int, List[_Membership]] = {group_id: [] for group_id in by_group}
+    visits = 0
+    day = start
+    while day <= end:
+        with transaction(db_path):
+            for group_id in weekday_groups[day.isoweekday()]:
+                pending = by_group.get(group_id, [])
+                position = cursors.get(group_id, 0)
+                while position < len(pending) and pending[position].start <= day:
+                    active[group_id].append(pending[position])
+                    position += 1
+                cursors[group_id] = position
+                roster = [item for item in active.get(group_id, []) if item.end >= day]
+                active[group_id] = roster
+
+                statuses = []
+                for membership in roster:
+                    outcome = rng.choices(("attended", "noshow", "cancelled", None), ATTENDANCE_WEIGHTS)[0]
+                    if outcome is not None:
+                        statuses.append((membership.client_id, outcome))
+                if rng.random() < 0.3:
+                    statuses.append((rng.choice(client_ids), rng.choice(("attended", "attended", "booked"))))
+                statuses = list(dict(statuses).items())
+                visits += upsert_visit_statuses(db_path, day.isoformat(), group_id, statuses, OWNER_ID)
+
+                for client_id, status in statuses:
+                    if status not in ("attended", "booked") or _has_pass(covered, client_id, group_id, day):
+                        continue
+                    outcome = rng.choices(("paid", "deferred", None), SINGLE_PAYMENT_WEIGHTS)[0]
+                    if outcome is None:
+                        continue
+                    visit_id = get_visit_by_date_group_client(db_path, day.isoformat(), group_id, client_id)[0]
+                    amount = group_prices[group_id] // 6 // 100 * 100
+                    payments.add(day, client_id, group_id, amount, "single", outcome == "deferred", visit_id=visit_id)
+            payments.flush()
+        day += timedelta(days=1)
+    return visits
+
+
+def _create_expenses(db_path: str, rng: random.Random, trainer_count: int, start: date, end: date) -> int:
+    categories = {name: create_expense_category(db_path, name) for name in EXPENSE_CATEGORIES}
+    count = 0
+    month_start = start.replace(day=1)
+    while month_start <= end:
+        with transaction(db_path):
+            for room in ROOMS[: max(2, trainer_count // 10 + 2)]:
+                create_expense(
+                    db_path, month_start.isoformat(), categories["Аренда"], rng.randint(40, 120) * 1000,
+                    "transfer", room, OWNER_ID,
+                )
+                count += 1
+            payday = month_start.replace(day=5)
+            if payday <= end:
+                create_expense(
+                    db_path, payday.isoformat(), categories["Зарплата тренерам"],
+                    trainer_count * rng.randint(25, 45) * 1000, "transfer", None, OWNER_ID,
+                )
+                create_expense(
+                    db_path, payday.isoformat(), categories["Коммунальные услуги"], rng.randint(5, 25) * 1000,
+                    "transfer", None, OWNER_ID,
+                )
+                count += 2
+            last_day = min(_month_end(month_start), end)
+            for _ in range(rng.randint(2, 8)):
+                name, low, high = rng.choice(MISC_EXPENSES)
+                day = month_start + timedelta(days=rng.randint(0, (last_day - month_start).days))
+                create_expense(
+                    db_path, day.isoformat(), categories[name], rng.randint(low, high) // 10 * 10,
+                    rng.choice(("cash", "transfer", "qr")), None, OWNER_ID,
+                )
+                count += 1
+        month_start = _month_end(month_start) + timedelta(days=1)
+    return count
+
+
+def generate(db_path: str, size: DatasetSize, seed: int = 42, end: date = DEFAULT_END_DATE) -> Dict[str, int]:
+    rng = random.Random(seed)
+    start = end.replace(year=end.year - size.years) + timedelta(days=1)
+    init_db(db_path)
+    payments = _PaymentWriter(db_path, rng, end)
+    with transaction(db_path):
+        group_ids, group_prices, weekday_groups = _create_staff_and_groups(db_path, rng, size)
+        client_ids, memberships = _create_clients(db_path, rng, size, start, end, group_ids)
+        covered = _create_passes(db_path, rng, memberships, group_prices, end, payments)
+    visits = _create_visits(
+        db_path, rng, memberships, covered, client_ids, weekday_groups, group_prices, start, end, payments
+    )
+    expenses = _create_expenses(db_path, rng, size.trainers, start, end)
+    return {
+        "clients": len(client_ids),
+        "groups": len(group_ids),
+        "memberships": len(memberships),
+        "passes": sum(len(periods) for periods in covered.values()),
+        "visits": visits,
+        "payments": payments.count,
+        "expenses": expenses,
+    }
+
+
+def cached_dataset(size: str, seed: int = 42) -> str:
+    # Generated once per size/seed under bench/.data; callers copy the file
+    # before writing to it.
+    path = os.path.join(DATA_DIR, f"{size}-seed{seed}.sqlite")
+    if not os.path.exists(path):
+        os.makedirs(DATA_DIR, exist_ok=True)
+        partial = path + ".partial"
+        if os.path.exists(partial):
+            os.remove(partial)
+        print(f"generating {size} dataset...", file=sys.stderr)
+        generate(partial, SIZES[size], seed=seed)
+        close_all_pools()
+        os.replace(partial, path)
+    return path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fill a bot database with deterministic synthetic data")
+    parser.add_argument("db_path")
+    parser.add_argument("--size", choices=sorted(SIZES), default="small")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--end-date", type=date.fromisoformat, default=DEFAULT_END_DATE)
+    args = parser.parse_args()
+    if os.path.exists(args.db_path):
+        parser.error(f"{args.db_path} already exists")
+
+    started = time.perf_counter()
+    counts = generate(args.db_path, SIZES[args.size], seed=args.seed, end=args.end_date)
+    close_all_pools()
+    summary = ", ".join(f"{name} {value}" for name, value in counts.items())
+    print(f"{args.size} dataset (seed {args.seed}) in {time.perf_counter() - started:.1f} s: {summary}")
+
+
+if __name__ == "__main__":
+    main()
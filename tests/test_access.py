@@ -0,0 +1,102 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
+SRC_PATH = os.path.join(PROJECT_ROOT, "app", "src")
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+from config import Config
+from db import (
+    cached_active_admin_ids,
+    deactivate_admin,
+    init_db,
+    invalidate_admin_cache,
+    load_active_admin_ids,
+    set_admin_active,
+    upsert_admin,
+)
+from db_pool import close_pool, connection
+from middlewares import ROLE_ADMIN, ROLE_OWNER, AccessMiddleware, resolve_role
+
+
+class AccessCacheTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self._tmp_dir.name, "test.sqlite")
+        init_db(self.db_path)
+        self.config = Config(bot_token="x", owner_tg_user_id=1, db_path=self.db_path, tz="UTC")
+
+    def tearDown(self) -> None:
+        close_pool(self.db_path)
+        self._tmp_dir.cleanup()
+
+    def _role(self, tg_user_id):
+        return asyncio.run(resolve_role(self.config, tg_user_id))
+
+    def test_roles_follow_admin_writes(self) -> None:
+        self.assertEqual(self._role(1), ROLE_OWNER)
+        self.assertIsNone(self._role(42))
+        upsert_admin(self.db_path, 42, "Админ")
+        self.assertEqual(self._role(42), ROLE_ADMIN)
+        set_admin_active(self.db_path, 42, False)
+        self.assertIsNone(self._role(42))
+        set_admin_active(self.db_path, 42, True)
+        self.assertEqual(self._role(42), ROLE_ADMIN)
+        deactivate_admin(self.db_path, 42)
+        self.assertIsNone(self._role(42))
+
+    def test_cached_lookup_does_not_query_the_database(self) -> None:
+        upsert_admin(self.db_path, 42, "Админ")
+        self._role(42)
+        self.assertIsNotNone(cached_active_admin_ids(self.db_path))
+        statements = []
+        with connection(self.db_path) as conn:
+            conn.set_trace_callback(statements.append)
+            try:
+                for _ in range(10):
+                    self.assertEqual(self._role(42), ROLE_ADMIN)
+            finally:
+                conn.set_trace_callback(None)
+        self.assertEqual(statements, [])
+
+    def test_load_racing_an_invalidation_is_not_cached(self) -> None:
+        upsert_admin(self.db_path, 42, "Админ")
+
+        def invalidate_mid_load(statement: str) -> None:
+            if "FROM admins" in statement:
+                invalidate_admin_cache(self.db_path)
+
+        with connection(self.db_path) as conn:
+            conn.set_trace_callback(invalidate_mid_load)
+            try:
+                self.assertEqual(load_active_admin_ids(self.db_path), frozenset({42}))
+            finally:
+                conn.set_trace_callback(None)
+        self.assertIsNone(cached_active_admin_ids(self.db_path))
+        load_active_admin_ids(self.db_path)
+        self.assertEqual(cached_active_admin_ids(self.db_path), frozenset({42}))
+
+    def test_middleware_injects_role_once_per_update(self) -> None:
+        upsert_admin(self.db_path, 42, "Админ")
+        middleware = AccessMiddleware()
+
+        async def handler(event, data):
+            return data["role"]
+
+        async def roles():
+            return [
+                await middleware(handler, None, {"config": self.config, "event_from_user": user})
+                for user in (SimpleNamespace(id=1), SimpleNamespace(id=42), SimpleNamespace(id=7), None)
+            ]
+
+        self.assertEqual(asyncio.run(roles()), [ROLE_OWNER, ROLE_ADMIN, None, None])
+
+
+if __name__ == "__main__":
+    unittest.main()
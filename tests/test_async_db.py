@@ -0,0 +1,37 @@
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
+SRC_PATH = os.path.join(PROJECT_ROOT, "app", "src")
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+from async_db import create_group, init_db, list_active_groups, run_db
+
+
+class AsyncDbTests(unittest.TestCase):
+    def test_wrappers_run_off_the_event_loop_thread(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = os.path.join(tmp_dir, "test.sqlite")
+
+            async def scenario():
+                loop_thread = threading.get_ident()
+                worker_thread = await run_db(threading.get_ident)
+                await init_db(db_path)
+                await create_group(db_path, "Хип-хоп", capacity=10)
+                groups = await list_active_groups(db_path)
+                return loop_thread, worker_thread, groups
+
+            loop_thread, worker_thread, groups = asyncio.run(scenario())
+
+            self.assertNotEqual(loop_thread, worker_thread)
+            self.assertEqual([row[1] for row in groups], ["Хип-хоп"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
+SRC_PATH = os.path.join(PROJECT_ROOT, "app", "src")
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+from db_pool import ConnectionPool, PoolTimeoutError
+
+
+class ConnectionPoolTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self._tmp_dir.name, "test.sqlite")
+
+    def tearDown(self) -> None:
+        self._tmp_dir.cleanup()
+
+    def test_connection_is_reused_and_nested_on_same_thread(self) -> None:
+        pool = ConnectionPool(self.db_path, size=2)
+        with pool.connection() as outer:
+            with pool.connection() as inner:
+                self.assertIs(outer, inner)
+        with pool.connection() as again:
+            self.assertIs(outer, again)
+        pool.close()
+
+    def test_commit_on_success_and_rollback_on_error(self) -> None:
+        pool = ConnectionPool(self.db_path, size=1)
+        with pool.connection() as conn:
+            conn.execute("CREATE TABLE t (x INTEGER)")
+            conn.execute("INSERT INTO t VALUES (1)")
+        with self.assertRaises(ValueError):
+            with pool.connection() as conn:
+                conn.execute("INSERT INTO t VALUES (2)")
+                raise ValueError("boom")
+        with pool.connection() as conn:
+            rows = conn.execute("SELECT x FROM t").fetchall()
+        self.assertEqual(rows, [(1,)])
+        pool.close()
+
+    def test_acquire_times_out_when_exhausted(self) -> None:
+        pool = ConnectionPool(self.db_path, size=1, acquire_timeout=0.05)
+        held = threading.Event()
+        release = threading.Event()
+
+        def worker() -> None:
+            with pool.connection():
+                held.set()
+                release.wait(5)
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        held.wait(5)
+        with self.assertRaises(PoolTimeoutError):
+            with pool.connection():
+                pass
+        release.set()
+        thread.join()
+        pool.close()
+
+    def test_broken_connection_is_replaced_by_health_check(self) -> None:
+        pool = ConnectionPool(self.db_path, size=1, health_check_interval=0)
+        with pool.connection() as conn:
+            first = conn
+        first.close()
+        with pool.connection() as conn:
+            self.assertIsNot(conn, first)
+            self.assertEqual(conn.execute("SELECT 1").fetchone(), (1,))
+        pool.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -9,7 +9,8 @@ SRC_PATH = os.path.join(PROJECT_ROOT, "app", "src")
 if SRC_PATH not in sys.path:
     sys.path.insert(0, SRC_PATH)
 
-from db import create_client, init_db, search_clients_by_name
+from db import create_client, init_db, search_clients_by_name, search_clients_fuzzy
+from db_pool import close_pool
 
 
 class SearchClientsByNameTests(unittest.TestCase):
@@ -36,5 +37,59 @@ class SearchClientsByNameTests(unittest.TestCase):
             self.assertEqual(results_upper[0][1], "Анна")
 
 
+class ClientSearchIndexTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self._tmp_dir.name, "test.sqlite")
+        init_db(self.db_path)
+
+    def tearDown(self) -> None:
+        close_pool(self.db_path)
+        self._tmp_dir.cleanup()
+
+    def _create_clients(self, names, phone_prefix: str) -> None:
+        for index, name in enumerate(names):
+            create_client(
+                self.db_path,
+                full_name=name,
+                phone=f"{phone_prefix}{index}",
+                tg_user_id=None,
+                tg_username=None,
+                birth_date=None,
+                comment=None,
+            )
+
+    def test_search_clients_by_name_substring_order_and_limit(self) -> None:
+        self._create_clients(["Мария Петрова", "Анна Петрова", "Пётр Иванов", "Борис Петров"], "+7000000000")
+
+        results = search_clients_by_name(self.db_path, "ПЕТРОВ")
+        short_results = search_clients_by_name(self.db_path, "пё")
+        limited = search_clients_by_name(self.db_path, "петров", limit=2)
+
+        self.assertEqual(
+            [row[1] for row in results],
+            ["Анна Петрова", "Борис Петров", "Мария Петрова"],
+        )
+        self.assertEqual([row[1] for row in short_results], ["Пётр Иванов"])
+        self.assertEqual([row[1] for row in limited], ["Анна Петрова", "Борис Петров"])
+
+    def test_search_clients_fuzzy_tolerates_typos_and_ranks_prefix_first(self) -> None:
+        self._create_clients(["Семёнова Алёна", "Петрова Анна", "Петров Борис", "Иванова Мария"], "+7912000000")
+
+        typo_results = search_clients_fuzzy(self.db_path, "Семенова Алена")
+        missing_letter = search_clients_fuzzy(self.db_path, "Петрва Анна")
+        prefix_results = search_clients_fuzzy(self.db_path, "петров")
+        phone_results = search_clients_fuzzy(self.db_path, "0000003")
+
+        self.assertEqual(search_clients_by_name(self.db_path, "Семенова"), [])
+        self.assertEqual(typo_results[0][1], "Семёнова Алёна")
+        self.assertEqual(missing_letter[0][1], "Петрова Анна")
+        self.assertEqual(
+            [row[1] for row in prefix_results[:2]],
+            ["Петров Борис", "Петрова Анна"],
+        )
+        self.assertEqual([row[1] for row in phone_results], ["Иванова Мария"])
+
+
 if __name__ == "__main__":
     unittest.main()
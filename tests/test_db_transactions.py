@@ -0,0 +1,84 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
+SRC_PATH = os.path.join(PROJECT_ROOT, "app", "src")
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+from db import create_client, create_group, create_pass, init_db, issue_pass, transaction, upsert_client_group_active
+from db_pool import close_pool
+
+
+class TransactionTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self._tmp_dir.name, "test.sqlite")
+        init_db(self.db_path)
+        self.client_id = create_client(self.db_path, "Анна", "+70000000000", None, None, None, None)
+        self.group_id = create_group(self.db_path, "Джаз")
+
+    def tearDown(self) -> None:
+        close_pool(self.db_path)
+        self._tmp_dir.cleanup()
+
+    def _count(self, table: str) -> int:
+        with sqlite3.connect(self.db_path) as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def test_issue_pass_writes_pass_and_membership(self) -> None:
+        issue_pass(self.db_path, self.client_id, self.group_id, "2024-05-01", "2024-05-31", 1)
+        self.assertEqual(self._count("passes"), 1)
+        self.assertEqual(self._count("client_groups"), 1)
+
+    def test_issue_pass_writes_payment_in_the_same_transaction(self) -> None:
+        pass_id = issue_pass(
+            self.db_path,
+            self.client_id,
+            self.group_id,
+            "2024-05-01",
+            "2024-05-31",
+            1,
+            payment_amount=3000,
+            payment_method="cash",
+            payment_status="paid",
+            accepted_by=1,
+        )
+        with sqlite3.connect(self.db_path) as conn:
+            payments = conn.execute("SELECT pass_id, amount, purpose FROM payments").fetchall()
+        self.assertEqual(payments, [(pass_id, 3000, "pass")])
+
+    def test_failed_payment_leaves_no_pass_or_membership(self) -> None:
+        with self.assertRaises(sqlite3.IntegrityError):
+            issue_pass(
+                self.db_path,
+                self.client_id,
+                self.group_id,
+                "2024-05-01",
+                "2024-05-31",
+                1,
+                payment_amount=3000,
+                payment_method="cash",
+                payment_status="unknown",
+                accepted_by=1,
+            )
+        self.assertEqual(self._count("passes"), 0)
+        self.assertEqual(self._count("client_groups"), 0)
+        self.assertEqual(self._count("payments"), 0)
+
+    def test_failure_rolls_back_every_step(self) -> None:
+        with self.assertRaises(RuntimeError):
+            with transaction(self.db_path):
+                create_pass(self.db_path, self.client_id, self.group_id, "2024-05-01", "2024-05-31", 1)
+                upsert_client_group_active(self.db_path, self.client_id, self.group_id)
+                raise RuntimeError("crash")
+        self.assertEqual(self._count("passes"), 0)
+        self.assertEqual(self._count("client_groups"), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
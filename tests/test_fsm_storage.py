@@ -0,0 +1,141 @@
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
+SRC_PATH = os.path.join(PROJECT_ROOT, "app", "src")
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+from aiogram.fsm.storage.base import StorageKey
+
+from db import init_db
+from db_pool import close_pool
+from fsm_storage import PRUNE_INTERVAL, SQLiteStorage
+
+KEY = StorageKey(bot_id=1, chat_id=10, user_id=10)
+
+
+class SQLiteStorageTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self._tmp_dir.name, "test.sqlite")
+        init_db(self.db_path)
+
+    def tearDown(self) -> None:
+        close_pool(self.db_path)
+        self._tmp_dir.cleanup()
+
+    def _rows(self):
+        with sqlite3.connect(self.db_path) as conn:
+            return conn.execute("SELECT storage_key, state FROM fsm_states").fetchall()
+
+    def test_updates_are_coalesced_and_survive_restart(self) -> None:
+        async def scenario():
+            storage = SQLiteStorage(self.db_path, flush_delay=60)
+            await storage.set_state(KEY, "Booking:group")
+            await storage.update_data(KEY, {"client_id": 5})
+            await storage.update_data(KEY, {"group_ids": [1, 2]})
+            before_flush = self._rows()
+            await storage.close()
+
+            restarted = SQLiteStorage(self.db_path)
+            state = await restarted.get_state(KEY)
+            data = await restarted.get_data(KEY)
+            await restarted.set_state(KEY, None)
+            await restarted.set_data(KEY, {})
+            await restarted.close()
+            return before_flush, state, data
+
+        before_flush, state, data = asyncio.run(scenario())
+
+        self.assertEqual(before_flush, [])
+        self.assertEqual(state, "Booking:group")
+        self.assertEqual(data, {"client_id": 5, "group_ids": [1, 2]})
+        self.assertEqual(self._rows(), [])
+
+    def test_handler_data_round_trips_through_json(self) -> None:
+        data = {
+            "pay_id": 7,
+            "deferred_map": {"#7 700 Разовое": 7},
+            "deferred_details": {"7": {"amount": 700, "purpose": "single", "group_name": None, "due_date": None}},
+            "client_ids": [3, 4],
+            "attendance_unchecked": [4],
+            "categories": [[1, "Аренда"]],
+        }
+
+        async def scenario():
+            storage = SQLiteStorage(self.db_path)
+            await storage.set_data(KEY, data)
+            await storage.close()
+            restarted = SQLiteStorage(self.db_path)
+            restored = await restarted.get_data(KEY)
+            await restarted.close()
+            return restored
+
+        restored = asyncio.run(scenario())
+
+        self.assertEqual(restored, data)
+        self.assertEqual(restored["deferred_details"][str(restored["pay_id"])]["amount"], 700)
+
+    def test_stale_states_expire(self) -> None:
+        async def scenario():
+            storage = SQLiteStorage(self.db_path, ttl=60)
+            await storage.set_state(KEY, "Booking:group")
+            await storage.close()
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute("UPDATE fsm_states SET updated_at = updated_at - 120")
+
+            restarted = SQLiteStorage(self.db_path, ttl=60)
+            state = await restarted.get_state(KEY)
+            await restarted.set_state(StorageKey(bot_id=1, chat_id=20, user_id=20), "Expense:amount")
+            await restarted.close()
+            return state
+
+        self.assertIsNone(asyncio.run(scenario()))
+        self.assertEqual([row[1] for row in self._rows()], ["Expense:amount"])
+
+    def test_undecodable_data_is_reset(self) -> None:
+        async def scenario():
+            storage = SQLiteStorage(self.db_path)
+            await storage.update_data(KEY, {"client_id": 5})
+            await storage.close()
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute("UPDATE fsm_states SET data = ?", (b"\xfb\x00marshal",))
+
+            restarted = SQLiteStorage(self.db_path)
+            first = await restarted.get_data(KEY)
+            state = await restarted.get_state(KEY)
+            await restarted.close()
+            return first, state
+
+        self.assertEqual(asyncio.run(scenario()), ({}, None))
+        self.assertEqual(self._rows(), [])
+
+    def test_keys_that_are_only_read_are_evicted(self) -> None:
+        other = StorageKey(bot_id=1, chat_id=20, user_id=20)
+
+        async def scenario():
+            storage = SQLiteStorage(self.db_path, ttl=60)
+            await storage.get_state(KEY)
+            cached_before = len(storage._records)
+            later = time.time() + max(PRUNE_INTERVAL, 60) + 1
+            with mock.patch("fsm_storage.time.time", return_value=later):
+                await storage.get_state(other)
+            return cached_before, list(storage._records)
+
+        cached_before, cached_after = asyncio.run(scenario())
+
+        self.assertEqual(cached_before, 1)
+        self.assertEqual(len(cached_after), 1)
+        self.assertIn("20", cached_after[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
+SRC_PATH = os.path.join(PROJECT_ROOT, "app", "src")
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from db import create_client, get_client_by_phone, init_db, search_clients_by_name
+from db_pool import QueryStats, add_query_observer, close_pool, remove_query_observer
+from metrics import Histogram, create_metrics_app, record_query
+
+
+class QueryInstrumentationTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self._tmp_dir.name, "test.sqlite")
+        self.queries = []
+        add_query_observer(self._observe)
+        init_db(self.db_path)
+
+    def tearDown(self) -> None:
+        remove_query_observer(self._observe)
+        close_pool(self.db_path)
+        self._tmp_dir.cleanup()
+
+    def _observe(self, stats: QueryStats) -> None:
+        self.queries.append((stats.caller, stats.rows))
+
+    def test_statements_are_attributed_to_calling_function(self) -> None:
+        create_client(self.db_path, "Анна", "+70000000000", None, None, None, None)
+        create_client(self.db_path, "Аня", "+70000000001", None, None, None, None)
+        self.queries.clear()
+
+        get_client_by_phone(self.db_path, "+70000000000")
+        search_clients_by_name(self.db_path, "ан")
+
+        self.assertIn(("db.get_client_by_phone", 1), self.queries)
+        self.assertIn(("db.search_clients_by_name", 2), self.queries)
+
+
+class MetricsEndpointTests(unittest.TestCase):
+    def test_histogram_buckets_are_cumulative(self) -> None:
+        histogram = Histogram("demo_seconds", "Demo.", ("flow",), buckets=(0.1, 1.0))
+        histogram.observe(("booking",), 0.05)
+        histogram.observe(("booking",), 0.5)
+
+        lines = histogram.render()
+
+        self.assertIn('demo_seconds_bucket{flow="booking",le="0.1"} 1', lines)
+        self.assertIn('demo_seconds_bucket{flow="booking",le="1"} 2', lines)
+        self.assertIn('demo_seconds_bucket{flow="booking",le="+Inf"} 2', lines)
+        self.assertIn('demo_seconds_count{flow="booking"} 2', lines)
+
+    def test_endpoint_serves_prometheus_text(self) -> None:
+        record_query(QueryStats(None, "db.test_endpoint", "SELECT 1", (), 0.002, 3))
+
+        async def scenario():
+            async with TestClient(TestServer(create_metrics_app())) as client:
+                response = await client.get("/metrics")
+                return response.status, await response.text()
+
+        status, body = asyncio.run(scenario())
+
+        self.assertEqual(status, 200)
+        self.assertIn('db_query_rows_total{caller="db.test_endpoint"} 3', body)
+        self.assertIn("# TYPE bot_handler_duration_seconds histogram", body)
+
+
+if __name__ == "__main__":
+    unittest.main()
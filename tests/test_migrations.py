@@ -0,0 +1,108 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
+SRC_PATH = os.path.join(PROJECT_ROOT, "app", "src")
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+from db import init_db, search_clients_by_name
+from db_pool import close_pool
+from migrations import LATEST_VERSION, MIGRATIONS, migrate
+
+
+class MigrationTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self._tmp_dir.name, "test.sqlite")
+
+    def tearDown(self) -> None:
+        close_pool(self.db_path)
+        self._tmp_dir.cleanup()
+
+    def test_fresh_database_is_migrated_to_latest_version(self) -> None:
+        init_db(self.db_path)
+        with sqlite3.connect(self.db_path) as conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+        self.assertEqual(version, LATEST_VERSION)
+
+    def test_current_schema_only_reads_user_version(self) -> None:
+        init_db(self.db_path)
+        statements = []
+        conn = sqlite3.connect(self.db_path)
+        conn.set_trace_callback(statements.append)
+        migrate(conn)
+        conn.close()
+        self.assertEqual(statements, ["PRAGMA user_version;"])
+
+    def test_legacy_database_is_upgraded_in_place(self) -> None:
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                """
+                CREATE TABLE schedule (
+                  schedule_id  INTEGER PRIMARY KEY AUTOINCREMENT,
+                  group_id     INTEGER NOT NULL,
+                  day_of_week  INTEGER NOT NULL,
+                  time_hhmm    TEXT NOT NULL,
+                  duration_min INTEGER NOT NULL,
+                  is_active    INTEGER NOT NULL DEFAULT 1
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE clients (
+                  client_id    INTEGER PRIMARY KEY AUTOINCREMENT,
+                  full_name    TEXT NOT NULL,
+                  phone        TEXT NOT NULL,
+                  tg_user_id   INTEGER,
+                  tg_username  TEXT,
+                  birth_date   TEXT,
+                  comment      TEXT,
+                  created_at   TEXT NOT NULL DEFAULT (datetime('now')),
+                  status       TEXT NOT NULL DEFAULT 'active'
+                )
+                """
+            )
+            conn.execute("INSERT INTO clients(full_name, phone) VALUES ('Анна', '+70000000000')")
+
+        init_db(self.db_path)
+
+        with sqlite3.connect(self.db_path) as conn:
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(schedule)")}
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+        self.assertTrue({"room_name", "valid_from", "valid_to", "created_at"} <= columns)
+        self.assertEqual(version, LATEST_VERSION)
+        self.assertEqual([row[1] for row in search_clients_by_name(self.db_path, "анн")], ["Анна"])
+
+    def test_payment_created_date_is_backfilled_and_filled_on_insert(self) -> None:
+        with sqlite3.connect(self.db_path) as conn:
+            for version, _description, step in MIGRATIONS[:7]:
+                step(conn)
+                conn.execute(f"PRAGMA user_version = {version}")
+            conn.execute(
+                """
+                INSERT INTO payments(amount, method, status, purpose, created_at)
+                VALUES (700, 'defer', 'deferred', 'single', '2024-05-01 23:30:00')
+                """
+            )
+
+        init_db(self.db_path)
+
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                """
+                INSERT INTO payments(amount, method, status, purpose, created_at)
+                VALUES (500, 'defer', 'deferred', 'single', '2024-05-02 08:00:00')
+                """
+            )
+            created_dates = [row[0] for row in conn.execute("SELECT created_date FROM payments ORDER BY pay_id")]
+        self.assertEqual(created_dates, ["2024-05-01", "2024-05-02"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,181 @@
+import os
+import re
+import sys
+import tempfile
+import unittest
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
+SRC_PATH = os.path.join(PROJECT_ROOT, "app", "src")
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+import db
+import reporting
+from db_pool import close_pool, connection
+
+# Reference tables stay a few dozen rows, so scanning them is cheaper than an
+# index lookup. "h" is the materialized ngram hits CTE in search_clients_fuzzy,
+# clients_search_config the one-row FTS5 config table.
+SCAN_ALLOWED = {
+    "admins",
+    "trainers",
+    "groups",
+    "expense_categories",
+    "schedule",
+    "report_files",
+    "h",
+    "clients_search_config",
+}
+# Queries shorter than a trigram cannot use the FTS index, so the one- and
+# two-letter name search scans clients_search on purpose.
+SCAN_ALLOWED_STATEMENTS = ("WHERE instr(s.name_folded,",)
+PLAN_STATEMENTS = ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT")
+# A virtual table scanned without an index string (no MATCH or rowid
+# constraint) reads every row, same as a plain table scan.
+FULL_SCAN = re.compile(r"^SCAN (?:\w+\.)?(\w+)(?: VIRTUAL TABLE INDEX \d+:)?$")
+
+
+def _run_workload(p: str) -> None:
+    db.upsert_admin(p, 10, "Админ")
+    db.set_admin_active(p, 10, True)
+    db.list_admins(p)
+    db.get_admin_by_tg_user_id(p, 10)
+    db.load_active_admin_ids(p)
+    db.deactivate_admin(p, 10)
+
+    client_id = db.create_client(p, "Анна Иванова", "+70000000000", None, "anna", None, None)
+    other_id = db.create_client(p, "Борис", "+70000000001", None, None, None, None)
+    db.get_client_by_phone(p, "+70000000000")
+    db.get_client_by_tg_username(p, "@anna")
+    db.get_client_by_id(p, client_id)
+    db.search_clients_by_name(p, "Анна")
+    db.search_clients_by_name(p, "Ан")
+    db.search_clients_fuzzy(p, "Ана Ивнова")
+
+    trainer_id = db.create_trainer(p, "Ольга")
+    db.list_active_trainers(p)
+    db.list_trainers(p, include_inactive=True)
+    db.get_trainer_by_id(p, trainer_id)
+    group_id = db.create_group(p, "Джаз", trainer_id=trainer_id)
+    db.list_active_groups(p)
+    db.list_groups(p, include_inactive=True)
+    db.get_group_by_id(p, group_id)
+    db.list_groups_by_trainer(p, trainer_id)
+    db.rename_group(p, group_id, "Джаз 2")
+    db.update_trainer_name(p, trainer_id, "Ольга П.")
+    db.set_trainer_active(p, trainer_id, True)
+    db.set_group_active(p, group_id, True)
+    db.clear_group_trainer(p, group_id)
+    db.set_group_trainer(p, group_id, trainer_id)
+
+    slot_id = db.add_schedule_slot(p, group_id, 1, "10:00")
+    db.list_schedule_for_group(p, group_id)
+    db.get_schedule_by_id(p, slot_id)
+    db.update_schedule_slot(p, slot_id, start_time="11:00")
+    db.toggle_schedule_slot(p, slot_id, False)
+    db.delete_schedule_slot(p, slot_id)
+
+    db.upsert_client_group_active(p, client_id, group_id)
+    db.visit_exists(p, "2024-05-01", group_id, other_id)
+    db.create_single_visit_booked(p, "2024-05-01", group_id, other_id, 1)
+    db.list_clients_for_attendance(p, group_id, "2024-05-01")
+    db.get_visit_by_date_group_client(p, "2024-05-01", group_id, client_id)
+    db.upsert_visit_status(p, "2024-05-01", group_id, client_id, "attended", 1)
+    db.upsert_visit_statuses(p, "2024-05-02", group_id, [(client_id, "attended"), (other_id, "noshow")], 1)
+    visit_id = db.get_or_create_single_visit(p, other_id, group_id, "2024-05-03", 1)
+
+    pass_id = db.issue_pass(p, client_id, group_id, "2024-05-01", "2024-05-31", 1)
+    db.get_active_pass(p, client_id, group_id, "2024-05-10")
+    db.get_pass_by_id(p, pass_id)
+    db.list_active_passes(p, client_id, group_id, "2024-05-10")
+    db.create_payment_pass(p, client_id, group_id, pass_id, 3000, "cash", "paid", None, 1)
+    pay_id = db.create_payment_single(p, other_id, group_id, visit_id, 500, "defer", "deferred", "2024-05-10", 1)
+    db.list_deferred_payments_by_client(p, other_id)
+    db.get_payment_by_id(p, pay_id)
+    db.get_defer_summary(p, other_id, "2024-05-10")
+    db.close_deferred_payment(p, pay_id, "qr", "2024-05-05", 1)
+
+    category_id = db.create_expense_category(p, "Аренда")
+    db.rename_expense_category(p, category_id, "Аренда зала")
+    db.list_expense_categories(p, include_inactive=True)
+    db.set_expense_category_active(p, category_id, True)
+    expense_id = db.create_expense(p, "2024-05-01", category_id, 1000, "cash", None, 1)
+    db.get_last_expense(p, 1)
+    db.list_expenses(p, "2024-05-01", "2024-05-31")
+    db.list_expenses(p, "2024-05-01", "2024-05-31", category_id)
+    db.get_expense_by_id(p, expense_id)
+    db.update_expense(p, expense_id, amount=1200)
+
+    version = db.get_data_version(p)
+    db.save_report_file_id(p, "2024-05-01", "2024-05-31", "2024-06-01", 7, version, "file")
+    db.get_report_file_id(p, "2024-05-01", "2024-05-31", "2024-06-01", 7, version)
+
+    reporting.list_paid_payments(p, "2024-05-01", "2024-05-31")
+    reporting.list_expenses_for_period(p, "2024-05-01", "2024-05-31")
+    reporting.list_attended_today_by_group(p, group_id, "2024-05-01")
+    reporting.list_active_passes_today(p, "2024-05-10")
+    reporting.list_passes_expiring(p, "2024-05-10", "2024-05-17")
+    reporting.list_clients_without_active_pass(p, "2024-05-10")
+    reporting.build_excel_report(p, "2024-05-01", "2024-05-31", "2024-06-01", 7)
+    db.delete_expense(p, expense_id)
+
+
+class QueryPlanTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self._tmp_dir.name, "test.sqlite")
+        db.init_db(self.db_path)
+
+    def tearDown(self) -> None:
+        close_pool(self.db_path)
+        self._tmp_dir.cleanup()
+
+    def test_queries_do_not_scan_large_tables(self) -> None:
+        statements = []
+        with connection(self.db_path) as conn:
+            conn.set_trace_callback(statements.append)
+            try:
+                _run_workload(self.db_path)
+            finally:
+                conn.set_trace_callback(None)
+
+            scans = {}
+            for sql in dict.fromkeys(statements):
+                words = sql.split(None, 1)
+                if not words or words[0].upper() not in PLAN_STATEMENTS:
+                    continue
+                if any(fragment in " ".join(sql.split()) for fragment in SCAN_ALLOWED_STATEMENTS):
+                    continue
+                for row in conn.execute("EXPLAIN QUERY PLAN " + sql):
+                    match = FULL_SCAN.match(row[3])
+                    if match and match.group(1) not in SCAN_ALLOWED:
+                        scans[" ".join(sql.split())] = row[3]
+
+        self.assertGreater(len(statements), 50)
+        self.assertEqual(scans, {})
+
+    def test_open_deferrals_use_the_partial_index_in_order(self) -> None:
+        client_id = db.create_client(self.db_path, "Анна", "+70000000000", None, None, None, None)
+        group_id = db.create_group(self.db_path, "Джаз")
+        visit_id = db.get_or_create_single_visit(self.db_path, client_id, group_id, "2024-05-01", 1)
+        db.create_payment_single(self.db_path, client_id, group_id, visit_id, 500, "defer", "deferred", None, 1)
+
+        with connection(self.db_path) as conn:
+            self.assertEqual(
+                conn.execute("SELECT created_date = date(created_at) FROM payments").fetchone(), (1,)
+            )
+            cursor_sql = []
+            conn.set_trace_callback(cursor_sql.append)
+            try:
+                reporting._open_deferrals_cursor(conn, "2024-05-01", "2024-05-31", newest_first=True, limit=10)
+            finally:
+                conn.set_trace_callback(None)
+            plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + cursor_sql[0])]
+
+        self.assertTrue(any("ix_payments_open_deferrals" in step for step in plan), plan)
+        self.assertFalse(any("TEMP B-TREE" in step for step in plan), plan)
+
+
+if __name__ == "__main__":
+    unittest.main()
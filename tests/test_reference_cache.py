@@ -0,0 +1,83 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
+SRC_PATH = os.path.join(PROJECT_ROOT, "app", "src")
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+import async_db
+from db import (
+    create_expense_category,
+    create_group,
+    create_trainer,
+    init_db,
+    list_active_groups,
+    list_expense_categories,
+    list_groups,
+    list_trainers,
+    rename_group,
+    set_expense_category_active,
+    set_group_active,
+    update_trainer_name,
+)
+from db_pool import close_pool, connection
+
+
+class ReferenceCacheTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self._tmp_dir.name, "test.sqlite")
+        init_db(self.db_path)
+
+    def tearDown(self) -> None:
+        close_pool(self.db_path)
+        self._tmp_dir.cleanup()
+
+    def _count_queries(self, func, *args, **kwargs):
+        statements = []
+        with connection(self.db_path) as conn:
+            conn.set_trace_callback(statements.append)
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                conn.set_trace_callback(None)
+        return result, len(statements)
+
+    def test_lists_are_served_from_cache_until_a_write(self) -> None:
+        group_id = create_group(self.db_path, "Джаз")
+        self.assertEqual([row[1] for row in list_active_groups(self.db_path)], ["Джаз"])
+        rows, queries = self._count_queries(list_active_groups, self.db_path)
+        self.assertEqual(queries, 0)
+        rows_async = asyncio.run(async_db.list_active_groups(self.db_path))
+        self.assertEqual(rows_async, rows)
+
+        rename_group(self.db_path, group_id, "Модерн")
+        self.assertEqual([row[1] for row in list_active_groups(self.db_path)], ["Модерн"])
+        set_group_active(self.db_path, group_id, False)
+        self.assertEqual(list_active_groups(self.db_path), [])
+        self.assertEqual(len(list_groups(self.db_path, include_inactive=True)), 1)
+
+    def test_trainer_rename_refreshes_trainers_and_groups(self) -> None:
+        trainer_id = create_trainer(self.db_path, "Ольга")
+        create_group(self.db_path, "Джаз", trainer_id=trainer_id)
+        list_trainers(self.db_path)
+        list_groups(self.db_path)
+        update_trainer_name(self.db_path, trainer_id, "Ольга П.")
+        self.assertEqual(list_trainers(self.db_path)[0][1], "Ольга П.")
+        self.assertEqual(list_groups(self.db_path)[0][3], "Ольга П.")
+
+    def test_expense_categories_follow_writes(self) -> None:
+        before = len(list_expense_categories(self.db_path, include_inactive=False))
+        category_id = create_expense_category(self.db_path, "Реклама")
+        self.assertEqual(len(list_expense_categories(self.db_path, include_inactive=False)), before + 1)
+        set_expense_category_active(self.db_path, category_id, False)
+        self.assertEqual(len(list_expense_categories(self.db_path, include_inactive=False)), before)
+
+
+if __name__ == "__main__":
+    unittest.main()
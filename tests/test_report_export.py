@@ -0,0 +1,87 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
+SRC_PATH = os.path.join(PROJECT_ROOT, "app", "src")
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+from db import create_expense, get_data_version, init_db
+from db_pool import close_pool
+from report_export import clear_report_cache, get_excel_report, send_excel_report
+
+
+class ExcelReportCacheTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self._tmp_dir.name, "test.sqlite")
+        init_db(self.db_path)
+        clear_report_cache()
+
+    def tearDown(self) -> None:
+        close_pool(self.db_path)
+        self._tmp_dir.cleanup()
+
+    def test_report_is_reused_until_data_changes(self) -> None:
+        misses = []
+
+        async def on_miss():
+            misses.append(1)
+
+        async def fetch():
+            return await get_excel_report(self.db_path, "2024-05-01", "2024-05-31", "2024-06-01", 7, on_miss=on_miss)
+
+        async def scenario():
+            first, again = await asyncio.gather(fetch(), fetch())
+            cached = await fetch()
+            create_expense(self.db_path, "2024-05-02", 1, 100, "cash", None, None)
+            rebuilt = await fetch()
+            return first, again, cached, rebuilt
+
+        version = get_data_version(self.db_path)
+        first, again, cached, rebuilt = asyncio.run(scenario())
+        self.assertIs(first, again)
+        self.assertIs(first, cached)
+        self.assertIsNot(first, rebuilt)
+        self.assertEqual(len(misses), 3)
+        self.assertEqual(get_data_version(self.db_path), version + 1)
+
+    def test_report_is_uploaded_once_and_resent_by_file_id(self) -> None:
+        uploads = []
+        sent = []
+
+        async def answer_document(document, caption=None, reply_markup=None):
+            if isinstance(document, str):
+                sent.append(("requester", document))
+            else:
+                uploads.append(document.filename)
+            return SimpleNamespace(document=SimpleNamespace(file_id=f"file-{len(uploads)}"))
+
+        async def send_document(chat_id, document, caption=None):
+            sent.append((chat_id, document))
+
+        message = SimpleNamespace(answer_document=answer_document, bot=SimpleNamespace(send_document=send_document))
+
+        async def deliver():
+            return await send_excel_report(
+                message, self.db_path, "2024-05-01", "2024-05-31", "2024-06-01", 7,
+                filename="report.xlsx", caption="Отчет", extra_recipients=(1,),
+            )
+
+        first = asyncio.run(deliver())
+        close_pool(self.db_path)
+        clear_report_cache()
+        second = asyncio.run(deliver())
+
+        self.assertEqual(uploads, ["report.xlsx"])
+        self.assertEqual(first, second)
+        self.assertEqual(sent, [(1, "file-1"), ("requester", "file-1"), (1, "file-1")])
+
+
+if __name__ == "__main__":
+    unittest.main()
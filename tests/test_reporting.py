@@ -0,0 +1,140 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from io import BytesIO
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
+SRC_PATH = os.path.join(PROJECT_ROOT, "app", "src")
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+from db import (
+    close_deferred_payment,
+    create_client,
+    create_expense,
+    create_expense_category,
+    create_group,
+    create_payment_single,
+    delete_expense,
+    get_or_create_single_visit,
+    init_db,
+    update_expense,
+    upsert_visit_status,
+)
+from db_pool import close_pool
+from openpyxl import load_workbook
+from reporting import (
+    build_excel_report,
+    get_attendance_summary,
+    get_expense_summary,
+    get_report_snapshot,
+    get_revenue_summary,
+)
+
+
+class DailyRollupTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self._tmp_dir.name, "test.sqlite")
+        init_db(self.db_path)
+        self.client_id = create_client(self.db_path, "Анна", "+70000000000", None, None, None, None)
+        self.group_id = create_group(self.db_path, "Джаз")
+
+    def tearDown(self) -> None:
+        close_pool(self.db_path)
+        self._tmp_dir.cleanup()
+
+    def _raw(self, sql: str):
+        with sqlite3.connect(self.db_path) as conn:
+            return conn.execute(sql).fetchone()
+
+    def test_summaries_follow_inserts_updates_and_deletes(self) -> None:
+        visit_id = get_or_create_single_visit(self.db_path, self.client_id, self.group_id, "2024-05-01", 1)
+        upsert_visit_status(self.db_path, "2024-05-01", self.group_id, self.client_id, "attended", 1)
+        upsert_visit_status(self.db_path, "2024-05-02", self.group_id, self.client_id, "noshow", 1)
+        create_payment_single(self.db_path, self.client_id, self.group_id, visit_id, 500, "cash", "paid", None, 1)
+        deferred_id = create_payment_single(
+            self.db_path, self.client_id, self.group_id, visit_id, 700, "defer", "deferred", "2024-05-10", 1
+        )
+        close_deferred_payment(self.db_path, deferred_id, "qr", "2024-05-03", 1)
+        category_id = create_expense_category(self.db_path, "Аренда")
+        expense_id = create_expense(self.db_path, "2024-05-01", category_id, 1000, "cash", None, 1)
+        update_expense(self.db_path, expense_id, amount=1200, method="transfer")
+        dropped_id = create_expense(self.db_path, "2024-05-02", category_id, 300, "cash", None, 1)
+        delete_expense(self.db_path, dropped_id)
+
+        revenue = get_revenue_summary(self.db_path, "2000-01-01", "2100-12-31")
+        self.assertEqual((revenue.total, revenue.count, revenue.cash, revenue.qr), (1200, 2, 500, 700))
+        self.assertEqual(get_revenue_summary(self.db_path, "2024-05-03", "2024-05-03").total, 700)
+        expenses = get_expense_summary(self.db_path, "2024-05-01", "2024-05-31")
+        self.assertEqual((expenses.total, expenses.transfer, expenses.cash), (1200, 1200, 0))
+        self.assertEqual(expenses.categories, [("Аренда", 1200)])
+        attendance = get_attendance_summary(self.db_path, "2024-05-01", "2024-05-31")
+        self.assertEqual((attendance.booked, attendance.attended, attendance.noshow), (0, 1, 1))
+        self.assertEqual(self._raw("SELECT COUNT(*) FROM report_expense_daily")[0], 1)
+
+    def test_snapshot_collects_singles_and_deferrals_in_one_read(self) -> None:
+        paid_visit = get_or_create_single_visit(self.db_path, self.client_id, self.group_id, "2024-05-01", 1)
+        get_or_create_single_visit(self.db_path, self.client_id, self.group_id, "2024-05-02", 1)
+        get_or_create_single_visit(self.db_path, self.client_id, self.group_id, "2024-05-03", 1)
+        create_payment_single(self.db_path, self.client_id, self.group_id, paid_visit, 500, "cash", "paid", None, 1)
+        deferred_id = create_payment_single(
+            self.db_path, self.client_id, self.group_id, paid_visit, 700, "defer", "deferred", None, 1
+        )
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                "UPDATE payments SET created_at = '2024-05-01 10:00:00', created_date = '2024-05-01' WHERE pay_id = ?",
+                (deferred_id,),
+            )
+
+        snapshot = get_report_snapshot(self.db_path, "2024-05-01", "2024-05-31", "2024-06-01", 7, unpaid_limit=1)
+        attendance_only = get_report_snapshot(
+            self.db_path, "2024-05-01", "2024-05-31", "2024-06-01", 7, parts=("attendance",)
+        )
+
+        self.assertEqual((snapshot.single_visits, snapshot.unpaid_single_count), (3, 2))
+        self.assertEqual(snapshot.unpaid_single_visits, [("2024-05-03", "Анна", "Джаз", "booked")])
+        self.assertEqual([row[0] for row in snapshot.deferred], [deferred_id])
+        self.assertEqual((snapshot.deferred_count, snapshot.deferred_amount), (1, 700))
+        self.assertEqual([row[0] for row in snapshot.overdue], [deferred_id])
+        self.assertEqual(attendance_only.attendance.booked, 3)
+        self.assertIsNone(attendance_only.revenue)
+        self.assertEqual((attendance_only.single_visits, attendance_only.deferred), (0, []))
+        self.assertTrue(build_excel_report(self.db_path, "2024-05-01", "2024-05-31", "2024-06-01", 7).startswith(b"PK"))
+
+    def test_snapshot_counts_every_deferral_but_lists_only_the_latest(self) -> None:
+        visit_id = get_or_create_single_visit(self.db_path, self.client_id, self.group_id, "2024-05-01", 1)
+        deferred_ids = [
+            create_payment_single(self.db_path, self.client_id, self.group_id, visit_id, amount, "defer", "deferred", None, 1)
+            for amount in (100, 200, 300)
+        ]
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("UPDATE payments SET created_date = '2024-05-02'")
+
+        snapshot = get_report_snapshot(
+            self.db_path, "2024-05-01", "2024-05-31", "2024-05-03", 7, parts=("defers",), deferred_limit=2
+        )
+
+        self.assertEqual((snapshot.deferred_count, snapshot.deferred_amount), (3, 600))
+        self.assertEqual([row[0] for row in snapshot.deferred], deferred_ids[:0:-1])
+
+    def test_excel_sheets_keep_rows_and_widths_in_one_pass(self) -> None:
+        visit_id = get_or_create_single_visit(self.db_path, self.client_id, self.group_id, "2024-05-01", 1)
+        create_payment_single(self.db_path, self.client_id, self.group_id, visit_id, 500, "cash", "paid", None, 1)
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("UPDATE payments SET pay_date = '2024-05-01'")
+
+        workbook = load_workbook(BytesIO(build_excel_report(self.db_path, "2024-05-01", "2024-05-31", "2024-06-01", 7)))
+
+        revenue = workbook["Revenue"]
+        self.assertTrue(revenue["A1"].font.bold)
+        self.assertEqual([cell.value for cell in revenue[7]][1:3], ["Анна", "Джаз"])
+        self.assertEqual(revenue.column_dimensions["B"].width, 30)
+        self.assertEqual(workbook["Summary"]["B2"].value, 500)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import os
+import sys
+import tempfile
+import unittest
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
+SRC_PATH = os.path.join(PROJECT_ROOT, "app", "src")
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+from db import create_client, get_client_by_phone, init_db
+from db_pool import add_query_observer, close_pool, remove_query_observer
+from slow_queries import SlowQueryLog
+
+
+class SlowQueryLogTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self._tmp_dir.name, "test.sqlite")
+        self.log_path = os.path.join(self._tmp_dir.name, "slow.log")
+        self.slow_log = SlowQueryLog(threshold_ms=0, size=50, log_path=self.log_path)
+        add_query_observer(self.slow_log)
+        init_db(self.db_path)
+
+    def tearDown(self) -> None:
+        remove_query_observer(self.slow_log)
+        self.slow_log.close()
+        close_pool(self.db_path)
+        self._tmp_dir.cleanup()
+
+    def test_entries_capture_shape_plan_and_caller(self) -> None:
+        create_client(self.db_path, "Анна", "+70000000000", None, None, None, None)
+        get_client_by_phone(self.db_path, "+70000000000")
+        get_client_by_phone(self.db_path, "+70000000001")
+
+        entries = [entry for entry in self.slow_log.entries() if entry.caller == "db.get_client_by_phone"]
+        self.assertEqual(len(entries), 2)
+        self.assertEqual(entries[0].parameter_shape, "(str)")
+        self.assertTrue(any("ux_clients_phone" in step for step in entries[0].plan))
+        self.assertEqual(len(self.slow_log.entries()), 50)
+
+        offender = next(item for item in self.slow_log.top(limit=100) if item.caller == "db.get_client_by_phone")
+        self.assertEqual(offender.count, 2)
+        with open(self.log_path, encoding="utf-8") as handle:
+            written = handle.read()
+        self.assertIn("db.get_client_by_phone", written)
+        self.assertNotIn("+70000000001", written)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
+SRC_PATH = os.path.join(PROJECT_ROOT, "app", "src")
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+from db import (
+    create_client,
+    create_group,
+    create_single_visit_booked,
+    get_data_version,
+    get_or_create_single_visit,
+    init_db,
+    upsert_visit_status,
+    upsert_visit_statuses,
+)
+from db_pool import close_pool
+from migrations import MIGRATIONS
+
+
+class SingleVisitUpsertTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self._tmp_dir.name, "test.sqlite")
+        init_db(self.db_path)
+        self.client_id = create_client(self.db_path, "Анна", "+70000000000", None, None, None, None)
+        self.group_id = create_group(self.db_path, "Джаз")
+
+    def tearDown(self) -> None:
+        close_pool(self.db_path)
+        self._tmp_dir.cleanup()
+
+    def _visits(self):
+        with sqlite3.connect(self.db_path) as conn:
+            return conn.execute("SELECT visit_id, status, created_by FROM visits ORDER BY visit_id").fetchall()
+
+    def test_repeated_writes_keep_a_single_row(self) -> None:
+        self.assertTrue(create_single_visit_booked(self.db_path, "2024-05-01", self.group_id, self.client_id, 1))
+        self.assertFalse(create_single_visit_booked(self.db_path, "2024-05-01", self.group_id, self.client_id, 1))
+        visit_id = get_or_create_single_visit(self.db_path, self.client_id, self.group_id, "2024-05-01", 2)
+        upsert_visit_status(self.db_path, "2024-05-01", self.group_id, self.client_id, "attended", 3)
+        upsert_visit_status(self.db_path, "2024-05-01", self.group_id, self.client_id, "noshow", 4)
+
+        self.assertEqual(self._visits(), [(visit_id, "noshow", 4)])
+
+    def test_lookup_of_existing_visit_does_not_bump_data_version(self) -> None:
+        visit_id = get_or_create_single_visit(self.db_path, self.client_id, self.group_id, "2024-05-01", 1)
+        version = get_data_version(self.db_path)
+
+        self.assertEqual(get_or_create_single_visit(self.db_path, self.client_id, self.group_id, "2024-05-01", 2), visit_id)
+        self.assertEqual(get_data_version(self.db_path), version)
+        self.assertEqual(self._visits(), [(visit_id, "booked", 1)])
+
+    def test_bulk_statuses_are_upserted_together(self) -> None:
+        other_id = create_client(self.db_path, "Борис", "+70000000001", None, None, None, None)
+        create_single_visit_booked(self.db_path, "2024-05-01", self.group_id, self.client_id, 1)
+
+        written = upsert_visit_statuses(
+            self.db_path,
+            "2024-05-01",
+            self.group_id,
+            [(self.client_id, "attended"), (other_id, "noshow")],
+            2,
+        )
+
+        self.assertEqual(written, 2)
+        with sqlite3.connect(self.db_path) as conn:
+            rows = conn.execute("SELECT client_id, status, created_by FROM visits ORDER BY client_id").fetchall()
+        self.assertEqual(rows, [(self.client_id, "attended", 2), (other_id, "noshow", 2)])
+        self.assertEqual(upsert_visit_statuses(self.db_path, "2024-05-01", self.group_id, [], 2), 0)
+
+    def test_bulk_statuses_keep_statuses_set_earlier(self) -> None:
+        other_id = create_client(self.db_path, "Борис", "+70000000001", None, None, None, None)
+        upsert_visit_status(self.db_path, "2024-05-01", self.group_id, self.client_id, "cancelled", 1)
+        upsert_visit_status(self.db_path, "2024-05-01", self.group_id, other_id, "attended", 1)
+
+        written = upsert_visit_statuses(
+            self.db_path,
+            "2024-05-01",
+            self.group_id,
+            [(self.client_id, "noshow"), (other_id, "noshow")],
+            2,
+        )
+
+        self.assertEqual(written, 0)
+        with sqlite3.connect(self.db_path) as conn:
+            rows = conn.execute("SELECT client_id, status, created_by FROM visits ORDER BY client_id").fetchall()
+        self.assertEqual(rows, [(self.client_id, "cancelled", 1), (other_id, "attended", 1)])
+
+    def test_migration_collapses_existing_duplicates(self) -> None:
+        legacy_path = os.path.join(self._tmp_dir.name, "legacy.sqlite")
+        with sqlite3.connect(legacy_path) as conn:
+            for version, _description, step in MIGRATIONS[:2]:
+                step(conn)
+                conn.execute(f"PRAGMA user_version = {version}")
+            conn.execute("INSERT INTO clients(client_id, full_name, phone) VALUES (1, 'Анна', '+70000000000')")
+            conn.execute("INSERT INTO groups(group_id, name) VALUES (1, 'Джаз')")
+            for status in ("booked", "attended"):
+                conn.execute(
+                    """
+                    INSERT INTO visits(visit_date, group_id, schedule_id, client_id, status, created_by)
+                    VALUES ('2024-05-01', 1, NULL, 1, ?, 7)
+                    """,
+                    (status,),
+                )
+            conn.execute(
+                """
+                INSERT INTO payments(client_id, group_id, visit_id, amount, method, status, purpose)
+                VALUES (1, 1, (SELECT MAX(visit_id) FROM visits), 500, 'cash', 'paid', 'single')
+                """
+            )
+
+        init_db(legacy_path)
+        close_pool(legacy_path)
+
+        with sqlite3.connect(legacy_path) as conn:
+            visits = conn.execute("SELECT visit_id, status FROM visits").fetchall()
+            paid_visit = conn.execute("SELECT visit_id FROM payments").fetchone()[0]
+        self.assertEqual(len(visits), 1)
+        self.assertEqual(visits[0][1], "attended")
+        self.assertEqual(paid_visit, visits[0][0])
+
+
+if __name__ == "__main__":
+    unittest.main()
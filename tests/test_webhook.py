@@ -0,0 +1,114 @@
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
+SRC_PATH = os.path.join(PROJECT_ROOT, "app", "src")
+if SRC_PATH not in sys.path:
+    sys.path.insert(0, SRC_PATH)
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiohttp.test_utils import TestClient, TestServer
+
+import db_pool
+from config import BOT_MODE_WEBHOOK, Config
+from main import build_dispatcher
+from webhook import create_webhook_app
+
+SECRET = "test-secret_1"
+
+
+class RecordingSession(BaseSession):
+    def __init__(self) -> None:
+        super().__init__()
+        self.methods = []
+
+    async def make_request(self, bot, method, timeout=None):
+        self.methods.append(method)
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self) -> None:
+        pass
+
+
+def _update(update_id: int, user_id: int, text: str) -> dict:
+    user = {"id": user_id, "is_bot": False, "first_name": "Анна"}
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 1760000000,
+            "chat": {"id": user_id, "type": "private", "first_name": "Анна"},
+            "from": user,
+            "text": text,
+        },
+    }
+
+
+class WebhookTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self._tmp_dir.name, "test.sqlite")
+        self.config = Config(
+            bot_token="123456:TEST",
+            owner_tg_user_id=1,
+            db_path=self.db_path,
+            tz="UTC",
+            slow_query_ms=60_000,
+            bot_mode=BOT_MODE_WEBHOOK,
+            webhook_secret=SECRET,
+        )
+
+    def tearDown(self) -> None:
+        self._tmp_dir.cleanup()
+
+    def test_posted_updates_are_handled_between_startup_and_shutdown(self) -> None:
+        session = RecordingSession()
+
+        async def scenario():
+            bot = Bot(token=self.config.bot_token, session=session)
+            app = create_webhook_app(build_dispatcher(self.config), bot, self.config)
+            async with TestClient(TestServer(app)) as client:
+                with sqlite3.connect(self.db_path) as conn:
+                    user_version = conn.execute("PRAGMA user_version").fetchone()[0]
+                rejected = await client.post(
+                    "/webhook",
+                    json=_update(1, 1, "/start"),
+                    headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"},
+                )
+                accepted = await client.post(
+                    "/webhook",
+                    json=_update(2, 1, "/start"),
+                    headers={"X-Telegram-Bot-Api-Secret-Token": SECRET},
+                )
+                started = await client.post(
+                    "/webhook",
+                    json=_update(3, 1, "➕ Новый клиент"),
+                    headers={"X-Telegram-Bot-Api-Secret-Token": SECRET},
+                )
+                return user_version, rejected.status, accepted.status, started.status
+
+        observers = list(db_pool._query_observers)
+        user_version, rejected, accepted, started = asyncio.run(scenario())
+
+        self.assertGreater(user_version, 0)
+        self.assertEqual((rejected, accepted, started), (401, 200, 200))
+        self.assertEqual([method.text for method in session.methods], ["Бот запущен ✅", "Введите телефон клиента"])
+        # Shutdown drained the background updates, unregistered the slow query
+        # log and flushed the FSM state of the unfinished dialog.
+        self.assertEqual(db_pool._query_observers, observers)
+        with sqlite3.connect(self.db_path) as conn:
+            states = conn.execute("SELECT state FROM fsm_states").fetchall()
+        self.assertEqual(states, [("NewClientStates:phone",)])
+
+
+if __name__ == "__main__":
+    unittest.main()